@@ -0,0 +1,108 @@
+import argparse
+import logging
+import random
+import time
+from decimal import Decimal
+
+from arbitrage.entities import OrderBook, CurrencyPair, PriceTicks
+
+
+def generate_deltas(count: int, mid_price: Decimal, tick_size: Decimal, depth: int, seed: int):
+    """
+    Generates book deltas [price, count, amount] scattered around a fixed mid price.
+
+    :param count: number of deltas
+    :param mid_price:
+    :param tick_size:
+    :param depth: number of ticks on each side of the mid price
+    :param seed:
+    :return:
+    """
+    generator = random.Random(seed)
+    deltas = list()
+    for _ in range(count):
+        offset = generator.randint(1, depth)
+        is_bid = generator.random() < 0.5
+        price = mid_price - offset * tick_size if is_bid else mid_price + offset * tick_size
+        if generator.random() < 0.2:
+            deltas.append((price, 0, 1 if is_bid else -1))
+
+        else:
+            amount = Decimal(generator.randint(1, 10 ** 6)) / 10 ** 4
+            deltas.append((price, generator.randint(1, 5), amount if is_bid else -amount))
+
+    return deltas
+
+
+def apply_deltas(order_book: OrderBook, deltas, read_level_one: bool) -> float:
+    """
+
+    :param order_book:
+    :param deltas:
+    :param read_level_one: also builds the level one quote after each delta
+    :return: elapsed time in seconds
+    """
+    start = time.perf_counter()
+    for price, count, amount in deltas:
+        if count > 0:
+            if amount > 0:
+                order_book.update_bid(price, amount)
+
+            else:
+                order_book.update_ask(price, amount)
+
+        else:
+            if amount == 1:
+                order_book.remove_bid(price)
+
+            else:
+                order_book.remove_ask(price)
+
+        if read_level_one:
+            order_book.level_one()
+
+    return time.perf_counter() - start
+
+
+def main(args):
+    mid_price = Decimal(args.mid_price)
+    tick_size = Decimal(args.tick_size)
+    lot_size = Decimal(args.lot_size)
+    deltas = generate_deltas(args.count, mid_price, tick_size, args.depth, args.seed)
+    float_deltas = [(float(price), count, float(amount)) for price, count, amount in deltas]
+    pair = CurrencyPair('btc', 'usd')
+    snapshot = ['0', [[mid_price - tick_size * (args.depth + 1), 1, Decimal(1)],
+                      [mid_price + tick_size * (args.depth + 1), 1, Decimal(-1)]]]
+    ticks = PriceTicks(tick_size, lot_size)
+    books = [
+        ('decimal keys', lambda: OrderBook(pair, 'benchmark'), deltas),
+        ('integer ticks (decimal input)', lambda: OrderBook(pair, 'benchmark', ticks=ticks), deltas),
+        ('integer ticks (float input)', lambda: OrderBook(pair, 'benchmark', ticks=ticks), float_deltas),
+    ]
+    for read_level_one in (False, True):
+        print('updates{}:'.format(' + level_one()' if read_level_one else ''))
+        reference = None
+        for name, create_book, book_deltas in books:
+            order_book = create_book()
+            order_book.load_snapshot(snapshot)
+            elapsed = apply_deltas(order_book, book_deltas, read_level_one)
+            if reference is None:
+                reference = elapsed
+
+            print('  {:<32} {:>10.0f} updates/s  x{:.2f}'.format(name, len(book_deltas) / elapsed, reference / elapsed))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s:%(name)s:%(levelname)s:%(message)s')
+    parser = argparse.ArgumentParser(description='Comparing order book update throughput: Decimal keys vs integer ticks.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter
+                                     )
+    parser.add_argument('--count', type=int, help='number of book deltas', default=200000)
+    parser.add_argument('--depth', type=int, help='number of ticks on each side of the mid price', default=500)
+    parser.add_argument('--mid-price', type=str, help='mid price', default='4712.9')
+    parser.add_argument('--tick-size', type=str, help='price tick size', default='0.1')
+    parser.add_argument('--lot-size', type=str, help='amount lot size', default='0.0001')
+    parser.add_argument('--seed', type=int, help='random seed', default=1)
+
+    args = parser.parse_args()
+    main(args)
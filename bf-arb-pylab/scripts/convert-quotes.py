@@ -0,0 +1,25 @@
+import argparse
+import logging
+
+from arbitrage.archive import QuoteArchive, convert_quote_lines
+
+
+def main(args):
+    with open(args.input, 'r') as prices_input:
+        count = convert_quote_lines(prices_input, args.output, chunk_size=args.chunk_size)
+
+    archive = QuoteArchive(args.output)
+    logging.info('archived {} quotes of {} pairs to {}'.format(count, len(archive.pairs()), args.output))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(name)s:%(levelname)s:%(message)s')
+    parser = argparse.ArgumentParser(description='Converting recorded json quote lines to a columnar quote archive.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter
+                                     )
+    parser.add_argument('input', type=str, help='recorded prices, as json lines (ex: scripts/example_pricing_source.txt)')
+    parser.add_argument('output', type=str, help='archive directory')
+    parser.add_argument('--chunk-size', type=int, help='number of quotes per pair and per chunk', default=65536)
+
+    args = parser.parse_args()
+    main(args)
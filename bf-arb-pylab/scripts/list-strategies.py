@@ -5,6 +5,7 @@ import bitfinex
 import tenacity
 
 from arbitrage import parse_pair_from_indirect, create_strategies
+from arbitrage.scanner import StrategyCache
 
 
 def parse_symbols_bitfinex(pairs):
@@ -18,9 +19,16 @@ def parse_symbols_bitfinex(pairs):
 @tenacity.retry(wait=tenacity.wait_fixed(1), stop=tenacity.stop_after_attempt(5))
 def main(args):
     bitfinex_client = bitfinex.Client()
-    pair_codes = bitfinex_client.symbols()
-    pairs = parse_symbols_bitfinex(pair_codes)
-    strategies = create_strategies(pairs)
+    if args.cache:
+        cache = StrategyCache(args.cache)
+        pairs = parse_symbols_bitfinex(cache.symbols(bitfinex_client.symbols, max_age=args.cache_max_age))
+        strategies = cache.strategies(pairs)
+
+    else:
+        pair_codes = bitfinex_client.symbols()
+        pairs = parse_symbols_bitfinex(pair_codes)
+        strategies = create_strategies(pairs)
+
     for strategy in strategies:
         print('[{}]'.format(','.join(['"{}/{}"'.format(pair.base, pair.quote) for pair in strategy.pairs])))
 
@@ -31,6 +39,8 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Listing available strategies.',
                                      formatter_class=argparse.ArgumentDefaultsHelpFormatter
                                      )
+    parser.add_argument('--cache', type=str, help='file caching the symbols and the strategies found from them')
+    parser.add_argument('--cache-max-age', type=float, help='seconds before the cached symbols are requested again', default=86400.)
 
     args = parser.parse_args()
     main(args)
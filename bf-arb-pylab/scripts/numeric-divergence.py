@@ -0,0 +1,43 @@
+import argparse
+import logging
+
+from arbitrage import parse_strategy, parse_quote_lines, create_strategies
+from arbitrage.numeric import numeric_backend
+from arbitrage.scanner import compare_backends, read_strategies
+
+
+def main(args):
+    with open(args.replay, 'r') as prices_input:
+        quotes = parse_quote_lines(prices_input)
+
+    strategies = list()
+    if args.strategy:
+        strategies.append(parse_strategy(args.strategy.upper()))
+
+    if args.strategies:
+        with open(args.strategies, 'r') as strategies_file:
+            strategies += read_strategies(strategies_file)
+
+    if len(strategies) == 0:
+        strategies = sorted(create_strategies({pair for pair, quote in quotes}))
+
+    logging.info('replaying {} quotes through {} strategies'.format(len(quotes), len(strategies)))
+    report = compare_backends(quotes, strategies, backend=numeric_backend(args.numeric),
+                              illimited_volume=args.illimited_volume)
+    for key, value in report.items():
+        print('{}: {}'.format(key, value))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(name)s:%(levelname)s:%(message)s')
+    parser = argparse.ArgumentParser(description='Comparing the evaluation of strategies in decimal and float64.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter
+                                     )
+    parser.add_argument('replay', type=str, help='recorded prices, as json lines')
+    parser.add_argument('--strategy', type=str, help='strategy as a formatted string (for example: eth/btc,btc/usd,eth/usd')
+    parser.add_argument('--strategies', type=str, help='file listing one strategy per line, all strategies of the recorded pairs by default')
+    parser.add_argument('--numeric', type=str, choices=('float64',), help='backend compared to decimal', default='float64')
+    parser.add_argument('--illimited-volume', action='store_true', help='emulates infinite liquidity')
+
+    args = parser.parse_args()
+    main(args)
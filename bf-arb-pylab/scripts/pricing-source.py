@@ -1,118 +1,294 @@
 import argparse
 import logging
-from collections import defaultdict
 
 from decimal import Decimal
 
-from typing import Callable, Any
-
 import os
+import time
 
 import sys
 
-from arbitrage.entities import OrderBook, QuoteEncoder
+from arbitrage import parse_pair_from_direct
+from arbitrage.entities import OrderBookRegistry, PriceTicks, QuoteEncoder, register_pair_ticks, pair_ticks
+from arbitrage.binaryquotes import BinaryQuoteWriter
+from arbitrage.frames import FrameRecorder, RecordedConnection, frame_segments, read_frames
+from arbitrage.journal import BookJournal, snapshot_books, warm_start, write_snapshot
+from arbitrage.latency import LatencyRecorder, install_dump_handlers
+from arbitrage.sharedquotes import SharedQuoteTable
 
 import json
 import asyncio
 import websockets
 
 WSS_BITFINEX_2 = 'wss://api2.bitfinex.com:3000/ws'
+BOOK_CHECKSUM_FLAG = 131072
+
+
+def book_subscription(pair: str) -> str:
+    return json.dumps({
+        'event': 'subscribe',
+        'channel': 'book',
+        'symbol': pair,
+        'prec': 'P0',  # precision level
+        'freq': 'F0',  # realtime
+    })
 
 
-async def consumer_handler(pairs, notify_update_func: Callable[[str, OrderBook], Any]):
+def pair_ticks_lookup(pair: str) -> PriceTicks:
+    return pair_ticks(parse_pair_from_direct(pair))
+
+
+async def consumer_handler(pairs, orderbooks: OrderBookRegistry, parse_float=Decimal, verify_checksums: bool = False,
+                           memory_report_interval: float = 600., journal: BookJournal = None,
+                           checkpoint_path: str = None, checkpoint_interval: float = 60., stamp_latency: bool = False,
+                           recorder: FrameRecorder = None, connection: RecordedConnection = None):
     """
 
     :param pairs:
-    :param notify_update_func:
+    :param orderbooks: registry notifying top of book changes
+    :param parse_float: number type used for decoding prices and amounts
+    :param verify_checksums: requests book checksums and resubscribes the channels whose book has drifted
+    :param memory_report_interval: seconds between two logs of the books memory footprint
+    :param journal: records the book deltas between two checkpoints
+    :param checkpoint_path: file receiving periodic checkpoints of all books
+    :param checkpoint_interval: seconds between two checkpoints
+    :param stamp_latency: stamps the books with the monotonic reception time of each frame
+    :param recorder: receives every raw frame
+    :param connection: recorded frames replayed instead of connecting to the exchange
     :return:
     """
-    channel_pair_mapping = dict()
-    orderbooks = dict()
-    async with websockets.connect(WSS_BITFINEX_2) as websocket:
+    resyncing_channels = set()
+    last_memory_report = time.monotonic()
+    last_checkpoint = time.monotonic()
+    checkpoint_writing = None
+
+    def checkpoint_written(future: asyncio.Future) -> None:
+        if future.exception() is not None:
+            # the rotated journal is kept, next rotation appending to it
+            logging.error('failed to write checkpoint {}: {}'.format(checkpoint_path, future.exception()))
+
+        elif journal is not None:
+            journal.discard_previous()
+
+    async with connection or websockets.connect(WSS_BITFINEX_2) as websocket:
+        if verify_checksums:
+            await websocket.send(json.dumps({'event': 'conf', 'flags': BOOK_CHECKSUM_FLAG}))
+
         for pair in pairs:
-            subscription = json.dumps({
-                'event': 'subscribe',
-                'channel': 'book',
-                'symbol': pair,
-                'prec': 'P0',  # precision level
-                'freq': 'F0',  # realtime
-            })
-            await websocket.send(subscription)
+            await websocket.send(book_subscription(pair))
 
         while True:
-            response = json.loads(await websocket.recv(), parse_float=Decimal)
+            frame = await websocket.recv()
+            if frame is None:
+                # end of the replayed frames
+                break
+
+            frame_ns = time.monotonic_ns() if stamp_latency or recorder is not None else None
+            if recorder is not None:
+                recorder.record(frame, frame_ns)
+
+            response = json.loads(frame, parse_float=parse_float)
+            if time.monotonic() - last_memory_report > memory_report_interval:
+                last_memory_report = time.monotonic()
+                logging.info('order books memory usage (bytes): {}'.format(orderbooks.memory_usage()))
+
+            if checkpoint_path is not None and time.monotonic() - last_checkpoint > checkpoint_interval and \
+                    (checkpoint_writing is None or checkpoint_writing.done()):
+                last_checkpoint = time.monotonic()
+                # levels are copied in the loop, encoding and writing them is left to an executor thread
+                books = snapshot_books(orderbooks)
+                if journal is not None:
+                    journal.rotate()
+
+                checkpoint_writing = asyncio.get_event_loop().run_in_executor(None, write_snapshot, checkpoint_path,
+                                                                              books)
+                checkpoint_writing.add_done_callback(checkpoint_written)
+
             if hasattr(response, 'keys'):
-                if 'version' in response.keys():
-                    logging.info('event: {} {}'.format(response['event'], response['version']))
+                event = response['event']
+                if event == 'info':
+                    logging.info('event: {} {}'.format(event, response.get('version', response)))
 
-                else:
-                    subscription_status = response['event']
+                elif event == 'conf':
+                    logging.info('configuration: {}'.format(response))
+
+                elif event == 'unsubscribed':
                     channel_id = response['chanId']
-                    pair = response['pair']
-                    if subscription_status != 'subscribed':
-                        message = 'failed to subscribe: {}'.format(pair)
+                    resyncing_channels.discard(channel_id)
+                    pair = orderbooks.remove_channel(channel_id)
+                    logging.info('unsubscribed {}, subscribing again'.format(pair))
+                    await websocket.send(book_subscription(pair))
+
+                else:
+                    channel_id = response.get('chanId')
+                    pair = response.get('pair')
+                    if event != 'subscribed':
+                        message = 'failed to subscribe: {} ({})'.format(pair, response)
                         logging.error(message)
                         raise RuntimeError(message)
 
-                    channel_pair_mapping[channel_id] = pair
+                    orderbooks.add(channel_id, pair, ticks=pair_ticks_lookup(pair))
                     logging.info('successfully subscribed: {}'.format(pair))
 
+            elif response[0] in resyncing_channels:
+                # book is being reloaded: pending messages for the old subscription are dropped
+                continue
+
             else:
                 if len(response) == 2:
                     if response[1] == 'hb':
+                        if journal is not None:
+                            journal.flush()
+
                         continue
 
                     channel_id = response[0]
-                    pair = channel_pair_mapping[channel_id]
-                    if pair not in orderbooks:
-                        orderbooks[pair] = OrderBook(pair=pair, source='bitfinex')
+                    if stamp_latency:
+                        orderbooks.by_channel(channel_id).stamp_frame(frame_ns)
+
+                    orderbooks.by_channel(channel_id).load_snapshot(response)
+                    if journal is not None:
+                        journal.snapshot(orderbooks.pair(channel_id), response[1])
 
-                    orderbooks[pair].load_snapshot(response)
-                    logging.info('> loaded snapshot order book {}'.format(orderbooks[pair]))
-                    notify_update_func(pair, orderbooks[pair])
+                    logging.info('> loaded snapshot order book {}'.format(orderbooks.by_channel(channel_id)))
+
+                elif len(response) == 3 and response[1] == 'cs':
+                    channel_id, _, checksum = response
+                    if not orderbooks.by_channel(channel_id).verify_checksum(checksum):
+                        logging.warning('checksum mismatch for {}: resubscribing'.format(orderbooks.pair(channel_id)))
+                        resyncing_channels.add(channel_id)
+                        await websocket.send(json.dumps({'event': 'unsubscribe', 'chanId': channel_id}))
 
                 elif len(response) == 4:
                     # Order Book update
                     channel_id, price, count, amount = response
-                    pair = channel_pair_mapping[channel_id]
+                    orderbook = orderbooks.by_channel(channel_id)
+                    if stamp_latency:
+                        orderbook.stamp_frame(frame_ns)
+
+                    # top of book changes are notified by the order book itself
                     if count > 0:
                         if amount > 0:
-                            updated = orderbooks[pair].update_bid(price, amount)
+                            orderbook.update_bid(price, amount)
 
                         else:
-                            updated = orderbooks[pair].update_ask(price, amount)
+                            orderbook.update_ask(price, amount)
 
                     else:
                         if amount == 1:
-                            updated = orderbooks[pair].remove_bid(price)
+                            orderbook.remove_bid(price)
 
                         else:
-                            updated = orderbooks[pair].remove_ask(price)
+                            orderbook.remove_ask(price)
 
-                    if updated:
-                        notify_update_func(pair, orderbooks[pair])
+                    if journal is not None:
+                        if count > 0:
+                            journal.update(orderbooks.pair(channel_id), price, amount)
+
+                        else:
+                            journal.remove(orderbooks.pair(channel_id), price, 'bid' if amount == 1 else 'ask')
 
                 else:
                     logging.error('unexpected response: {}'.format(response))
 
+        if checkpoint_writing is not None:
+            await asyncio.wait([checkpoint_writing])
+
 
 def main(args):
     unbuffered_stdout = os.fdopen(sys.stdout.fileno(), 'wb', 0)
-    pairs = [''.join(pair.upper().split('/')) for pair in args.bitfinex.split(',')]
-    last_quote = defaultdict(lambda: None)
+    pairs = [''.join(pair.upper().split('/')) for pair in args.bitfinex.split(',')] if args.bitfinex else list()
+    if args.ticks:
+        for ticks in args.ticks:
+            pair_code, tick_size, lot_size = ticks.split(':')
+            registered_ticks = register_pair_ticks(parse_pair_from_direct(''.join(pair_code.upper().split('/'))),
+                                                   Decimal(tick_size), Decimal(lot_size))
+            logging.info('using fixed-point book for {}: {}'.format(pair_code, registered_ticks))
 
-    def notify_update(pair, order_book):
+    shared_quotes = None
+    if args.shared_memory:
+        shared_quotes = SharedQuoteTable(args.shared_memory, capacity=max(len(pairs), args.shared_memory_capacity))
+        logging.info('publishing top of book to shared memory {}'.format(shared_quotes.name))
+
+    binary_writer = None
+    if args.format == 'binary':
+        binary_writer = BinaryQuoteWriter(unbuffered_stdout)
+
+    latency_recorder = None
+    if args.latency:
+        latency_recorder = LatencyRecorder('pricing-source')
+        install_dump_handlers(latency_recorder)
+
+    def notify_update(pair, order_book, side):
         level_one_quote = order_book.level_one()
-        if last_quote[pair] is None or level_one_quote.bid != last_quote[pair].bid or level_one_quote.ask != last_quote[pair].ask:
-            last_quote[pair] = level_one_quote
-            level_one_dict = level_one_quote.to_dict()
-            level_one_dict['pair'] = pair[:len(pair) // 2] + '/' + pair[len(pair) // 2:]
-            json_line = json.dumps(level_one_dict, cls=QuoteEncoder)
-            logging.debug('{}: updated book {}'.format(pair, level_one_quote))
-            unbuffered_stdout.write(json_line.encode('utf-8'))
-            unbuffered_stdout.write('\n'.encode('utf-8'))
+        if not level_one_quote.is_complete():
+            return
+
+        if latency_recorder is not None:
+            latency_recorder.observe(level_one_quote.latency)
+
+        pair_name = pair[:len(pair) // 2] + '/' + pair[len(pair) // 2:]
+        if shared_quotes is not None:
+            shared_quotes.publish(pair_name, level_one_quote)
+
+        if binary_writer is not None:
+            logging.debug('{}: updated book ({}) {}'.format(pair, side, level_one_quote))
+            binary_writer.write(pair_name, level_one_quote, stale=order_book.is_stale)
+            return
+
+        level_one_dict = level_one_quote.to_dict()
+        level_one_dict['pair'] = pair_name
+        if order_book.is_stale:
+            level_one_dict['stale'] = True
+
+        json_line = json.dumps(level_one_dict, cls=QuoteEncoder)
+        logging.debug('{}: updated book ({}) {}'.format(pair, side, level_one_quote))
+        unbuffered_stdout.write(json_line.encode('utf-8'))
+        unbuffered_stdout.write('\n'.encode('utf-8'))
+
+    if len(pairs) > 0 and all(pair_ticks(parse_pair_from_direct(pair)) is not None for pair in pairs):
+        # integer books only: floats are enough for converting to ticks and much cheaper to decode
+        parse_float = float
+
+    else:
+        parse_float = Decimal
+
+    orderbooks = OrderBookRegistry(source='bitfinex', max_depth=args.max_depth, top_of_book_callback=notify_update)
+    journal = None
+    checkpoint_path = None
+    if args.journal:
+        checkpoint_path = args.journal + '.checkpoint'
+        journal_path = args.journal + '.journal'
+        restored_count = warm_start(orderbooks, checkpoint_path, journal_path, ticks_lookup=pair_ticks_lookup)
+        logging.info('restored {} stale books'.format(restored_count))
+        journal = BookJournal(journal_path)
+
+    recorder = None
+    if args.record:
+        recorder = FrameRecorder(args.record, compression=args.record_compression,
+                                 segment_bytes=int(args.record_segment_size * (1 << 20)),
+                                 segment_seconds=args.record_segment_interval)
+
+    connection = None
+    if args.replay_frames:
+        segments = [args.replay_frames] if os.path.isfile(args.replay_frames) else frame_segments(args.replay_frames)
+        logging.info('replaying frames from {} segments'.format(len(segments)))
+        connection = RecordedConnection(read_frames(segments))
+
+    try:
+        asyncio.get_event_loop().run_until_complete(consumer_handler(pairs, orderbooks, parse_float=parse_float,
+                                                                     verify_checksums=args.checksum, journal=journal,
+                                                                     checkpoint_path=checkpoint_path,
+                                                                     checkpoint_interval=args.checkpoint_interval,
+                                                                     stamp_latency=args.latency,
+                                                                     recorder=recorder, connection=connection))
+
+    finally:
+        if recorder is not None:
+            recorder.close()
 
-    asyncio.get_event_loop().run_until_complete(consumer_handler(pairs, notify_update))
+        if shared_quotes is not None:
+            shared_quotes.close()
 
 
 if __name__ == '__main__':
@@ -123,6 +299,20 @@ if __name__ == '__main__':
     parser.add_argument('--config', type=str, help='configuration file', default='config.json')
     parser.add_argument('--secrets', type=str, help='configuration with secret connection data', default='secrets.json')
     parser.add_argument('--bitfinex', type=str, help='list of pairs to subscribe to on bitfinex (for example: btcusd,eosbtc,eosusd)')
+    parser.add_argument('--max-depth', type=int, help='maximum number of price levels kept per book side', default=100)
+    parser.add_argument('--checksum', action='store_true', help='verify book checksums and resubscribe drifted books')
+    parser.add_argument('--journal', type=str, help='path prefix of the books checkpoint and journal files, enables warm start')
+    parser.add_argument('--checkpoint-interval', type=float, help='seconds between two books checkpoints', default=60.)
+    parser.add_argument('--shared-memory', type=str, help='name of a shared memory block receiving the top of book of each pair')
+    parser.add_argument('--shared-memory-capacity', type=int, help='maximum number of pairs in the shared memory block', default=256)
+    parser.add_argument('--format', type=str, choices=('json', 'binary'), help='output format of the quotes, binary records are read by scan-arb --format binary', default='json')
+    parser.add_argument('--latency', action='store_true', help='stamp quotes with monotonic processing times, histograms are logged at exit and on SIGUSR1')
+    parser.add_argument('--record', type=str, help='path prefix of compressed segment files receiving every raw websocket frame')
+    parser.add_argument('--record-compression', type=str, choices=('gzip', 'lzma'), help='compression of the recorded segments', default='gzip')
+    parser.add_argument('--record-segment-size', type=float, help='uncompressed megabytes after which a new segment is started', default=256.)
+    parser.add_argument('--record-segment-interval', type=float, help='seconds after which a new segment is started', default=3600.)
+    parser.add_argument('--replay-frames', type=str, help='recorded frames (segment file or --record prefix) replayed instead of connecting to bitfinex')
+    parser.add_argument('--ticks', action='append', help='fixed-point book for a pair as pair:tick_size:lot_size (ex: "btcusd:0.1:0.00000001")')
 
     args = parser.parse_args()
     main(args)
@@ -1,12 +1,63 @@
 import argparse
 import logging
+import os
 
 import sys
+import time
+
+import dateutil.parser
 from collections import defaultdict
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Generator, Iterable, Tuple
 
 from arbitrage import parse_strategy, parse_quote_json
+from arbitrage.entities import CurrencyPair, ForexQuote
+from arbitrage.scanner import StrategyCache, StrategyScanner, read_strategies, strategies_from_symbols
+from arbitrage.archive import QuoteArchive
+from arbitrage.binaryquotes import BinaryQuoteReader
+from arbitrage.cycles import CurrencyGraph
+from arbitrage.matrix import StrategyMatrix
+from arbitrage.numeric import numeric_backend
+from arbitrage.opportunities import OpportunityTracker
+from arbitrage.latency import LatencyRecorder, STAGE_DECISION, install_dump_handlers
+from arbitrage.replay import QuoteReplay, between
+from arbitrage.sharedquotes import SharedQuoteReader, naive_utc
+
+
+def read_quotes(prices_input: Iterable[str]) -> Generator[Tuple[CurrencyPair, ForexQuote], None, None]:
+    """
+
+    :param prices_input: quotes formatted as json lines
+    :return:
+    """
+    for line in prices_input:
+        if len(line.strip()) == 0:
+            continue
+
+        logging.debug('received update: {}'.format(line))
+        yield parse_quote_json(line)
+
+
+def poll_quotes(shared_memory_name: str, poll_interval: float) -> Generator[Tuple[CurrencyPair, ForexQuote], None, None]:
+    """
+
+    :param shared_memory_name: shared top of book table written by pricing-source
+    :param poll_interval: seconds to wait when no quote has changed
+    :return:
+    """
+    reader = SharedQuoteReader(shared_memory_name)
+    try:
+        while True:
+            updates = reader.poll()
+            if len(updates) == 0:
+                time.sleep(poll_interval)
+
+            for pair, quote in updates:
+                yield pair, quote
+
+    finally:
+        reader.close()
 
 
 def main(args):
@@ -17,39 +68,146 @@ def main(args):
             thresholds[currency.upper()] = Decimal(amount)
 
     logging.info('applying thresholds: {}'.format(thresholds))
+    latency_recorder = None
+    if args.latency:
+        latency_recorder = LatencyRecorder('scan-arb')
+        install_dump_handlers(latency_recorder)
+
+    strategies = list()
     if args.strategy:
-        strategy = parse_strategy(args.strategy.upper())
-        logging.info('starting strategy: {}'.format(strategy))
-        if args.replay:
-            prices_input = open(args.replay, 'r')
+        strategies.append(parse_strategy(args.strategy.upper()))
+
+    if args.strategies:
+        with open(args.strategies, 'r') as strategies_file:
+            strategies += read_strategies(strategies_file)
+
+    if args.all_strategies:
+        import bitfinex
+        if args.strategies_cache:
+            cache = StrategyCache(args.strategies_cache)
+            strategies += strategies_from_symbols(cache.symbols(bitfinex.Client().symbols), cache=cache)
 
         else:
-            logging.info('loading prices from standard input')
-            prices_input = sys.stdin
+            strategies += strategies_from_symbols(bitfinex.Client().symbols())
 
-        for line in prices_input:
-            if len(line.strip()) == 0:
-                continue
+    if args.max_age:
+        for strategy in strategies:
+            strategy.max_age = timedelta(seconds=args.max_age)
+
+    if args.min_profit_rate is not None and any(threshold < 0 for threshold in thresholds.values()):
+        logging.warning('negative threshold: disabling break-even pruning')
+
+    elif args.min_profit_rate is not None:
+        # only updates crossing the break-even price of their leg are evaluated
+        for strategy in strategies:
+            strategy.min_profit_rate = args.min_profit_rate
+
+    currency_graph = None
+    if args.cycles:
+        currency_graph = CurrencyGraph(max_length=args.cycles, fee=args.fee)
+        logging.info('searching cycles up to {} legs'.format(args.cycles))
+
+    if len(strategies) == 0 and currency_graph is None:
+        logging.info('no strategy provided: terminating')
+        return
+
+    if args.matrix:
+        scanner = None
+        matrix = StrategyMatrix(strategies)
+        matrix.set_thresholds(thresholds)
+        logging.info('starting {} strategies on {} pairs: {}'.format(len(matrix), len(matrix.pairs), matrix.strategies))
+
+    else:
+        matrix = None
+        scanner = StrategyScanner(strategies, backend=numeric_backend(args.numeric))
+        logging.info('starting {} strategies on {} pairs ({}): {}'.format(len(scanner), len(scanner.pairs()),
+                                                                          args.numeric, scanner.strategies))
 
-            logging.debug('received update: {}'.format(line))
-            pair, quote = parse_quote_json(line)
-            strategy.update_quote(pair, quote)
-            target_trades, target_balances = strategy.find_opportunity(illimited_volume=False)
+    # quote timestamps are naive UTC
+    start = naive_utc(dateutil.parser.parse(args.start)) if args.start else None
+    end = naive_utc(dateutil.parser.parse(args.end)) if args.end else None
+    if args.replay and os.path.isdir(args.replay):
+        logging.info('replaying quote archive {}'.format(args.replay))
+        quotes = QuoteArchive(args.replay).quotes(start=start, end=end)
+
+    elif args.replay and args.format == 'binary':
+        # no index for binary recordings: the range is filtered while reading
+        quotes = between(BinaryQuoteReader(open(args.replay, 'rb')), start, end)
+
+    elif args.replay:
+        quotes = QuoteReplay(args.replay).quotes(start, end, batch_size=args.replay_batch)
+
+    elif args.shared_memory:
+        logging.info('polling prices from shared memory {}'.format(args.shared_memory))
+        quotes = between(poll_quotes(args.shared_memory, args.poll_interval), start, end)
+
+    elif args.format == 'binary':
+        logging.info('loading binary prices from standard input')
+        quotes = between(BinaryQuoteReader(sys.stdin.buffer), start, end)
+
+    else:
+        logging.info('loading prices from standard input')
+        quotes = between(read_quotes(sys.stdin), start, end)
+
+    tracker = None
+    if not args.every_tick:
+        tracker = OpportunityTracker()
+
+    last_timestamp = None
+
+    for pair, quote in quotes:
+        if matrix is not None:
+            # exact evaluation of the candidates flagged by the vectorized one
+            opportunities = [(matrix.strategies[row],) + matrix.confirm(row)
+                             for row in matrix.profitable(matrix.update_quote(pair, quote))]
+
+        else:
+            opportunities = scanner.update_quote(pair, quote, illimited_volume=False)
+
+        if latency_recorder is not None and quote.latency is not None:
+            quote.latency.mark(STAGE_DECISION)
+            latency_recorder.observe(quote.latency)
+
+        if currency_graph is not None:
+            for cycle in currency_graph.update_quote(pair, quote):
+                print('{}: {}'.format(datetime.now(), cycle))
+
+        enabled_opportunities = list()
+        for strategy, target_trades, target_balances in opportunities:
             if target_balances is None:
                 continue
 
             enable_trades = False
             for currency in target_balances:
-                if target_balances[currency] > thresholds['currency']:
+                if target_balances[currency] > thresholds[currency]:
                     enable_trades = True
                     break
 
+            if enable_trades and scanner is not None and not scanner.backend.is_exact:
+                # detected with approximate numbers, confirmed in Decimal
+                target_trades, target_balances = scanner.confirm(strategy)
+                enable_trades = target_balances is not None and any(
+                    target_balances[currency] > thresholds[currency] for currency in target_balances)
+
             if enable_trades:
+                enabled_opportunities.append((strategy, target_trades, target_balances))
+
+        if tracker is None:
+            for strategy, target_trades, target_balances in enabled_opportunities:
                 now = datetime.now()
-                print('{}: {}'.format(now, target_trades))
+                print('{}: {} {}'.format(now, strategy, target_trades))
 
-    else:
-        logging.info('no strategy provided: terminating')
+        else:
+            last_timestamp = quote.timestamp
+            for event in tracker.update_pair(pair, quote.timestamp, enabled_opportunities):
+                print('{}: {}'.format(event.timestamp, event))
+
+    if tracker is not None and last_timestamp is not None:
+        # end of the stream
+        for event in tracker.close_all(last_timestamp):
+            print('{}: {}'.format(event.timestamp, event))
+
+        logging.info('{} opportunity signals coalesced into {} events'.format(tracker.signals, tracker.events))
 
 
 if __name__ == '__main__':
@@ -62,7 +220,24 @@ if __name__ == '__main__':
     parser.add_argument('--config', type=str, help='configuration file', default='config.json')
     parser.add_argument('--secrets', type=str, help='configuration with secret connection data', default='secrets.json')
     parser.add_argument('--strategy', type=str, help='strategy as a formatted string (for example: eth/btc,btc/usd,eth/usd')
-    parser.add_argument('--replay', type=str, help='use recorded prices')
+    parser.add_argument('--strategies', type=str, help='file listing one strategy per line, same format as --strategy')
+    parser.add_argument('--all-strategies', action='store_true', help='scan all the strategies available from bitfinex pairs')
+    parser.add_argument('--strategies-cache', type=str, help='file caching the bitfinex symbols and the strategies found with --all-strategies')
+    parser.add_argument('--matrix', action='store_true', help='vectorized evaluation, only the strategies found profitable are evaluated exactly')
+    parser.add_argument('--numeric', type=str, choices=('decimal', 'float64'), help='number type used for detecting opportunities, float64 ones are confirmed in decimal', default='decimal')
+    parser.add_argument('--cycles', type=int, help='also search profitable cycles up to the given number of legs (3 or more) on all quoted pairs')
+    parser.add_argument('--fee', type=float, help='proportional fee per trade applied to cycles', default=0.)
+    parser.add_argument('--max-age', type=float, help='seconds after which a leg quote is too old for evaluating its strategies')
+    parser.add_argument('--min-profit-rate', type=float, help='enables break-even pruning: strategies are evaluated only when the rates of their legs multiply to more than 1 + rate (ex: 0), all strategies are evaluated on every quote by default')
+    parser.add_argument('--replay', type=str, help='use recorded prices, json lines, binary records or quote archive directory (see convert-quotes.py)')
+    parser.add_argument('--format', type=str, choices=('json', 'binary'), help='format of the prices, as written by pricing-source --format', default='json')
+    parser.add_argument('--start', type=str, help='first quote time (ex: "2017-09-02T08:00"), json recordings seeking through an index built next to them')
+    parser.add_argument('--end', type=str, help='stops at the first quote at or after this time')
+    parser.add_argument('--replay-batch', type=int, help='number of recorded lines decoded at once', default=4096)
+    parser.add_argument('--shared-memory', type=str, help='read prices from the shared memory block written by pricing-source')
+    parser.add_argument('--poll-interval', type=float, help='seconds between two polls of the shared memory block', default=0.0005)
+    parser.add_argument('--latency', action='store_true', help='record latencies of the quotes stamped by pricing-source, histograms are logged at exit and on SIGUSR1')
+    parser.add_argument('--every-tick', action='store_true', help='print opportunities on every quote instead of open / update / close events')
     parser.add_argument('--threshold', action='append', help='lower profit limit for given currency (ex: "USD:0.02")')
     parser.add_argument('--amount', type=str, help='maximum amount for trading expressed in indirect pair 1 quoted currency', default=Decimal(1))
 
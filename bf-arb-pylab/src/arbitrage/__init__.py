@@ -1,12 +1,13 @@
-import itertools
 import json
 import logging
 import re
+from datetime import datetime
 from decimal import Decimal
 import dateutil.parser
-from typing import Generator, Iterable, Tuple
+from typing import Any, Dict, Generator, Iterable, List, Tuple
 
 from arbitrage.entities import ArbitrageStrategy, CurrencyPair, CurrencyConverter, ForexQuote, OrderBook, PriceVolume
+from arbitrage.latency import LatencyStamps, STAGE_PARSED
 
 
 def parse_pair_from_indirect(pair_code: str) -> CurrencyPair:
@@ -61,36 +62,99 @@ def parse_strategy(strategy_string: str, indirect_mode: bool=False) -> Arbitrage
 
 def create_strategies(pairs: Iterable[CurrencyPair]) -> Generator[ArbitrageStrategy, None, None]:
     """
+    Enumerates triangles through an index of the quote currencies of each base: for every pair <l1/l2>, the common
+    legs are the currencies quoting both l1 and l2.
 
-    :param assets: iterable currency codes
     :param pairs: set of CurrencyPair instances
     :return: strategy (common_pair, indirect_pair_1, indirect_pair_2)
     """
     pairs = set(pairs)
     assets = set()
+    quotes_by_base = dict()
     for pair in pairs:
         assets.update(pair.assets)
+        quotes_by_base.setdefault(pair.base, set()).add(pair.quote)
 
     logging.info('available pairs ({}): {}'.format(len(pairs), pairs))
     logging.info('available assets ({}): {}'.format(len(assets), assets))
-    for common_leg, leg_pair1, leg_pair2 in itertools.permutations(assets, 3):
-        logging.debug('checking legs: {}, {}, {}'.format(common_leg, leg_pair1, leg_pair2))
-        common_pair = CurrencyPair(leg_pair1, leg_pair2)
-        indirect_pair_1 = CurrencyPair(leg_pair1, common_leg)
-        indirect_pair_2 = CurrencyPair(leg_pair2, common_leg)
+    for common_pair in sorted(pairs):
+        leg_pair1, leg_pair2 = common_pair.base, common_pair.quote
+        common_legs = quotes_by_base[leg_pair1].intersection(quotes_by_base.get(leg_pair2, ()))
+        for common_leg in sorted(common_legs.difference({leg_pair1, leg_pair2})):
+            yield ArbitrageStrategy(common_pair, CurrencyPair(leg_pair1, common_leg), CurrencyPair(leg_pair2, common_leg))
 
-        if pairs.issuperset({common_pair, indirect_pair_1, indirect_pair_2}):
-            yield ArbitrageStrategy(common_pair, indirect_pair_1, indirect_pair_2)
 
-        else:
-            logging.debug(
-                'incompatible combination: {}, {}, {} not in {}'.format(common_pair, indirect_pair_1, indirect_pair_2,
-                                                                        pairs))
-            continue
+_pairs_by_string = dict()  # type: Dict[str, CurrencyPair]
 
 
-def parse_quote_json(line: str) -> Tuple[CurrencyPair, ForexQuote]:
+def cached_currency_pair(pair_string: str) -> CurrencyPair:
+    """
+
+    :param pair_string: format <pair_1/pair_2>, as written by pricing-source
+    :return: pair parsed once per distinct string
+    """
+    pair = _pairs_by_string.get(pair_string)
+    if pair is None:
+        pair = parse_currency_pair(pair_string, separator='/')
+        _pairs_by_string[pair_string] = pair
+
+    return pair
+
+
+def parse_iso_timestamp(timestamp: str) -> datetime:
+    """
+    Fixed format parsing of timestamps written by datetime.isoformat() without timezone.
+
+    :param timestamp: YYYY-MM-DDTHH:MM:SS.ffffff or YYYY-MM-DDTHH:MM:SS
+    :return: None when the format is different
     """
+    if len(timestamp) == 26 and timestamp[19] == '.':
+        microsecond = int(timestamp[20:26])
+
+    elif len(timestamp) == 19:
+        microsecond = 0
+
+    else:
+        return None
+
+    if timestamp[4] != '-' or timestamp[7] != '-' or timestamp[10] != 'T' or timestamp[13] != ':' \
+            or timestamp[16] != ':':
+        return None
+
+    return datetime(int(timestamp[0:4]), int(timestamp[5:7]), int(timestamp[8:10]), int(timestamp[11:13]),
+                    int(timestamp[14:16]), int(timestamp[17:19]), microsecond)
+
+
+def quote_from_data(data: Dict[str, Any]) -> Tuple[CurrencyPair, ForexQuote]:
+    """
+    Fast path for quotes in the format of pricing-source.
+
+    :param data: decoded json line
+    :return:
+    :raise ValueError: when the timestamp does not have the fixed format
+    """
+    timestamp = parse_iso_timestamp(data['timestamp'])
+    if timestamp is None:
+        raise ValueError('unexpected timestamp format: {}'.format(data['timestamp']))
+
+    bid_data, ask_data = data['bid'], data['ask']
+    bid = PriceVolume(Decimal(bid_data['price']), Decimal(bid_data['amount']))
+    ask = PriceVolume(Decimal(ask_data['price']), Decimal(ask_data['amount']))
+    latency = None
+    if 'latency' in data:
+        latency = LatencyStamps(data['latency'])
+
+    quote = ForexQuote(timestamp=timestamp, bid=bid, ask=ask, source=data['source'], latency=latency)
+    pair = cached_currency_pair(data['pair'])
+    if latency is not None:
+        latency.mark(STAGE_PARSED)
+
+    return pair, quote
+
+
+def parse_quote_json_generic(line: str) -> Tuple[CurrencyPair, ForexQuote]:
+    """
+    Parses any timestamp format accepted by dateutil.
 
     :param line:
     :return:
@@ -99,11 +163,59 @@ def parse_quote_json(line: str) -> Tuple[CurrencyPair, ForexQuote]:
     timestamp = dateutil.parser.parse(data['timestamp'])
     bid = PriceVolume(Decimal(data['bid']['price']), Decimal(data['bid']['amount']))
     ask = PriceVolume(Decimal(data['ask']['price']), Decimal(data['ask']['amount']))
-    quote = ForexQuote(timestamp=timestamp, bid=bid, ask=ask, source=data['source'])
+    latency = None
+    if 'latency' in data:
+        latency = LatencyStamps(data['latency'])
+
+    quote = ForexQuote(timestamp=timestamp, bid=bid, ask=ask, source=data['source'], latency=latency)
     pair = parse_currency_pair(data['pair'], separator='/')
+    if latency is not None:
+        latency.mark(STAGE_PARSED)
+
     return pair, quote
 
 
+def parse_quote_json(line: str) -> Tuple[CurrencyPair, ForexQuote]:
+    """
+
+    :param line:
+    :return:
+    """
+    try:
+        return quote_from_data(json.loads(line))
+
+    except (ValueError, KeyError, TypeError, ArithmeticError):
+        return parse_quote_json_generic(line)
+
+
+def parse_quote_lines(lines: Iterable[str]) -> List[Tuple[CurrencyPair, ForexQuote]]:
+    """
+    Decodes a block of json lines in a single json call, lines failing the fast path are parsed one by one.
+
+    :param lines: empty lines are skipped
+    :return: (pair, quote) for each line
+    """
+    lines = [line for line in lines if len(line.strip()) > 0]
+    try:
+        block = json.loads('[{}]'.format(','.join(lines)))
+
+    except ValueError:
+        block = None
+
+    if block is None or len(block) != len(lines):
+        return [parse_quote_json(line) for line in lines]
+
+    quotes = list()
+    for line, data in zip(lines, block):
+        try:
+            quotes.append(quote_from_data(data))
+
+        except (ValueError, KeyError, TypeError, ArithmeticError):
+            quotes.append(parse_quote_json_generic(line))
+
+    return quotes
+
+
 def parse_quote(line: str) -> ForexQuote:
     """
 
@@ -0,0 +1,243 @@
+"""
+Columnar archive of recorded quotes: a directory holding, for each pair, chunks of quotes as NumPy structured arrays
+(.npy files), and an index.json file with the pair dictionary:
+
+    {"version": 1, "scale_exponent": 8, "quotes": total count,
+     "pairs": {"BTC/USD": {"id": 0, "source": "bitfinex",
+                           "chunks": [{"file": "0000-000000.npy", "count": 65536, "start": ns, "end": ns}, ...]}}}
+
+Each chunk row holds the sequence number of the quote in the recording, its timestamp in nanoseconds since epoch and
+its bid / ask prices and volumes as int64 scaled by 10^8 (see arbitrage.sharedquotes). Chunks are memory-mapped when
+loaded, and skipped when outside of the requested time range.
+"""
+import heapq
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Generator, Iterable, List, Tuple
+
+import numpy
+
+from arbitrage import cached_currency_pair, parse_quote_lines
+from arbitrage.entities import CurrencyPair, ForexQuote, PriceVolume
+from arbitrage.sharedquotes import SCALE_EXPONENT, ScaledDecimals, datetime_to_ns, ns_to_datetime, to_scaled
+
+ARCHIVE_VERSION = 1
+ARCHIVE_INDEX = 'index.json'
+QUOTE_DTYPE = numpy.dtype([('sequence', '<i8'), ('timestamp', '<i8'), ('bid_price', '<i8'), ('bid_volume', '<i8'),
+                           ('ask_price', '<i8'), ('ask_volume', '<i8')])
+VALUE_FIELDS = ('bid_price', 'bid_volume', 'ask_price', 'ask_volume')
+
+
+def pair_name(pair: CurrencyPair) -> str:
+    return '{}/{}'.format(pair.base, pair.quote)
+
+
+class QuoteArchiveWriter(object):
+    """
+    Appends quotes to a new archive, keeping at most one chunk per pair in memory.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 65536):
+        """
+
+        :param path: archive directory, created if missing
+        :param chunk_size: number of quotes per chunk
+        """
+        os.makedirs(path, exist_ok=True)
+        self._path = path
+        self._chunk_size = chunk_size
+        self._pairs = dict()  # type: Dict[str, Dict[str, Any]]
+        self._rows = dict()  # type: Dict[str, List[Tuple[int, int, int, int, int, int]]]
+        self._count = 0
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def append(self, pair: CurrencyPair, quote: ForexQuote) -> None:
+        """
+
+        :param pair:
+        :param quote: complete quote
+        :return:
+        """
+        name = pair_name(pair)
+        rows = self._rows.get(name)
+        if rows is None:
+            self._pairs[name] = {'id': len(self._pairs), 'source': quote.source, 'chunks': []}
+            rows = self._rows[name] = list()
+
+        rows.append((self._count, datetime_to_ns(quote.timestamp), to_scaled(quote.bid.price),
+                     to_scaled(quote.bid.volume), to_scaled(quote.ask.price), to_scaled(quote.ask.volume)))
+        self._count += 1
+        if len(rows) >= self._chunk_size:
+            self._flush(name)
+
+    def _flush(self, name: str) -> None:
+        rows = self._rows[name]
+        if len(rows) == 0:
+            return
+
+        pair_data = self._pairs[name]
+        chunk = numpy.array(rows, dtype=QUOTE_DTYPE)
+        file_name = '{:04d}-{:06d}.npy'.format(pair_data['id'], len(pair_data['chunks']))
+        numpy.save(os.path.join(self._path, file_name), chunk)
+        pair_data['chunks'].append({'file': file_name, 'count': len(chunk), 'start': int(chunk['timestamp'].min()),
+                                    'end': int(chunk['timestamp'].max())})
+        self._rows[name] = list()
+
+    def close(self) -> None:
+        """
+        Writes the remaining chunks and the index.
+
+        :return:
+        """
+        for name in self._rows:
+            self._flush(name)
+
+        index = {'version': ARCHIVE_VERSION, 'scale_exponent': SCALE_EXPONENT, 'quotes': self._count,
+                 'pairs': self._pairs}
+        temporary_path = os.path.join(self._path, ARCHIVE_INDEX + '.tmp')
+        with open(temporary_path, 'w', encoding='utf-8') as index_file:
+            json.dump(index, index_file, indent=2)
+
+        os.replace(temporary_path, os.path.join(self._path, ARCHIVE_INDEX))
+
+    def __enter__(self) -> 'QuoteArchiveWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+
+
+def convert_quote_lines(lines: Iterable[str], path: str, chunk_size: int = 65536, batch_size: int = 4096) -> int:
+    """
+    Streams json quote lines, as written by pricing-source, into a new archive.
+
+    :param lines:
+    :param path: archive directory
+    :param chunk_size: number of quotes per chunk
+    :param batch_size: number of lines decoded at once
+    :return: number of quotes archived
+    """
+    with QuoteArchiveWriter(path, chunk_size=chunk_size) as writer:
+        batch = list()
+        for line in lines:
+            batch.append(line)
+            if len(batch) >= batch_size:
+                for pair, quote in parse_quote_lines(batch):
+                    writer.append(pair, quote)
+
+                batch = list()
+
+        for pair, quote in parse_quote_lines(batch):
+            writer.append(pair, quote)
+
+    return writer.count
+
+
+class QuoteArchive(object):
+    """
+    Read access to an archive, as arrays or as quotes.
+    """
+
+    def __init__(self, path: str):
+        """
+
+        :param path: archive directory
+        """
+        with open(os.path.join(path, ARCHIVE_INDEX), 'r', encoding='utf-8') as index_file:
+            index = json.load(index_file)
+
+        if index.get('version') != ARCHIVE_VERSION or index.get('scale_exponent') != SCALE_EXPONENT:
+            raise ValueError('unsupported quote archive: {}'.format(path))
+
+        self._path = path
+        self._count = index['quotes']
+        self._pairs = index['pairs']
+
+    def pairs(self) -> List[CurrencyPair]:
+        return [cached_currency_pair(name) for name in self._pairs]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _chunks(self, pair: CurrencyPair, start: datetime = None,
+                end: datetime = None) -> Generator[numpy.ndarray, None, None]:
+        pair_data = self._pairs.get(pair_name(pair))
+        if pair_data is None:
+            return
+
+        start_ns = None if start is None else datetime_to_ns(start)
+        end_ns = None if end is None else datetime_to_ns(end)
+        for chunk_data in pair_data['chunks']:
+            if (start_ns is not None and chunk_data['end'] < start_ns) or \
+                    (end_ns is not None and chunk_data['start'] >= end_ns):
+                continue
+
+            chunk = numpy.load(os.path.join(self._path, chunk_data['file']), mmap_mode='r')
+            if start_ns is not None or end_ns is not None:
+                selected = numpy.ones(len(chunk), dtype=bool)
+                if start_ns is not None:
+                    selected &= chunk['timestamp'] >= start_ns
+
+                if end_ns is not None:
+                    selected &= chunk['timestamp'] < end_ns
+
+                chunk = chunk[selected]
+
+            yield chunk
+
+    def arrays(self, pair: CurrencyPair, start: datetime = None, end: datetime = None,
+               scaled: bool = False) -> Dict[str, numpy.ndarray]:
+        """
+
+        :param pair:
+        :param start: first quote time
+        :param end: quotes before end
+        :param scaled: keeps prices and volumes as int64 scaled by 10^8, float64 otherwise
+        :return: 'sequence', 'timestamp' (int64 nanoseconds since epoch), 'bid_price', 'bid_volume', 'ask_price',
+        'ask_volume' arrays
+        """
+        chunks = list(self._chunks(pair, start, end))
+        if len(chunks) == 0:
+            data = numpy.empty(0, dtype=QUOTE_DTYPE)
+
+        else:
+            data = numpy.concatenate(chunks)
+
+        arrays = {field: numpy.asarray(data[field]) for field in QUOTE_DTYPE.names}
+        if not scaled:
+            for field in VALUE_FIELDS:
+                arrays[field] = arrays[field] / 10. ** SCALE_EXPONENT
+
+        return arrays
+
+    def _pair_quotes(self, pair: CurrencyPair, start: datetime,
+                     end: datetime) -> Generator[Tuple[int, CurrencyPair, ForexQuote], None, None]:
+        source = self._pairs[pair_name(pair)]['source']
+        decimals = ScaledDecimals().decimals
+        for chunk in self._chunks(pair, start, end):
+            for sequence, timestamp_ns, bid_price, bid_volume, ask_price, ask_volume in chunk.tolist():
+                values = decimals((bid_price, bid_volume, ask_price, ask_volume))
+                yield sequence, pair, ForexQuote(ns_to_datetime(timestamp_ns), PriceVolume(values[0], values[1]),
+                                                 PriceVolume(values[2], values[3]), source=source)
+
+    def quotes(self, pairs: Iterable[CurrencyPair] = None, start: datetime = None,
+               end: datetime = None) -> Generator[Tuple[CurrencyPair, ForexQuote], None, None]:
+        """
+        Lazily decodes quotes, in the order of the recording.
+
+        :param pairs: all pairs by default
+        :param start: first quote time
+        :param end: quotes before end
+        :return:
+        """
+        if pairs is None:
+            pairs = self.pairs()
+
+        streams = [self._pair_quotes(pair, start, end) for pair in pairs if pair_name(pair) in self._pairs]
+        for sequence, pair, quote in heapq.merge(*streams, key=lambda item: item[0]):
+            yield pair, quote
@@ -0,0 +1,165 @@
+"""
+Fixed-width binary quote stream, as an alternative to json lines between pricing-source and scan-arb.
+
+The stream starts with a header, magic (4 bytes), version (uint16) and padding (uint16), followed by 48 bytes
+records starting with a record type (uint16) and a pair id (uint16):
+
+    pair record:   type 1, pair id, pair name (24 bytes) and source (20 bytes), zero padded utf-8
+    quote record:  type 2, pair id, flags (uint32), timestamp in nanoseconds since epoch (int64), bid price,
+                   bid volume, ask price, ask volume (int64), prices and volumes being scaled by 10^8
+
+A pair record is written before the first quote of each pair. Latency stamps are not carried.
+"""
+import struct
+from typing import BinaryIO, Dict, Generator, List, Tuple
+
+from arbitrage import cached_currency_pair
+from arbitrage.entities import CurrencyPair, ForexQuote, PriceVolume
+from arbitrage.sharedquotes import ScaledDecimals, datetime_to_ns, ns_to_datetime, to_scaled
+
+BINARY_QUOTES_MAGIC = b'QBIN'
+BINARY_QUOTES_VERSION = 1
+RECORD_PAIR = 1
+RECORD_QUOTE = 2
+FLAG_STALE = 0x1
+_HEADER = struct.Struct('<4sHH')
+_PAIR_RECORD = struct.Struct('<HH24s20s')
+_QUOTE_RECORD = struct.Struct('<HHIqqqqq')
+RECORD_SIZE = _QUOTE_RECORD.size
+
+
+class BinaryQuoteWriter(object):
+    """
+    Encodes quotes to a binary stream.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        """
+
+        :param stream: unbuffered or flushed by the caller
+        """
+        self._stream = stream
+        self._pair_ids = dict()  # type: Dict[str, int]
+        self._stream.write(_HEADER.pack(BINARY_QUOTES_MAGIC, BINARY_QUOTES_VERSION, 0))
+
+    def _register(self, pair: str, source: str) -> int:
+        pair_id = len(self._pair_ids)
+        if pair_id > 0xffff:
+            raise OverflowError('too many pairs for the binary quote format')
+
+        encoded_pair = pair.encode('utf-8')
+        encoded_source = (source or '').encode('utf-8')
+        if len(encoded_pair) > 24 or len(encoded_source) > 20:
+            raise ValueError('pair name or source too long: {}, {}'.format(pair, source))
+
+        self._stream.write(_PAIR_RECORD.pack(RECORD_PAIR, pair_id, encoded_pair, encoded_source))
+        self._pair_ids[pair] = pair_id
+        return pair_id
+
+    def write(self, pair: str, quote: ForexQuote, stale: bool = False) -> None:
+        """
+
+        :param pair: pair name (ex: 'BTC/USD')
+        :param quote: complete quote
+        :param stale: book not confirmed by the exchange yet
+        :return:
+        """
+        pair_id = self._pair_ids.get(pair)
+        if pair_id is None:
+            pair_id = self._register(pair, quote.source)
+
+        self._stream.write(_QUOTE_RECORD.pack(RECORD_QUOTE, pair_id, FLAG_STALE if stale else 0,
+                                              datetime_to_ns(quote.timestamp),
+                                              to_scaled(quote.bid.price), to_scaled(quote.bid.volume),
+                                              to_scaled(quote.ask.price), to_scaled(quote.ask.volume)))
+
+
+class BinaryQuoteReader(object):
+    """
+    Decodes a binary quote stream, records being unpacked in place from the read buffer.
+    """
+
+    def __init__(self, stream: BinaryIO, buffer_records: int = 1024):
+        """
+
+        :param stream: binary stream supporting readinto1() or readinto()
+        :param buffer_records: size of the read buffer, in records
+        """
+        self._stream = stream
+        self._buffer = bytearray(max(buffer_records, 1) * RECORD_SIZE)
+        self._view = memoryview(self._buffer)
+        self._size = 0
+        self._pairs = dict()  # type: Dict[int, Tuple[CurrencyPair, str]]
+        self._has_header = False
+        self._decimals = ScaledDecimals()
+
+    def _read(self) -> int:
+        if hasattr(self._stream, 'readinto1'):
+            # returns as soon as some bytes are available, for live streams
+            return self._stream.readinto1(self._view[self._size:])
+
+        return self._stream.readinto(self._view[self._size:])
+
+    def decode(self, view: memoryview) -> List[Tuple[CurrencyPair, ForexQuote]]:
+        """
+
+        :param view: whole records
+        :return: quotes of the records
+        """
+        quotes = list()
+        decimals = self._decimals.decimals
+        for offset in range(0, len(view) - len(view) % RECORD_SIZE, RECORD_SIZE):
+            record_type, pair_id, flags, timestamp_ns, bid_price, bid_volume, ask_price, ask_volume = \
+                _QUOTE_RECORD.unpack_from(view, offset)
+            if record_type == RECORD_QUOTE:
+                values = decimals((bid_price, bid_volume, ask_price, ask_volume))
+                pair, source = self._pairs[pair_id]
+                quotes.append((pair, ForexQuote(ns_to_datetime(timestamp_ns), PriceVolume(values[0], values[1]),
+                                                PriceVolume(values[2], values[3]), source=source)))
+
+            elif record_type == RECORD_PAIR:
+                _, _, pair_name, source = _PAIR_RECORD.unpack_from(view, offset)
+                self._pairs[pair_id] = (cached_currency_pair(pair_name.rstrip(b'\0').decode('utf-8')),
+                                        source.rstrip(b'\0').decode('utf-8'))
+
+            else:
+                raise ValueError('unexpected record type: {}'.format(record_type))
+
+        return quotes
+
+    def _check_header(self) -> None:
+        magic, version, _ = _HEADER.unpack_from(self._view, 0)
+        if magic != BINARY_QUOTES_MAGIC or version != BINARY_QUOTES_VERSION:
+            raise ValueError('unsupported binary quote stream')
+
+        self._size -= _HEADER.size
+        self._buffer[:self._size] = self._buffer[_HEADER.size:_HEADER.size + self._size]
+        self._has_header = True
+
+    def __iter__(self) -> Generator[Tuple[CurrencyPair, ForexQuote], None, None]:
+        """
+
+        :return: quotes until the end of the stream
+        """
+        while True:
+            count = self._read()
+            if not count:
+                break
+
+            self._size += count
+            if not self._has_header:
+                if self._size < _HEADER.size:
+                    continue
+
+                self._check_header()
+
+            records_size = self._size - self._size % RECORD_SIZE
+            quotes = self.decode(self._view[:records_size])
+            # partial record kept for the next read
+            self._size -= records_size
+            self._buffer[:self._size] = self._buffer[records_size:records_size + self._size]
+            for pair, quote in quotes:
+                yield pair, quote
+
+        if self._size > 0:
+            raise ValueError('truncated binary quote stream ({} bytes left)'.format(self._size))
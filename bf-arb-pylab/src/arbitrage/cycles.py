@@ -0,0 +1,207 @@
+"""
+Arbitrage cycles of any length on the currency graph.
+
+Each pair with a complete quote gives two edges weighted by the opposite of the log of their rate:
+
+    base -> quote   selling the base currency at the bid, rate = bid
+    quote -> base   buying the base currency at the ask, rate = 1 / ask
+
+A cycle is profitable when its rates multiply to more than one, that is when its weight is negative. When a quote
+arrives only the cycles through its two edges can have turned profitable: each one is searched by a hop-bounded
+relaxation of the simple paths from the edge head back to its tail. A path is only dominated by a lighter one ending
+in the same currency through the same set of currencies, as both can be extended the same way: the search is exact.
+"""
+import math
+from typing import Dict, List, Tuple
+
+from arbitrage.entities import CurrencyPair, ForexQuote
+
+_WEIGHT_TOLERANCE = 1e-12
+
+
+class ArbitrageCycle(object):
+    """
+    Profitable sequence of trades starting and ending in the same currency.
+    """
+
+    def __init__(self, currencies: List[str], legs: List[Tuple[CurrencyPair, str, float, float]], weight: float):
+        """
+
+        :param currencies: visited currencies, the first one being repeated at the end
+        :param legs: (pair, 'sell' or 'buy', price, volume) for each trade
+        :param weight: sum of the edge weights
+        """
+        self._currencies = currencies
+        self._legs = legs
+        self._weight = weight
+
+    @property
+    def currencies(self) -> List[str]:
+        return self._currencies
+
+    @property
+    def legs(self) -> List[Tuple[CurrencyPair, str, float, float]]:
+        return self._legs
+
+    @property
+    def rate(self) -> float:
+        """
+
+        :return: amount of the starting currency obtained for one unit, fees included
+        """
+        return math.exp(-self._weight)
+
+    @property
+    def profit(self) -> float:
+        return self.rate - 1.
+
+    def key(self) -> Tuple[str, ...]:
+        """
+
+        :return: currencies of the cycle rotated to start from the smallest one
+        """
+        currencies = self._currencies[:-1]
+        start = currencies.index(min(currencies))
+        return tuple(currencies[start:] + currencies[:start])
+
+    def __len__(self) -> int:
+        return len(self._legs)
+
+    def __repr__(self):
+        return '[{} {:+.6%}: {}]'.format('->'.join(self._currencies), self.profit,
+                                         ', '.join('{} {} {}@{}'.format(direction, pair, volume, price)
+                                                   for pair, direction, price, volume in self._legs))
+
+
+class CurrencyGraph(object):
+    """
+    Log-rate graph of the quoted currencies, updated quote by quote.
+    """
+
+    def __init__(self, max_length: int = 4, fee: float = 0.):
+        """
+
+        :param max_length: maximum number of trades in a cycle
+        :param fee: proportional fee charged on each trade (ex: 0.002)
+        """
+        if max_length < 3:
+            # a 2 legs cycle trades a pair back and forth, losing its spread
+            raise ValueError('cycles need at least 3 legs: {}'.format(max_length))
+
+        self._max_length = max_length
+        self._fee_weight = -math.log(1. - fee)
+        # currency -> {next currency: (weight, pair, direction, price, volume)}
+        self._edges = dict()  # type: Dict[str, Dict[str, Tuple[float, CurrencyPair, str, float, float]]]
+
+    @property
+    def max_length(self) -> int:
+        return self._max_length
+
+    def currencies(self) -> List[str]:
+        return sorted(self._edges.keys())
+
+    def edge(self, source: str, target: str) -> Tuple[float, CurrencyPair, str, float, float]:
+        """
+
+        :param source:
+        :param target:
+        :return: (weight, pair, direction, price, volume), None when no quote links the currencies
+        """
+        return self._edges.get(source, {}).get(target)
+
+    def _set_edge(self, source: str, target: str, edge: Tuple[float, CurrencyPair, str, float, float]) -> None:
+        self._edges.setdefault(target, dict())
+        if edge is None:
+            self._edges.setdefault(source, dict()).pop(target, None)
+
+        else:
+            self._edges.setdefault(source, dict())[target] = edge
+
+    def update_quote(self, pair: CurrencyPair, quote: ForexQuote) -> List[ArbitrageCycle]:
+        """
+        Updates the edges of the pair.
+
+        :param pair:
+        :param quote: an incomplete quote removes the edges
+        :return: profitable cycles through the updated edges, best first
+        """
+        if not quote.is_complete() or quote.bid.price <= 0 or quote.ask.price <= 0:
+            self._set_edge(pair.base, pair.quote, None)
+            self._set_edge(pair.quote, pair.base, None)
+            return []
+
+        bid_price, ask_price = float(quote.bid.price), float(quote.ask.price)
+        self._set_edge(pair.base, pair.quote, (-math.log(bid_price) + self._fee_weight, pair, 'sell', bid_price,
+                                               float(quote.bid.volume)))
+        self._set_edge(pair.quote, pair.base, (math.log(ask_price) + self._fee_weight, pair, 'buy', ask_price,
+                                               float(quote.ask.volume)))
+        cycles = list()
+        for source, target in ((pair.base, pair.quote), (pair.quote, pair.base)):
+            cycle = self.best_cycle_through(source, target)
+            if cycle is not None:
+                cycles.append(cycle)
+
+        return sorted(cycles, key=lambda cycle: cycle.rate, reverse=True)
+
+    def best_cycle_through(self, source: str, target: str) -> ArbitrageCycle:
+        """
+        Hop-bounded search of the lightest simple path from target back to source.
+
+        :param source: tail of the edge
+        :param target: head of the edge
+        :return: most profitable cycle using the edge, None if no cycle through the edge is profitable
+        """
+        edge = self.edge(source, target)
+        if edge is None:
+            return None
+
+        # (currency, visited currencies) -> (weight, path) of the lightest path
+        frontier = {(target, frozenset((target,))): (0., (target,))}
+        best_cycle = None
+        best_cycle_weight = -_WEIGHT_TOLERANCE
+        for _ in range(self._max_length - 1):
+            next_frontier = dict()
+            for (node, visited), (weight, path) in frontier.items():
+                for next_node, next_edge in self._edges[node].items():
+                    next_weight = weight + next_edge[0]
+                    if next_node == source:
+                        if edge[0] + next_weight < best_cycle_weight:
+                            best_cycle_weight = edge[0] + next_weight
+                            best_cycle = (source,) + path + (source,)
+
+                        continue
+
+                    if next_node in visited:
+                        continue
+
+                    # paths reaching the same currency through the same currencies are extended the same way
+                    next_key = (next_node, visited | {next_node})
+                    if next_key not in next_frontier or next_weight < next_frontier[next_key][0]:
+                        next_frontier[next_key] = (next_weight, path + (next_node,))
+
+            frontier = next_frontier
+
+        if best_cycle is None:
+            return None
+
+        legs = list()
+        for leg_source, leg_target in zip(best_cycle, best_cycle[1:]):
+            weight, pair, direction, price, volume = self._edges[leg_source][leg_target]
+            legs.append((pair, direction, price, volume))
+
+        return ArbitrageCycle(list(best_cycle), legs, best_cycle_weight)
+
+    def find_cycles(self) -> List[ArbitrageCycle]:
+        """
+        Searches the whole graph, one edge at a time.
+
+        :return: profitable cycles, best first
+        """
+        cycles = dict()
+        for source, targets in self._edges.items():
+            for target in targets:
+                cycle = self.best_cycle_through(source, target)
+                if cycle is not None:
+                    cycles[cycle.key()] = cycle
+
+        return sorted(cycles.values(), key=lambda cycle: cycle.rate, reverse=True)
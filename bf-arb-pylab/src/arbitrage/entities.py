@@ -1,14 +1,23 @@
+import bisect
 import logging
-from functools import total_ordering
-from typing import Tuple, NamedTuple, Dict, Callable, Set, Any, List
+import operator
+import sys
+import time
+from functools import total_ordering, partial
+from typing import Tuple, NamedTuple, Dict, Callable, Set, Any, List, Iterable
 
 import numpy
 import itertools
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
+import zlib
 
 import pandas
+from sortedcontainers import SortedDict
+
+from arbitrage.latency import LatencyStamps, STAGE_FRAME, STAGE_BOOK, STAGE_LEVEL_ONE
+from arbitrage.numeric import NumericBackend, DECIMAL
 
 
 class QuoteEncoder(json.JSONEncoder):
@@ -160,7 +169,7 @@ class ForexQuote(object):
     """
 
     def __init__(self, timestamp: datetime = None, bid: PriceVolume = None, ask: PriceVolume = None,
-                 source: str = None):
+                 source: str = None, latency: LatencyStamps = None):
         if not timestamp:
             self._timestamp = datetime.now()
 
@@ -170,6 +179,7 @@ class ForexQuote(object):
         self._bid = bid
         self._ask = ask
         self._source = source
+        self._latency = latency
 
     @property
     def timestamp(self) -> datetime:
@@ -187,6 +197,13 @@ class ForexQuote(object):
     def source(self) -> str:
         return self._source
 
+    @property
+    def latency(self) -> LatencyStamps:
+        """
+        Monotonic stamps of the processing stages, None unless latency tracking is enabled.
+        """
+        return self._latency
+
     def is_complete(self) -> bool:
         return self.bid is not None and self.ask is not None
 
@@ -195,11 +212,24 @@ class ForexQuote(object):
                       'bid': {'price': self.bid.price, 'amount': self.bid.volume},
                       'ask': {'price': self.ask.price, 'amount': self.ask.volume},
                       'source': self.source}
+        if self.latency is not None:
+            quote_data['latency'] = self.latency.to_dict()
+
         return quote_data
 
     def to_json(self):
         return json.dumps(self.to_dict(), cls=QuoteEncoder)
 
+    def converted(self, number: Callable[[Any], Any]) -> 'ForexQuote':
+        """
+
+        :param number: conversion applied to prices and volumes (ex: float)
+        :return:
+        """
+        return ForexQuote(self._timestamp, PriceVolume(number(self._bid.price), number(self._bid.volume)),
+                          PriceVolume(number(self._ask.price), number(self._ask.volume)), source=self._source,
+                          latency=self._latency)
+
     def __repr__(self):
         return '[{}:{}/{}]'.format(self.timestamp, self.bid, self.ask)
 
@@ -220,7 +250,8 @@ class CurrencyPair(object):
         self._base_currency_code = base_currency_code.upper()
         self._quote_currency_code = quote_currency_code.upper()
 
-    def buy(self, quote: ForexQuote, volume: Decimal, illimited_volume: bool = False) -> Tuple[CurrencyBalanceAggregate, CurrencyTrade]:
+    def buy(self, quote: ForexQuote, volume: Decimal, illimited_volume: bool = False,
+            backend: NumericBackend = DECIMAL) -> Tuple[CurrencyBalanceAggregate, CurrencyTrade]:
         """
         Computes the balance after the buy has taken place.
         Example, provided volume is sufficient:
@@ -229,6 +260,7 @@ class CurrencyPair(object):
         :param quote: ForexQuote instance
         :param volume:
         :param illimited_volume: emulates infinite liquidity
+        :param backend: number type of the computed amounts
         :return:
         """
         price = quote.ask.price
@@ -241,11 +273,12 @@ class CurrencyPair(object):
         fill_ratio = allowed_volume / volume
         balances = CurrencyBalanceAggregate()
         balances.add_balance(self.base, allowed_volume)
-        balances.add_balance(self.quote, Decimal(allowed_volume * price * -1))
+        balances.add_balance(self.quote, backend.number(allowed_volume * price * -1))
         trade = CurrencyTrade('buy', repr(self), allowed_volume, price, fill_ratio)
         return balances, trade
 
-    def sell(self, quote: ForexQuote, volume: Decimal, illimited_volume: bool = False) -> Tuple[CurrencyBalanceAggregate, CurrencyTrade]:
+    def sell(self, quote: ForexQuote, volume: Decimal, illimited_volume: bool = False,
+             backend: NumericBackend = DECIMAL) -> Tuple[CurrencyBalanceAggregate, CurrencyTrade]:
         """
         Computes the balance after the sell has taken place.
         Example, provided volume is sufficient:
@@ -254,6 +287,7 @@ class CurrencyPair(object):
         :param quote: ForexQuote instance
         :param volume:
         :param illimited_volume: emulates infinite liquidity
+        :param backend: number type of the computed amounts
         :return:
         """
         volume = abs(volume)
@@ -266,19 +300,20 @@ class CurrencyPair(object):
 
         fill_ratio = allowed_volume / volume
         balances = CurrencyBalanceAggregate()
-        balances.add_balance(self.base, Decimal(allowed_volume * -1))
-        balances.add_balance(self.quote, Decimal(allowed_volume * price))
-        trade = CurrencyTrade('sell', repr(self), Decimal(allowed_volume * -1), price, fill_ratio)
+        balances.add_balance(self.base, backend.number(allowed_volume * -1))
+        balances.add_balance(self.quote, backend.number(allowed_volume * price))
+        trade = CurrencyTrade('sell', repr(self), backend.number(allowed_volume * -1), price, fill_ratio)
         return balances, trade
 
-    def buy_currency(self, currency: str, volume: Decimal, quote: ForexQuote, illimited_volume: bool = False) -> Tuple[
-        CurrencyBalanceAggregate, CurrencyTrade]:
+    def buy_currency(self, currency: str, volume: Decimal, quote: ForexQuote, illimited_volume: bool = False,
+                     backend: NumericBackend = DECIMAL) -> Tuple[CurrencyBalanceAggregate, CurrencyTrade]:
         """
 
         :param currency: currency to buy
         :param volume: amount to buy denominated in currency
         :param quote: current quote (ForexQuote instance)
         :param illimited_volume: emulates infinite liquidity
+        :param backend: number type of the computed amounts
         :return: resulting balance and performed trades (balance, performed_trade)
         """
         assert currency in self.assets, 'currency {} not in pair {}'.format(currency, self)
@@ -286,23 +321,24 @@ class CurrencyPair(object):
         logging.debug('buying {} {} using pair {}'.format(volume, currency, self))
         if currency == self.base:
             # Direct quotation
-            balances, performed_trade = self.buy(quote, volume, illimited_volume)
+            balances, performed_trade = self.buy(quote, volume, illimited_volume, backend)
 
         else:
             # Indirect quotation
-            target_volume = Decimal(volume) / quote.bid.price
-            balances, performed_trade = self.sell(quote, target_volume, illimited_volume)
+            target_volume = backend.number(volume) / quote.bid.price
+            balances, performed_trade = self.sell(quote, target_volume, illimited_volume, backend)
 
         return balances, performed_trade
 
-    def sell_currency(self, currency: str, volume: Decimal, quote: ForexQuote, illimited_volume: bool = False) -> Tuple[
-        CurrencyBalanceAggregate, CurrencyTrade]:
+    def sell_currency(self, currency: str, volume: Decimal, quote: ForexQuote, illimited_volume: bool = False,
+                      backend: NumericBackend = DECIMAL) -> Tuple[CurrencyBalanceAggregate, CurrencyTrade]:
         """
 
         :param currency:
         :param volume: amount to buy denominated in currency
         :param quote: current quote (ForexQuote instance)
         :param illimited_volume: emulates infinite liquidity
+        :param backend: number type of the computed amounts
         :return: resulting balance and performed trades (balance, performed_trade)
         """
         assert currency in self.assets, 'currency {} not in pair {}'.format(currency, self)
@@ -310,16 +346,16 @@ class CurrencyPair(object):
         logging.debug('selling {} {} using pair {}'.format(volume, currency, self))
         if currency == self.base:
             # Direct quotation
-            balance, performed_trade = self.sell(quote, volume, illimited_volume)
+            balance, performed_trade = self.sell(quote, volume, illimited_volume, backend)
 
         else:
             # Indirect quotation
-            target_volume = Decimal(volume) / quote.ask.price
-            balance, performed_trade = self.buy(quote, target_volume, illimited_volume)
+            target_volume = backend.number(volume) / quote.ask.price
+            balance, performed_trade = self.buy(quote, target_volume, illimited_volume, backend)
 
         return balance, performed_trade
 
-    def convert(self, currency: str, amount: Decimal, quote: ForexQuote):
+    def convert(self, currency: str, amount: Decimal, quote: ForexQuote, backend: NumericBackend = DECIMAL):
         if currency == self.base:
             destination_currency = self.quote
 
@@ -327,12 +363,12 @@ class CurrencyPair(object):
             destination_currency = self.base
 
         if amount >= 0:
-            balances, trade = self.sell_currency(currency, amount, quote, illimited_volume=True)
+            balances, trade = self.sell_currency(currency, amount, quote, illimited_volume=True, backend=backend)
             amount = balances.amount(destination_currency)
             return abs(amount)
 
         else:
-            balances, trade = self.buy_currency(currency, abs(amount), quote, illimited_volume=True)
+            balances, trade = self.buy_currency(currency, abs(amount), quote, illimited_volume=True, backend=backend)
             amount = balances.amount(destination_currency)
             return abs(amount) * -1
 
@@ -376,12 +412,21 @@ class ArbitrageStrategy(object):
     Models an arbitrage strategy.
     """
 
-    def __init__(self, pair1: CurrencyPair, pair2: CurrencyPair, pair3: CurrencyPair):
+    _ALL_LEGS = 0b111
+    # break-even rates are lowered by this fraction, so that float rounding never prunes a profitable strategy
+    _BREAK_EVEN_TOLERANCE = 1e-9
+
+    def __init__(self, pair1: CurrencyPair, pair2: CurrencyPair, pair3: CurrencyPair,
+                 backend: NumericBackend = DECIMAL, max_age: timedelta = None, min_profit_rate: float = None):
         """
 
         :param pair1: CurrencyPair instance
         :param pair2: CurrencyPair instance
         :param pair3: CurrencyPair instance
+        :param backend: number type used for evaluating opportunities, quotes are converted on update
+        :param max_age: evaluation is skipped when a leg quote is older than max_age (disabled by default)
+        :param min_profit_rate: evaluation is skipped unless the legs rates multiply to more than 1 + min_profit_rate
+        (disabled by default)
         """
         pairs = {pair1, pair2, pair3}
         bases = [pair.base for pair in pairs]
@@ -408,12 +453,33 @@ class ArbitrageStrategy(object):
         else:
             self._pair3, self._pair2 = indirect_pairs[0], indirect_pairs[1]
 
+        self._backend = backend
+
+        # legs orientation, for evaluating opportunities without building intermediate balances
+        self._pair_names = repr(self._pair2), repr(self._pair3), repr(self._pair1)
+        settling_currency = self._pair1.base if self._pair1.base in self._pair2.assets else self._pair1.quote
+        self._settle_by_buying = settling_currency == self._pair1.base
+        self._settle_from_base = settling_currency == self._pair2.base
+
         self._quotes = {
             self._pair1: ForexQuote(),
             self._pair2: ForexQuote(),
             self._pair3: ForexQuote()
         }
 
+        # one bit per leg, set when its quote is complete
+        self._leg_bits = {self._pair1: 0b001, self._pair2: 0b010, self._pair3: 0b100}
+        self._valid_legs = 0
+        self._quote_times = {self._pair1: None, self._pair2: None, self._pair3: None}
+        self._max_age = max_age
+
+        # rate of each leg in the direction of the cycle, and cached rate above which it makes the cycle profitable
+        self._rates = {self._pair1: None, self._pair2: None, self._pair3: None}
+        self._break_even_rates = {self._pair1: None, self._pair2: None, self._pair3: None}
+        self._min_profit_rate = None
+        self._may_profit = True
+        self.min_profit_rate = min_profit_rate
+
     def __repr__(self):
         return '[{},{}]'.format(self.indirect_pairs, self.direct_pair)
 
@@ -437,6 +503,30 @@ class ArbitrageStrategy(object):
     def indirect_pairs(self) -> Tuple[CurrencyPair, CurrencyPair]:
         return self._pair2, self._pair3
 
+    @property
+    def legs(self) -> Tuple[CurrencyPair, CurrencyPair, CurrencyPair]:
+        """
+
+        :return: pairs in execution order: indirect pair 1, indirect pair 2, direct pair
+        """
+        return self._pair2, self._pair3, self._pair1
+
+    @property
+    def settle_by_buying(self) -> bool:
+        """
+
+        :return: True when the remaining balance is offset by buying the direct pair, False when selling it
+        """
+        return self._settle_by_buying
+
+    @property
+    def settle_from_base(self) -> bool:
+        """
+
+        :return: True when the balance to offset is the base currency of indirect pair 1, False for its quote
+        """
+        return self._settle_from_base
+
     @property
     def pairs(self) -> Tuple[CurrencyPair, CurrencyPair, CurrencyPair]:
         sorted_pairs = sorted([self._pair1, self._pair2, self._pair3])
@@ -449,7 +539,130 @@ class ArbitrageStrategy(object):
         :param quote:
         :return:
         """
+        if quote.is_complete():
+            if not self._backend.is_exact:
+                quote = quote.converted(self._backend.number)
+
+            self._valid_legs |= self._leg_bits[pair]
+
+        else:
+            self._valid_legs &= ~self._leg_bits[pair]
+
         self._quotes[pair] = quote
+        self._quote_times[pair] = quote.timestamp
+        if self._min_profit_rate is not None:
+            self._may_profit = self._update_rate(pair, quote)
+
+    def _leg_rate(self, pair: CurrencyPair, quote: ForexQuote) -> float:
+        """
+
+        :param pair:
+        :param quote:
+        :return: amount obtained for one unit sold through the leg, None when the quote is incomplete
+        """
+        if not quote.is_complete():
+            return None
+
+        if pair == self._pair1 and self._settle_by_buying:
+            ask_price = float(quote.ask.price)
+            return 1. / ask_price if ask_price > 0. else None
+
+        return float(quote.bid.price)
+
+    def _update_rate(self, pair: CurrencyPair, quote: ForexQuote) -> bool:
+        """
+        Compares the rate of the updated leg to its break-even rate, refreshed only after a rate change of the two
+        other legs.
+
+        :param pair:
+        :param quote:
+        :return: True when the strategy may be profitable
+        """
+        rate = self._leg_rate(pair, quote)
+        if rate != self._rates[pair]:
+            self._rates[pair] = rate
+            for other_pair in self._break_even_rates:
+                if other_pair != pair:
+                    self._break_even_rates[other_pair] = None
+
+        if rate is None:
+            return False
+
+        break_even_rate = self._break_even_rates[pair]
+        if break_even_rate is None:
+            break_even_rate = self.break_even_rate(pair)
+            self._break_even_rates[pair] = break_even_rate
+
+        return break_even_rate is not None and rate > break_even_rate
+
+    def break_even_rate(self, pair: CurrencyPair) -> float:
+        """
+
+        :param pair: leg of the strategy
+        :return: rate of the leg above which the cycle makes more than min_profit_rate, given the latest quotes of
+        the two other legs, None when they are incomplete
+        """
+        other_rates = 1.
+        for other_pair, rate in self._rates.items():
+            if other_pair != pair:
+                if rate is None:
+                    return None
+
+                other_rates *= rate
+
+        return (1. + (self._min_profit_rate or 0.)) / other_rates * (1. - self._BREAK_EVEN_TOLERANCE)
+
+    def break_even_price(self, pair: CurrencyPair) -> float:
+        """
+
+        :param pair: leg of the strategy
+        :return: bid above which, or ask below which for a leg bought, the cycle makes more than min_profit_rate
+        """
+        break_even_rate = self.break_even_rate(pair)
+        if break_even_rate is not None and pair == self._pair1 and self._settle_by_buying:
+            return 1. / break_even_rate
+
+        return break_even_rate
+
+    @property
+    def min_profit_rate(self) -> float:
+        return self._min_profit_rate
+
+    @min_profit_rate.setter
+    def min_profit_rate(self, min_profit_rate: float) -> None:
+        self._min_profit_rate = min_profit_rate
+        self._rates = {pair: self._leg_rate(pair, quote) for pair, quote in self._quotes.items()}
+        self._break_even_rates = {pair: None for pair in self._quotes}
+        self._may_profit = True
+
+    @property
+    def may_profit(self) -> bool:
+        """
+
+        :return: False when the latest update has been pruned, its leg being on the wrong side of break-even
+        """
+        return self._may_profit
+
+    @property
+    def max_age(self) -> timedelta:
+        return self._max_age
+
+    @max_age.setter
+    def max_age(self, max_age: timedelta) -> None:
+        self._max_age = max_age
+
+    @property
+    def backend(self) -> NumericBackend:
+        return self._backend
+
+    def with_backend(self, backend: NumericBackend) -> 'ArbitrageStrategy':
+        """
+
+        :param backend:
+        :return: same strategy, without quotes, evaluated with another number type
+        """
+        return ArbitrageStrategy(self._pair1, self._pair2, self._pair3, backend=backend, max_age=self._max_age,
+                                 min_profit_rate=self._min_profit_rate)
 
     @property
     def quotes(self) -> Dict[CurrencyPair, ForexQuote]:
@@ -459,86 +672,217 @@ class ArbitrageStrategy(object):
         """
         return self._quotes
 
+    @property
+    def quote_times(self) -> Dict[CurrencyPair, datetime]:
+        """
+
+        :return: timestamp of the latest quote of each leg
+        """
+        return self._quote_times
+
     @property
     def quotes_valid(self) -> bool:
         """
 
-        :return:
+        :return: True when the quotes of all legs are complete
+        """
+        return self._valid_legs == self._ALL_LEGS
+
+    def is_stale(self, now: datetime = None) -> bool:
         """
-        is_valid = True
-        for pair, quote in self.quotes.items():
-            is_valid = is_valid and quote.is_complete()
 
-        return is_valid
+        :param now: reference time, the latest leg quote by default
+        :return: True when the oldest leg quote is older than max_age, always False without max_age
+        """
+        if self._max_age is None or self._valid_legs != self._ALL_LEGS:
+            return False
+
+        quote_times = self._quote_times.values()
+        if now is None:
+            now = max(quote_times)
+
+        return now - min(quote_times) > self._max_age
 
-    def find_opportunity(self, illimited_volume: bool) -> Tuple[Any, Any]:
+    def find_opportunity(self, illimited_volume: bool, now: datetime = None) -> Tuple[Any, Any]:
         """
 
-        :param initial_amount: amount to be invested
         :param illimited_volume: emulates infinite liquidity
-        :param skip_capped:
-        :return:
+        :param now: reference time for the staleness check, the latest leg quote by default
+        :return: (trades as records, net balance by currency), (None, None) when quotes are incomplete, stale or
+        below break-even
         """
         opportunity = None, None
-        if self.quotes_valid:
-            logging.info('strategy book: {}'.format(self.quotes))
-            balances_df, trades_df = self.apply_arbitrage(illimited_volume=illimited_volume)
-            balances_by_currency = balances_df.sum(axis=1)
-            logging.info('adding new opportunity:\n{}'.format(trades_df))
-            logging.info('resulting balances:\n{}'.format(balances_by_currency))
-            opportunity = trades_df.to_dict(orient='records'), balances_by_currency.to_dict()
+        if self._valid_legs != self._ALL_LEGS:
+            logging.debug('incomplete quotes')
+
+        elif not self._may_profit:
+            # pruned on update
+            pass
+
+        elif self.is_stale(now):
+            logging.debug('stale quotes')
 
         else:
-            logging.info('incomplete quotes')
+            result = self.evaluate(illimited_volume=illimited_volume)
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug('strategy book: {}'.format(self.quotes))
+                logging.debug('adding new opportunity: {}'.format(result.trades))
+                logging.debug('resulting balances: {}'.format(result.net_balances()))
+
+            opportunity = result.trades_records(), result.net_balances()
 
         return opportunity
 
-    def apply_arbitrage(self, illimited_volume: bool) -> Tuple[Any, Any]:
+    def evaluate(self, illimited_volume: bool) -> 'ArbitrageOpportunity':
         """
-        Determines arbitrage operations:
+        Determines arbitrage operations, using plain arithmetic on the legs orientation:
             - selling indirect pair 1
             - selling indirect pair 2
             - offsetting remaining balance
-        :param illimited_volume:
+
+        Amounts are computed in the same order as CurrencyPair.sell() / buy_currency() followed by the scaling
+        of the previous legs, so that results are identical. Amounts have the type of the strategy backend.
+
+        :param illimited_volume: emulates infinite liquidity
         :return:
         """
-        logging.debug('accumulating currency: {}'.format(self.direct_pair.quote))
-        initial_amount = self.quotes[self.indirect_pairs[0]].bid.volume
-        balance_initial, trade_initial = self.indirect_pairs[0].sell(self.quotes[self.indirect_pairs[0]],
-                                                                     initial_amount, illimited_volume)
-        logging.debug('balance step 1: {}'.format(balance_initial))
-        balance_next, trade_next = self.indirect_pairs[1].sell(self.quotes[self.indirect_pairs[1]],
-                                                               balance_initial.amount(self.indirect_pairs[0].quote),
-                                                               illimited_volume)
-        volume_adjustment = trade_next.fill_ratio
-        balance_initial.scale(volume_adjustment)
-        trade_initial.scale(volume_adjustment)
-
-        logging.debug('balance step 2: {}'.format(balance_next))
-        if self.direct_pair.base in balance_initial.assets():
-            settling_amount = balance_initial.amount(self.direct_pair.base)
-            balance_final, trade_final = self.direct_pair.buy_currency(self.direct_pair.base, abs(settling_amount),
-                                                                       self.quotes[self.direct_pair], illimited_volume)
+        number = self._backend.number
+        quote_initial = self._quotes[self._pair2]
+        quote_next = self._quotes[self._pair3]
+        quote_final = self._quotes[self._pair1]
+
+        # step 1: selling the whole bid volume of indirect pair 1
+        price_initial = quote_initial.bid.price
+        volume_initial = abs(quote_initial.bid.volume)
+        allowed_initial = volume_initial if illimited_volume else min(volume_initial, quote_initial.bid.volume)
+        fill_initial = allowed_initial / volume_initial
+        quantity_initial = number(allowed_initial * -1)
+        base_initial = number(allowed_initial * -1)
+        quote_amount_initial = number(allowed_initial * price_initial)
+
+        # step 2: selling the proceeds through indirect pair 2
+        price_next = quote_next.bid.price
+        volume_next = abs(quote_amount_initial)
+        allowed_next = volume_next if illimited_volume else min(volume_next, quote_next.bid.volume)
+        fill_next = allowed_next / volume_next
+        quantity_next = number(allowed_next * -1)
+        base_next = number(allowed_next * -1)
+        quote_amount_next = number(allowed_next * price_next)
+        quantity_initial *= fill_next
+        fill_initial *= fill_next
+        base_initial *= fill_next
+        quote_amount_initial *= fill_next
+
+        # step 3: offsetting the remaining balance through the direct pair
+        settling_amount = abs(base_initial if self._settle_from_base else quote_amount_initial)
+        if self._settle_by_buying:
+            direction_final = 'buy'
+            price_final = quote_final.ask.price
+            allowed_final = settling_amount if illimited_volume else min(settling_amount, quote_final.ask.volume)
+            fill_final = allowed_final / settling_amount
+            quantity_final = allowed_final
+            base_final = allowed_final
+            quote_amount_final = number(allowed_final * price_final * -1)
 
         else:
-            settling_amount = balance_initial.amount(self.direct_pair.quote)
-            balance_final, trade_final = self.direct_pair.buy_currency(self.direct_pair.quote, abs(settling_amount),
-                                                                       self.quotes[self.direct_pair], illimited_volume)
-
-        volume_adjustment = trade_final.fill_ratio
-        balance_initial.scale(volume_adjustment)
-        trade_initial.scale(volume_adjustment)
-        balance_next.scale(volume_adjustment)
-        trade_next.scale(volume_adjustment)
-
-        logging.debug('balance step 3: {}'.format(balance_final))
-        balance1_series = pandas.Series(balance_initial.as_dict(), name='initial')
-        balance2_series = pandas.Series(balance_next.as_dict(), name='next')
-        balance3_series = pandas.Series(balance_final.as_dict(), name='final')
-        balance_series = [balance1_series, balance2_series, balance3_series]
-        balances_df = pandas.concat(balance_series, axis=1)
-        trades_df = pandas.DataFrame([trade_initial.as_dict(), trade_next.as_dict(), trade_final.as_dict()])
-        return balances_df, trades_df
+            direction_final = 'sell'
+            price_final = quote_final.bid.price
+            volume_final = abs(number(settling_amount) / price_final)
+            allowed_final = volume_final if illimited_volume else min(volume_final, quote_final.bid.volume)
+            fill_final = allowed_final / volume_final
+            quantity_final = number(allowed_final * -1)
+            base_final = number(allowed_final * -1)
+            quote_amount_final = number(allowed_final * price_final)
+
+        quantity_initial *= fill_final
+        fill_initial *= fill_final
+        base_initial *= fill_final
+        quote_amount_initial *= fill_final
+        quantity_next *= fill_final
+        fill_next *= fill_final
+        base_next *= fill_final
+        quote_amount_next *= fill_final
+
+        pair_initial, pair_next, pair_final = self._pair_names
+        trades = [('sell', pair_initial, quantity_initial, price_initial, fill_initial),
+                  ('sell', pair_next, quantity_next, price_next, fill_next),
+                  (direction_final, pair_final, quantity_final, price_final, fill_final)]
+        balances = [{self._pair2.base: base_initial, self._pair2.quote: quote_amount_initial},
+                    {self._pair3.base: base_next, self._pair3.quote: quote_amount_next},
+                    {self._pair1.base: base_final, self._pair1.quote: quote_amount_final}]
+        return ArbitrageOpportunity(trades, balances)
+
+    def apply_arbitrage(self, illimited_volume: bool) -> Tuple[Any, Any]:
+        """
+        Determines arbitrage operations as DataFrames, see evaluate().
+
+        :param illimited_volume:
+        :return: (balances by step, trades)
+        """
+        opportunity = self.evaluate(illimited_volume=illimited_volume)
+        return opportunity.balances_df(), opportunity.trades_df()
+
+
+class ArbitrageOpportunity(object):
+    """
+    Trades and balances resulting from the evaluation of an arbitrage strategy.
+    """
+    STEPS = ('initial', 'next', 'final')
+    TRADE_FIELDS = ('direction', 'pair', 'quantity', 'price', 'fill_ratio')
+
+    def __init__(self, trades: List[Tuple[str, str, Decimal, Decimal, Decimal]], balances: List[Dict[str, Decimal]]):
+        """
+
+        :param trades: (direction, pair, quantity, price, fill ratio) for each step
+        :param balances: amount by currency for each step
+        """
+        self._trades = trades
+        self._balances = balances
+
+    @property
+    def trades(self) -> List[Tuple[str, str, Decimal, Decimal, Decimal]]:
+        return self._trades
+
+    @property
+    def balances(self) -> List[Dict[str, Decimal]]:
+        return self._balances
+
+    def trades_records(self) -> List[Dict[str, Any]]:
+        """
+
+        :return: trades as dicts, as CurrencyTrade.as_dict()
+        """
+        return [dict(zip(self.TRADE_FIELDS, trade)) for trade in self._trades]
+
+    def net_balances(self) -> Dict[str, Decimal]:
+        """
+
+        :return: sum of all steps by currency
+        """
+        net_balances = dict()
+        for step_balances in self._balances:
+            for currency, amount in step_balances.items():
+                if currency in net_balances:
+                    net_balances[currency] += amount
+
+                else:
+                    net_balances[currency] = amount
+
+        return net_balances
+
+    def balances_df(self) -> pandas.DataFrame:
+        """
+
+        :return: balances with one column per step and one row per currency
+        """
+        return pandas.concat([pandas.Series(step_balances, name=step)
+                              for step, step_balances in zip(self.STEPS, self._balances)], axis=1)
+
+    def trades_df(self) -> pandas.DataFrame:
+        return pandas.DataFrame(self.trades_records())
+
+    def __repr__(self):
+        return '[{}: {}]'.format(self._trades, self.net_balances())
 
 
 class CurrencyConverter(object):
@@ -606,16 +950,417 @@ def order_entries(quotes: Dict[Decimal, Tuple[datetime, Decimal, int]], reverse=
     return ordered_quotes
 
 
+class PriceTicks(object):
+    """
+    Tick size and lot size of a pair: prices and amounts are stored as integer multiples of them.
+    """
+
+    def __init__(self, tick_size: Decimal, lot_size: Decimal):
+        """
+
+        :param tick_size: smallest price increment
+        :param lot_size: smallest amount increment
+        """
+        self._tick_size = Decimal(tick_size)
+        self._lot_size = Decimal(lot_size)
+        self._tick_size_float = float(tick_size)
+        self._lot_size_float = float(lot_size)
+
+    @property
+    def tick_size(self) -> Decimal:
+        return self._tick_size
+
+    @property
+    def lot_size(self) -> Decimal:
+        return self._lot_size
+
+    def price_to_ticks(self, price) -> int:
+        """
+
+        :param price: Decimal, string or float
+        :return: price as a number of ticks
+        """
+        if isinstance(price, float):
+            return int(round(price / self._tick_size_float))
+
+        return int((Decimal(price) / self._tick_size).to_integral_value())
+
+    def amount_to_lots(self, amount) -> int:
+        """
+
+        :param amount: Decimal, string or float
+        :return: amount as a number of lots
+        """
+        if isinstance(amount, float):
+            return int(round(amount / self._lot_size_float))
+
+        return int((Decimal(amount) / self._lot_size).to_integral_value())
+
+    def prices_to_ticks(self, prices: numpy.ndarray) -> numpy.ndarray:
+        """
+
+        :param prices: float array of prices
+        :return: int64 array of ticks
+        """
+        return numpy.rint(prices / self._tick_size_float).astype(numpy.int64)
+
+    def amounts_to_lots(self, amounts: numpy.ndarray) -> numpy.ndarray:
+        """
+
+        :param amounts: float array of amounts
+        :return: int64 array of lots
+        """
+        return numpy.rint(amounts / self._lot_size_float).astype(numpy.int64)
+
+    def ticks_to_price(self, ticks: int) -> Decimal:
+        return ticks * self._tick_size
+
+    def lots_to_amount(self, lots: int) -> Decimal:
+        return lots * self._lot_size
+
+    def __repr__(self):
+        return '[tick {}, lot {}]'.format(self.tick_size, self.lot_size)
+
+
+_pair_ticks = dict()  # type: Dict[CurrencyPair, PriceTicks]
+
+
+def register_pair_ticks(pair: CurrencyPair, tick_size: Decimal, lot_size: Decimal) -> PriceTicks:
+    """
+    Registers the fixed-point representation used for the order books of a pair.
+
+    :param pair:
+    :param tick_size:
+    :param lot_size:
+    :return:
+    """
+    ticks = PriceTicks(tick_size, lot_size)
+    _pair_ticks[pair] = ticks
+    return ticks
+
+
+def pair_ticks(pair: CurrencyPair) -> PriceTicks:
+    """
+
+    :param pair:
+    :return: registered PriceTicks instance or None
+    """
+    return _pair_ticks.get(pair)
+
+
+def js_number_repr(value: Any) -> str:
+    """
+    Formats a number as JavaScript Number.prototype.toString() does, which is what Bitfinex checksums are computed
+    on: shortest digits, exponent form below 1e-6 and from 1e21 (ex: 0.00000001 -> '1e-8', 2.7E-7 -> '2.7e-7').
+
+    :param value: Decimal, float or int
+    :return:
+    """
+    if isinstance(value, float):
+        # shortest representation of the double, as JavaScript does
+        value = Decimal(repr(value))
+
+    number = Decimal(value).normalize()
+    if number.is_zero():
+        return '0'
+
+    sign, digits_tuple, _ = number.as_tuple()
+    digits = ''.join(str(digit) for digit in digits_tuple)
+    # position of the decimal point relative to the digits
+    point = number.adjusted() + 1
+    if len(digits) <= point <= 21:
+        text = digits + '0' * (point - len(digits))
+
+    elif 0 < point <= 21:
+        text = digits[:point] + '.' + digits[point:]
+
+    elif -6 < point <= 0:
+        text = '0.' + '0' * -point + digits
+
+    else:
+        exponent = point - 1
+        text = digits[0] + ('.' + digits[1:] if len(digits) > 1 else '') + \
+            'e{}{}'.format('+' if exponent > 0 else '-', abs(exponent))
+
+    return '-' + text if sign else text
+
+
+class OrderBookSide(object):
+    """
+    One side of an order book: price levels kept sorted from best to worst, best level cached.
+    Each level is stored as a compact (amount, timestamp) tuple keyed by price.
+
+    Cumulative amounts and notionals from the best level down are cached for depth queries: they are
+    extended lazily as far as a query needs and truncated from the first level touched by an update.
+    """
+
+    def __init__(self, descending: bool, max_depth: int = None):
+        """
+
+        :param descending: True for the bid side (best price is the highest one)
+        :param max_depth: maximum number of levels kept, levels farthest from the best price are evicted
+        """
+        self._descending = descending
+        self._max_depth = max_depth
+        if descending:
+            self._levels = SortedDict(operator.neg)
+
+        else:
+            self._levels = SortedDict()
+
+        self._best_price = None
+        self._best_level = None
+        self._depth_prices = list()
+        self._depth_amounts = list()
+        self._depth_notionals = list()
+
+    @property
+    def best_price(self):
+        return self._best_price
+
+    @property
+    def best_level(self) -> Tuple[Any, datetime]:
+        return self._best_level
+
+    @property
+    def max_depth(self) -> int:
+        return self._max_depth
+
+    def is_better(self, price, other_price) -> bool:
+        if self._descending:
+            return price > other_price
+
+        return price < other_price
+
+    def _refresh_best(self) -> None:
+        if len(self._levels) == 0:
+            self._best_price, self._best_level = None, None
+
+        else:
+            self._best_price, self._best_level = self._levels.peekitem(0)
+
+    def _evict(self) -> None:
+        while len(self._levels) > self._max_depth:
+            worst_price = self._levels.peekitem(-1)[0]
+            self._invalidate_depth(worst_price)
+            del self._levels[worst_price]
+
+    def load(self, levels: Iterable[Tuple[Any, Tuple[Any, datetime]]]) -> None:
+        """
+        Replaces all levels.
+
+        :param levels: (price, (amount, timestamp)) tuples, in any order
+        :return:
+        """
+        self._levels.clear()
+        self._levels.update(levels)
+        self._truncate_depth(0)
+        if self._max_depth is not None:
+            self._evict()
+
+        self._refresh_best()
+
+    def update(self, price, amount, timestamp: datetime) -> bool:
+        """
+        Inserts or replaces the level at the given price.
+
+        :param price:
+        :param amount:
+        :param timestamp:
+        :return: True when the best level has changed
+        """
+        self._invalidate_depth(price)
+        level = amount, timestamp
+        if price == self._best_price:
+            self._levels[price] = level
+            previous_amount = self._best_level[0]
+            self._best_level = level
+            return amount != previous_amount
+
+        self._levels[price] = level
+        if self._max_depth is not None and len(self._levels) > self._max_depth:
+            self._evict()
+
+        if self._best_price is None or self.is_better(price, self._best_price):
+            self._best_price, self._best_level = price, level
+            return True
+
+        return False
+
+    def remove(self, price) -> Tuple[bool, bool]:
+        """
+
+        :param price:
+        :return: (removed, best level changed)
+        """
+        if price not in self._levels:
+            return False, False
+
+        self._invalidate_depth(price)
+        del self._levels[price]
+
+        if price == self._best_price:
+            self._refresh_best()
+            return True, True
+
+        return True, False
+
+    def get(self, price) -> Tuple[Any, datetime]:
+        return self._levels.get(price)
+
+    def _truncate_depth(self, index: int) -> None:
+        del self._depth_prices[index:]
+        del self._depth_amounts[index:]
+        del self._depth_notionals[index:]
+
+    def _invalidate_depth(self, price) -> None:
+        if len(self._depth_prices) > 0 and not self.is_better(self._depth_prices[-1], price):
+            self._truncate_depth(self._levels.bisect_left(price))
+
+    def _extend_depth(self, levels_count: int = None, amount=None) -> None:
+        """
+        Extends the cumulative depth until it covers the requested number of levels or amount.
+
+        :param levels_count:
+        :param amount:
+        :return:
+        """
+        start = len(self._depth_prices)
+        if start > 0:
+            total_amount, total_notional = self._depth_amounts[-1], self._depth_notionals[-1]
+
+        else:
+            total_amount, total_notional = 0, 0
+
+        if levels_count is not None and start >= levels_count:
+            return
+
+        if amount is not None and total_amount >= amount:
+            return
+
+        for price in self._levels.islice(start=start):
+            level_amount = abs(self._levels[price][0])
+            total_amount += level_amount
+            total_notional += level_amount * price
+            self._depth_prices.append(price)
+            self._depth_amounts.append(total_amount)
+            self._depth_notionals.append(total_notional)
+            if levels_count is not None and len(self._depth_prices) >= levels_count:
+                break
+
+            if amount is not None and total_amount >= amount:
+                break
+
+    def sweep(self, amount) -> Tuple[Any, Any]:
+        """
+        Walks the levels from the best price until the amount is filled.
+
+        :param amount: positive amount to be filled
+        :return: (filled amount, notional of the filled amount)
+        """
+        self._extend_depth(amount=amount)
+        if len(self._depth_amounts) == 0:
+            return 0, 0
+
+        index = bisect.bisect_left(self._depth_amounts, amount)
+        if index == len(self._depth_amounts):
+            return self._depth_amounts[-1], self._depth_notionals[-1]
+
+        if index == 0:
+            previous_amount, previous_notional = 0, 0
+
+        else:
+            previous_amount, previous_notional = self._depth_amounts[index - 1], self._depth_notionals[index - 1]
+
+        return amount, previous_notional + (amount - previous_amount) * self._depth_prices[index]
+
+    def depth_within(self, price):
+        """
+
+        :param price: limit price
+        :return: total amount available at prices equal or better than the limit
+        """
+        levels_count = self._levels.bisect_right(price)
+        if levels_count == 0:
+            return 0
+
+        self._extend_depth(levels_count=levels_count)
+        return self._depth_amounts[levels_count - 1]
+
+    def levels(self) -> List[Tuple[Any, Any, datetime]]:
+        """
+
+        :return: (price, amount, timestamp) of all levels, best first
+        """
+        return [(price, amount, timestamp) for price, (amount, timestamp) in self._levels.items()]
+
+    def top_levels(self, count: int) -> List[Tuple[Any, Any]]:
+        """
+
+        :param count: maximum number of levels
+        :return: (price, amount) of the best levels, best first
+        """
+        return [(price, self._levels[price][0]) for price in self._levels.islice(stop=count)]
+
+    def memory_usage(self) -> int:
+        """
+        Estimated memory footprint of the levels and of the cached depth, in bytes.
+
+        :return:
+        """
+        seen = set()
+        size = sys.getsizeof(self._levels)
+        # sorted index: one pointer per level, plus one per computed key when sorting with a key function
+        size += len(self._levels) * 8 * (2 if self._descending else 1)
+        for price, level in self._levels.items():
+            for item in (price, level) + level:
+                if id(item) not in seen:
+                    seen.add(id(item))
+                    size += sys.getsizeof(item)
+
+        for depth_list in (self._depth_prices, self._depth_amounts, self._depth_notionals):
+            size += sys.getsizeof(depth_list)
+            for item in depth_list:
+                if id(item) not in seen:
+                    seen.add(id(item))
+                    size += sys.getsizeof(item)
+
+        return size
+
+    def __len__(self) -> int:
+        return len(self._levels)
+
+    def __contains__(self, price) -> bool:
+        return price in self._levels
+
+
 class OrderBook(object):
     """
     Models an order book.
     """
 
-    def __init__(self, pair: CurrencyPair, source: str):
-        self._quotes_bid_by_price = dict()
-        self._quotes_ask_by_price = dict()
+    def __init__(self, pair: CurrencyPair, source: str, ticks: PriceTicks = None,
+                 top_of_book_callback: Callable[['OrderBook', str], Any] = None, max_depth: int = None):
+        """
+
+        :param pair:
+        :param source:
+        :param ticks: when provided, prices and amounts are stored as integer ticks and lots
+        :param top_of_book_callback: called with (order book, side) when the best bid or ask changes,
+        side being 'bid', 'ask' or 'both' (after loading a snapshot)
+        :param max_depth: maximum number of levels kept per side
+        """
+        self._bids = OrderBookSide(descending=True, max_depth=max_depth)
+        self._asks = OrderBookSide(descending=False, max_depth=max_depth)
         self._pair = pair
         self._source = source
+        self._ticks = ticks
+        self._top_of_book_callback = top_of_book_callback
+        self._stale = False
+        self._level_one_bid = None, None
+        self._level_one_ask = None, None
+        self._frame_ns = None
+        self._notified_ns = None
 
     @property
     def source(self) -> str:
@@ -625,45 +1370,118 @@ class OrderBook(object):
     def pair(self) -> CurrencyPair:
         return self._pair
 
+    @property
+    def ticks(self) -> PriceTicks:
+        return self._ticks
+
     @property
     def quotes_bid(self) -> List[Dict[str, Any]]:
-        quotes_bid = order_entries(self._quotes_bid_by_price, reverse=True)
-        return quotes_bid
+        return self._to_entries(self._bids.levels(), sign=1)
 
     @property
     def quotes_ask(self) -> List[Dict[str, Any]]:
-        quotes_ask = order_entries(self._quotes_ask_by_price, reverse=False)
-        return quotes_ask
+        return self._to_entries(self._asks.levels(), sign=-1)
+
+    def _to_entries(self, levels: List[Tuple[Any, Any, datetime]], sign: int) -> List[Dict[str, Any]]:
+        """
+
+        :param levels: (price, amount, timestamp) tuples
+        :param sign: -1 for the ask side, where prices are reported negated
+        :return:
+        """
+        if self._ticks is None:
+            return [{'timestamp': timestamp, 'price': price * sign, 'amount': amount}
+                    for price, amount, timestamp in levels]
+
+        return [{'timestamp': timestamp, 'price': self._ticks.ticks_to_price(price * sign),
+                 'amount': self._ticks.lots_to_amount(amount)} for price, amount, timestamp in levels]
+
+    def _to_price_volume(self, price, amount) -> PriceVolume:
+        if self._ticks is None:
+            return PriceVolume(price, abs(amount))
+
+        return PriceVolume(self._ticks.ticks_to_price(price), self._ticks.lots_to_amount(abs(amount)))
+
+    @property
+    def max_depth(self) -> int:
+        return self._bids.max_depth
+
+    @property
+    def is_stale(self) -> bool:
+        """
+        True when the book was restored from a checkpoint and no snapshot has been loaded since.
+        """
+        return self._stale
+
+    def memory_usage(self) -> int:
+        """
+
+        :return: estimated memory footprint of both sides, in bytes
+        """
+        return self._bids.memory_usage() + self._asks.memory_usage()
+
+    def _to_price(self, price):
+        if self._ticks is None:
+            return price
 
-    def load_snapshot(self, snapshot) -> None:
+        return self._ticks.price_to_ticks(price)
+
+    def _to_amount(self, amount):
+        if self._ticks is None:
+            return amount
+
+        return self._ticks.amount_to_lots(amount)
+
+    def load_snapshot(self, snapshot, stale: bool = False) -> None:
         """
+        Replaces the book content with a snapshot, processed column-wise.
 
-        :param snapshot:
+        :param snapshot: [channel_id, [[price, count, amount], ...]]
+        :param stale: flags the book as stale, for snapshots restored from a checkpoint
         :return:
         """
         channel_id, book_data = snapshot
-        for price, count, amount in book_data:
-            timestamp = datetime.utcnow()
-            if Decimal(amount) > 0:
-                self._quotes_bid_by_price[Decimal(price)] = {'timestamp': timestamp, 'price': Decimal(price),
-                                                             'amount': Decimal(amount)}
+        timestamp = datetime.utcnow()
+        if len(book_data) == 0:
+            prices, amounts = numpy.empty(0, dtype=object), numpy.empty(0, dtype=object)
 
-            else:
-                self._quotes_ask_by_price[Decimal(price)] = {'timestamp': timestamp, 'price': Decimal(price) * -1,
-                                                             'amount': Decimal(amount)}
+        elif self._ticks is None:
+            price_column, count_column, amount_column = zip(*book_data)
+            prices = numpy.fromiter(map(Decimal, price_column), dtype=object, count=len(price_column))
+            amounts = numpy.fromiter(map(Decimal, amount_column), dtype=object, count=len(amount_column))
 
-    def remove_quote(self, price: Decimal, quotes_by_price: Dict[Decimal, ForexQuote]) -> bool:
+        else:
+            price_column, count_column, amount_column = zip(*book_data)
+            prices = self._ticks.prices_to_ticks(numpy.fromiter(map(float, price_column), dtype=float,
+                                                                count=len(price_column)))
+            amounts = self._ticks.amounts_to_lots(numpy.fromiter(map(float, amount_column), dtype=float,
+                                                                 count=len(amount_column)))
+
+        # levels come ordered from the exchange, sorting them again in the book sides is linear
+        is_bid = amounts > 0
+        is_ask = ~is_bid
+        bids = [(price, (amount, timestamp)) for price, amount in zip(prices[is_bid].tolist(), amounts[is_bid].tolist())]
+        asks = [(price, (amount, timestamp)) for price, amount in zip(prices[is_ask].tolist(), amounts[is_ask].tolist())]
+        self._bids.load(bids)
+        self._asks.load(asks)
+        self._stale = stale
+        self._notify_top_of_book('both')
+
+    def stamp_frame(self, timestamp_ns: int) -> None:
         """
+        Enables latency stamping of the quotes built from the book.
 
-        :param price:
-        :param quotes_by_price:
+        :param timestamp_ns: monotonic reception time of the frame about to be applied
         :return:
         """
-        if price in quotes_by_price:
-            quotes_by_price.pop(price)
-            return True
+        self._frame_ns = timestamp_ns
 
-        return False
+    def _notify_top_of_book(self, side: str) -> None:
+        if self._top_of_book_callback is not None:
+            if self._frame_ns is not None:
+                self._notified_ns = time.monotonic_ns()
+
+            self._top_of_book_callback(self, side)
 
     def remove_bid(self, price: Decimal) -> bool:
         """
@@ -671,7 +1489,11 @@ class OrderBook(object):
         :param price:
         :return:
         """
-        return self.remove_quote(price, self._quotes_bid_by_price)
+        removed, top_changed = self._bids.remove(self._to_price(price))
+        if top_changed:
+            self._notify_top_of_book('bid')
+
+        return removed
 
     def remove_ask(self, price: Decimal) -> bool:
         """
@@ -679,61 +1501,267 @@ class OrderBook(object):
         :param price:
         :return:
         """
-        return self.remove_quote(price, self._quotes_ask_by_price)
+        removed, top_changed = self._asks.remove(self._to_price(price))
+        if top_changed:
+            self._notify_top_of_book('ask')
 
-    def update_quote(self, quotes_by_price: Dict[Decimal, Dict[str, Any]], price: Decimal, amount: Decimal) -> bool:
+        return removed
+
+    def update_bid(self, price: Decimal, amount: Decimal) -> bool:
         """
 
-        :param quotes_by_price:
         :param price:
         :param amount:
         :return:
         """
-        timestamp = datetime.utcnow()
-        if price in self._quotes_bid_by_price:
-            quotes_by_price[price]['timestamp'] = timestamp
-            quotes_by_price[price]['amount'] = amount
-
-        else:
-            quotes_by_price[price] = {'timestamp': timestamp, 'price': price, 'amount': amount}
+        price, amount = self._to_price(price), self._to_amount(amount)
+        if self._bids.update(price, amount, datetime.utcnow()):
+            self._notify_top_of_book('bid')
 
         return True
 
-    def update_bid(self, price: Decimal, amount: Decimal) -> bool:
+    def update_ask(self, price: Decimal, amount: Decimal) -> bool:
         """
 
         :param price:
         :param amount:
         :return:
         """
-        return self.update_quote(self._quotes_bid_by_price, price, amount)
+        price, amount = self._to_price(price), self._to_amount(amount)
+        if self._asks.update(price, amount, datetime.utcnow()):
+            self._notify_top_of_book('ask')
 
-    def update_ask(self, price: Decimal, amount: Decimal) -> bool:
+        return True
+
+    def bid_levels(self, count: int) -> List[PriceVolume]:
         """
 
-        :param price:
-        :param amount:
-        :return:
+        :param count: maximum number of levels
+        :return: best bids first
+        """
+        return [self._to_price_volume(price, amount) for price, amount in self._bids.top_levels(count)]
+
+    def ask_levels(self, count: int) -> List[PriceVolume]:
+        """
+
+        :param count: maximum number of levels
+        :return: best asks first, volumes positive
+        """
+        return [self._to_price_volume(price, amount) for price, amount in self._asks.top_levels(count)]
+
+    def _sweep(self, side: OrderBookSide, amount: Decimal) -> PriceVolume:
+        filled, notional = side.sweep(self._to_amount(amount))
+        if filled == 0:
+            return PriceVolume(None, Decimal(0))
+
+        if self._ticks is None:
+            return PriceVolume(notional / filled, filled)
+
+        return PriceVolume(self._ticks.ticks_to_price(notional) / filled, self._ticks.lots_to_amount(filled))
+
+    def sweep_bid(self, amount: Decimal) -> PriceVolume:
+        """
+        Average price and filled amount when selling the given amount into the bids.
+
+        :param amount: positive amount
+        :return: PriceVolume(average price, filled amount), price is None when the side is empty
+        """
+        return self._sweep(self._bids, amount)
+
+    def sweep_ask(self, amount: Decimal) -> PriceVolume:
+        """
+        Average price and filled amount when buying the given amount from the asks.
+
+        :param amount: positive amount
+        :return: PriceVolume(average price, filled amount), price is None when the side is empty
+        """
+        return self._sweep(self._asks, amount)
+
+    def _depth(self, side: OrderBookSide, price: Decimal) -> Decimal:
+        amount = side.depth_within(self._to_price(price))
+        if self._ticks is None:
+            return Decimal(amount)
+
+        return self._ticks.lots_to_amount(amount)
+
+    def depth_bid(self, price: Decimal) -> Decimal:
+        """
+
+        :param price: limit price
+        :return: amount available on the bid side at the limit price or above
+        """
+        return self._depth(self._bids, price)
+
+    def depth_ask(self, price: Decimal) -> Decimal:
+        """
+
+        :param price: limit price
+        :return: amount available on the ask side at the limit price or below
         """
-        return self.update_quote(self._quotes_bid_by_price, price, amount)
+        return self._depth(self._asks, price)
+
+    def _checksum_repr(self, value, to_decimal: Callable[[int], Decimal]) -> str:
+        if self._ticks is not None:
+            value = to_decimal(value)
+
+        return js_number_repr(value)
+
+    def checksum(self, depth: int = 25) -> int:
+        """
+        Bitfinex book checksum: CRC32 of interleaved "price:amount" values over the best levels.
+
+        :param depth: number of levels per side
+        :return: signed 32 bits checksum
+        """
+        ticks_to_price = self._ticks.ticks_to_price if self._ticks is not None else None
+        lots_to_amount = self._ticks.lots_to_amount if self._ticks is not None else None
+        bids = self._bids.top_levels(depth)
+        asks = self._asks.top_levels(depth)
+        values = list()
+        for index in range(max(len(bids), len(asks))):
+            for levels in (bids, asks):
+                if index < len(levels):
+                    price, amount = levels[index]
+                    values.append(self._checksum_repr(price, ticks_to_price))
+                    values.append(self._checksum_repr(amount, lots_to_amount))
+
+        checksum = zlib.crc32(':'.join(values).encode('utf-8'))
+        if checksum >= 2 ** 31:
+            checksum -= 2 ** 32
+
+        return checksum
+
+    def verify_checksum(self, checksum: int, depth: int = 25) -> bool:
+        """
+
+        :param checksum: checksum provided by the exchange
+        :param depth: number of levels per side
+        :return: True when the book matches
+        """
+        return self.checksum(depth) == checksum
 
     def level_one(self) -> ForexQuote:
         """
         :return:
         """
-        if len(self.quotes_bid) == 0 or len(self.quotes_ask) == 0:
+        best_bid = self._bids.best_level
+        best_ask = self._asks.best_level
+        if best_bid is None or best_ask is None:
             logging.error('invalid state for quote: {} / {} for pair {}'.format(self.quotes_bid, self.quotes_ask, self.pair))
             return ForexQuote(datetime.now(), source=self.source)
 
-        best_bid = self.quotes_bid[0]
-        best_ask = self.quotes_ask[0]
-        timestamp = max(best_bid['timestamp'], best_ask['timestamp'])
-        bid_side = PriceVolume(abs(best_bid['price']), abs(best_bid['amount']))
-        ask_side = PriceVolume(abs(best_ask['price']), abs(best_ask['amount']))
-        return ForexQuote(timestamp, bid_side, ask_side, source=self.source)
+        timestamp = max(best_bid[1], best_ask[1])
+        if self._level_one_bid[0] is not best_bid:
+            self._level_one_bid = best_bid, self._to_price_volume(self._bids.best_price, best_bid[0])
+
+        if self._level_one_ask[0] is not best_ask:
+            self._level_one_ask = best_ask, self._to_price_volume(self._asks.best_price, best_ask[0])
+
+        bid_side = self._level_one_bid[1]
+        ask_side = self._level_one_ask[1]
+        latency = None
+        if self._frame_ns is not None:
+            latency = LatencyStamps({STAGE_FRAME: self._frame_ns, STAGE_BOOK: self._notified_ns or self._frame_ns})
+            latency.mark(STAGE_LEVEL_ONE)
+
+        return ForexQuote(timestamp, bid_side, ask_side, source=self.source, latency=latency)
 
     def to_json(self) -> str:
         return json.dumps({'bid': self.quotes_bid, 'ask': self.quotes_ask}, cls=QuoteEncoder)
 
     def __repr__(self) -> str():
         return self.to_json()
+
+
+class OrderBookRegistry(object):
+    """
+    Order books of a source, reachable by channel id and by pair, with a common maximum depth per side.
+    """
+
+    def __init__(self, source: str, max_depth: int = None,
+                 top_of_book_callback: Callable[[Any, OrderBook, str], Any] = None):
+        """
+
+        :param source:
+        :param max_depth: maximum number of levels kept per side, None for unbounded books
+        :param top_of_book_callback: called with (pair, order book, side) when the best bid or ask changes
+        """
+        self._source = source
+        self._max_depth = max_depth
+        self._top_of_book_callback = top_of_book_callback
+        self._books_by_pair = dict()
+        self._books_by_channel = dict()
+        self._pairs_by_channel = dict()
+
+    @property
+    def max_depth(self) -> int:
+        return self._max_depth
+
+    def get_or_create(self, pair: Any, ticks: PriceTicks = None) -> OrderBook:
+        """
+
+        :param pair:
+        :param ticks: fixed-point representation for a newly created book
+        :return: book of the pair, created on first use
+        """
+        if pair not in self._books_by_pair:
+            callback = None
+            if self._top_of_book_callback is not None:
+                callback = partial(self._top_of_book_callback, pair)
+
+            self._books_by_pair[pair] = OrderBook(pair, self._source, ticks=ticks, top_of_book_callback=callback,
+                                                  max_depth=self._max_depth)
+
+        return self._books_by_pair[pair]
+
+    def add(self, channel_id: Any, pair: Any, ticks: PriceTicks = None) -> OrderBook:
+        """
+        Binds a channel to the book of a pair, the book being created on first use.
+
+        :param channel_id:
+        :param pair:
+        :param ticks: fixed-point representation for a newly created book
+        :return:
+        """
+        orderbook = self.get_or_create(pair, ticks=ticks)
+        self._books_by_channel[channel_id] = orderbook
+        self._pairs_by_channel[channel_id] = pair
+        return orderbook
+
+    def pairs(self) -> List[Any]:
+        return list(self._books_by_pair.keys())
+
+    def remove_channel(self, channel_id: Any) -> Any:
+        """
+        Unbinds a channel, the book of the pair is kept until the pair is bound again.
+
+        :param channel_id:
+        :return: pair of the channel
+        """
+        self._books_by_channel.pop(channel_id)
+        return self._pairs_by_channel.pop(channel_id)
+
+    def by_channel(self, channel_id: Any) -> OrderBook:
+        return self._books_by_channel[channel_id]
+
+    def by_pair(self, pair: Any) -> OrderBook:
+        return self._books_by_pair[pair]
+
+    def pair(self, channel_id: Any) -> Any:
+        return self._pairs_by_channel[channel_id]
+
+    def has_channel(self, channel_id: Any) -> bool:
+        return channel_id in self._books_by_channel
+
+    def memory_usage(self) -> Dict[Any, int]:
+        """
+
+        :return: estimated memory footprint of each book in bytes, by pair
+        """
+        return {pair: book.memory_usage() for pair, book in self._books_by_pair.items()}
+
+    def __len__(self) -> int:
+        return len(self._books_by_pair)
+
+    def __iter__(self):
+        return iter(self._books_by_pair.values())
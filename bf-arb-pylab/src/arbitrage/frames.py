@@ -0,0 +1,287 @@
+"""
+Recording of the raw websocket frames received by pricing-source, for rebuilding books offline.
+
+Frames are written by a dedicated thread to compressed segment files (gzip or lzma), rotated by size or age:
+
+    <prefix>.<segment number, 6 digits>.frames.gz (or .frames.xz)
+
+Each segment is a stream of text lines, starting with a header line, followed by one line per frame:
+
+    # {"version": 1, "opened": ISO time, "monotonic_ns": monotonic clock when opening}
+    <monotonic reception time, nanoseconds>\t<frame>
+
+Frames are single-line JSON (newlines, only possible as whitespace, are replaced by spaces). Gzip segments are
+flushed when the feed is idle, lzma segments are only complete once rotated or closed.
+"""
+import asyncio
+import glob
+import gzip
+import json
+import logging
+import lzma
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Generator, Iterable, List, Tuple
+
+FRAMES_VERSION = 1
+SEGMENT_EXTENSIONS = {'gzip': '.frames.gz', 'lzma': '.frames.xz'}
+_OPENERS = {'.gz': gzip.open, '.xz': lzma.open}
+_BATCH_SIZE = 1024
+
+
+def segment_path(prefix: str, number: int, compression: str = 'gzip') -> str:
+    return '{}.{:06d}{}'.format(prefix, number, SEGMENT_EXTENSIONS[compression])
+
+
+def frame_segments(prefix: str) -> List[str]:
+    """
+
+    :param prefix: path prefix given to the recorder
+    :return: segment files, in recording order
+    """
+    paths = list()
+    for extension in SEGMENT_EXTENSIONS.values():
+        paths += glob.glob(glob.escape(prefix) + '.[0-9][0-9][0-9][0-9][0-9][0-9]' + extension)
+
+    return sorted(paths)
+
+
+def _open_segment(path: str, mode: str):
+    opener = _OPENERS.get(os.path.splitext(path)[1])
+    if opener is None:
+        raise ValueError('unsupported frames segment: {}'.format(path))
+
+    return opener(path, mode)
+
+
+class FrameRecorder(object):
+    """
+    Queues frames from the receiving loop and writes them on a background thread.
+    """
+
+    def __init__(self, prefix: str, compression: str = 'gzip', segment_bytes: int = 256 << 20,
+                 segment_seconds: float = 3600., flush_interval: float = 1.):
+        """
+
+        :param prefix: path prefix of the segment files
+        :param compression: 'gzip' or 'lzma'
+        :param segment_bytes: uncompressed size after which a new segment is started
+        :param segment_seconds: age after which a new segment is started
+        :param flush_interval: seconds without frame after which the current segment is flushed
+        """
+        if compression not in SEGMENT_EXTENSIONS:
+            raise ValueError('unsupported compression: {}'.format(compression))
+
+        self._prefix = prefix
+        self._compression = compression
+        self._segment_bytes = segment_bytes
+        self._segment_seconds = segment_seconds
+        self._flush_interval = flush_interval
+        existing = frame_segments(prefix)
+        self._segment_number = int(existing[-1][len(prefix) + 1:len(prefix) + 7]) + 1 if existing else 0
+        self._segment = None
+        self._segment_size = 0
+        self._segment_opened = 0.
+        self._count = 0
+        self._error = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='frame-recorder', daemon=True)
+        self._thread.start()
+
+    @property
+    def count(self) -> int:
+        """
+
+        :return: number of frames written
+        """
+        return self._count
+
+    def record(self, frame: str, received_ns: int) -> None:
+        """
+        Never waits for the disk: the frame is queued for the writer thread.
+
+        :param frame: raw frame
+        :param received_ns: monotonic reception time
+        :return:
+        """
+        if self._error is not None:
+            raise RuntimeError('frame recorder stopped: {}'.format(self._error))
+
+        self._queue.put_nowait((received_ns, frame))
+
+    def _open(self) -> None:
+        path = segment_path(self._prefix, self._segment_number, self._compression)
+        self._segment_number += 1
+        self._segment = _open_segment(path, 'wb')
+        header = {'version': FRAMES_VERSION, 'opened': datetime.utcnow().isoformat(),
+                  'monotonic_ns': time.monotonic_ns()}
+        self._segment.write('# {}\n'.format(json.dumps(header)).encode('utf-8'))
+        self._segment_size = 0
+        self._segment_opened = time.monotonic()
+        logging.info('recording frames to {}'.format(path))
+
+    def _close_segment(self) -> None:
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def _write(self, items: List[Tuple[int, str]]) -> None:
+        if self._segment is not None and time.monotonic() - self._segment_opened >= self._segment_seconds:
+            self._close_segment()
+
+        lines = list()
+        size = 0
+        for received_ns, frame in items:
+            if isinstance(frame, bytes):
+                frame = frame.decode('utf-8')
+
+            line = '{}\t{}\n'.format(received_ns, frame.replace('\n', ' ')).encode('utf-8')
+            lines.append(line)
+            size += len(line)
+            if self._segment_size + size >= self._segment_bytes:
+                self._write_lines(lines, size)
+                self._close_segment()
+                lines = list()
+                size = 0
+
+        if len(lines) > 0:
+            self._write_lines(lines, size)
+
+    def _write_lines(self, lines: List[bytes], size: int) -> None:
+        if self._segment is None:
+            self._open()
+
+        self._segment.write(b''.join(lines))
+        self._segment_size += size
+        self._count += len(lines)
+
+    def _run(self) -> None:
+        dirty = False
+        try:
+            while True:
+                try:
+                    item = self._queue.get(timeout=self._flush_interval)
+
+                except queue.Empty:
+                    if dirty and self._segment is not None:
+                        self._segment.flush()
+                        dirty = False
+
+                    continue
+
+                if item is None:
+                    break
+
+                items = [item]
+                stopping = False
+                while len(items) < _BATCH_SIZE:
+                    try:
+                        item = self._queue.get_nowait()
+
+                    except queue.Empty:
+                        break
+
+                    if item is None:
+                        stopping = True
+                        break
+
+                    items.append(item)
+
+                self._write(items)
+                dirty = True
+                if stopping:
+                    break
+
+        except Exception as error:
+            logging.exception('frame recorder failed')
+            self._error = error
+
+        finally:
+            self._close_segment()
+
+    def close(self) -> None:
+        """
+        Writes the queued frames and closes the current segment.
+
+        :return:
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+        logging.info('recorded {} frames'.format(self._count))
+
+
+def read_frames(paths: Iterable[str]) -> Generator[Tuple[int, str], None, None]:
+    """
+    Reads recorded segments, a truncated segment (recorder killed) ending at its last complete frame.
+
+    :param paths: segment files, in recording order
+    :return: (monotonic reception time in nanoseconds, frame)
+    """
+    for path in paths:
+        with _open_segment(path, 'rb') as segment:
+            try:
+                for line in segment:
+                    if line.startswith(b'#'):
+                        continue
+
+                    if not line.endswith(b'\n'):
+                        logging.warning('skipping truncated frame at the end of {}'.format(path))
+                        break
+
+                    received_ns, frame = line[:-1].split(b'\t', 1)
+                    yield int(received_ns), frame.decode('utf-8')
+
+            except (EOFError, lzma.LZMAError) as error:
+                logging.warning('truncated frames segment {}: {}'.format(path, error))
+
+
+class RecordedConnection(object):
+    """
+    Stands for the websocket connection when replaying frames: recv() returns the recorded frames, then None,
+    messages sent are ignored.
+    """
+
+    def __init__(self, frames: Iterable[Tuple[int, str]]):
+        """
+
+        :param frames: (reception time, frame), as returned by read_frames()
+        """
+        self._frames = iter(frames)
+        self._received_ns = None
+        self._count = 0
+
+    @property
+    def received_ns(self) -> int:
+        """
+
+        :return: recorded reception time of the latest frame
+        """
+        return self._received_ns
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    async def recv(self) -> str:
+        # gives pending callbacks (executor results) a chance to run, as receiving from a socket would
+        await asyncio.sleep(0)
+        for received_ns, frame in self._frames:
+            self._received_ns = received_ns
+            self._count += 1
+            return frame
+
+        return None
+
+    async def send(self, message: str) -> None:
+        logging.debug('replaying frames, not sending: {}'.format(message))
+
+    async def __aenter__(self) -> 'RecordedConnection':
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        pass
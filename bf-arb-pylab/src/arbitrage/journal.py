@@ -0,0 +1,289 @@
+"""
+Order book persistence: periodic checkpoints of all books plus a journal of the deltas received in between.
+
+A checkpoint is a binary file read back through mmap:
+
+    header: magic (4 bytes), version (uint16), creation time (float64, epoch seconds), books count (uint32)
+    book:   pair, source, tick size, lot size (length-prefixed utf-8 strings, empty sizes for Decimal books),
+            bid levels count, ask levels count (uint32),
+            levels as length-prefixed price and amount strings, ask amounts being negative
+
+The journal is a text file with one JSON array per delta:
+
+    ["S", pair, [[price, amount], ...]]  snapshot
+    ["U", pair, price, amount]           level update, the sign of the amount giving the side
+    ["R", pair, price, side]             level removal, side being "bid" or "ask"
+
+Checkpoints are written in the background: when the books are snapshotted, the journal is rotated to
+path + '.previous', which covers the deltas up to the snapshot, and a new journal is started. The previous journal is
+discarded once the checkpoint is written. Warm starts replay the previous journal first when present: replaying it
+over the checkpoint of its snapshot is idempotent, so a crash between writing the checkpoint and discarding the
+previous journal is harmless.
+"""
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Callable, List, Tuple
+
+from arbitrage.entities import OrderBookRegistry, PriceTicks, QuoteEncoder
+
+CHECKPOINT_MAGIC = b'OBK1'
+CHECKPOINT_VERSION = 1
+_HEADER = struct.Struct('<4sHdI')
+_LEVELS_COUNT = struct.Struct('<II')
+_STRING_LENGTH = struct.Struct('<H')
+PREVIOUS_JOURNAL_SUFFIX = '.previous'
+
+# pair, source, ticks, bid levels and ask levels as (price, amount), ask amounts being negative
+BookSnapshot = Tuple[str, str, PriceTicks, List[Tuple[Any, Any]], List[Tuple[Any, Any]]]
+
+
+def _pack_string(value: str) -> bytes:
+    encoded = value.encode('utf-8')
+    return _STRING_LENGTH.pack(len(encoded)) + encoded
+
+
+def _unpack_string(buffer, offset: int) -> Tuple[str, int]:
+    length, = _STRING_LENGTH.unpack_from(buffer, offset)
+    offset += _STRING_LENGTH.size
+    return bytes(buffer[offset:offset + length]).decode('utf-8'), offset + length
+
+
+def snapshot_books(orderbooks: OrderBookRegistry) -> List[BookSnapshot]:
+    """
+    Copies the levels of all books, for writing them outside of the receiving loop.
+
+    :param orderbooks:
+    :return:
+    """
+    books = list()
+    for orderbook in orderbooks:
+        bids = [(quote['price'], quote['amount']) for quote in orderbook.quotes_bid]
+        asks = [(-quote['price'], quote['amount']) for quote in orderbook.quotes_ask]
+        books.append((str(orderbook.pair), orderbook.source, orderbook.ticks, bids, asks))
+
+    return books
+
+
+def write_snapshot(path: str, books: List[BookSnapshot]) -> None:
+    """
+    Writes snapshotted books to a checkpoint file, atomically replacing the previous one.
+
+    :param path:
+    :param books: as returned by snapshot_books()
+    :return:
+    """
+    chunks = [_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, time.time(), len(books))]
+    for pair, source, ticks, bids, asks in books:
+        chunks.append(_pack_string(pair))
+        chunks.append(_pack_string(source))
+        if ticks is None:
+            chunks.append(_pack_string('') + _pack_string(''))
+
+        else:
+            chunks.append(_pack_string(str(ticks.tick_size)) + _pack_string(str(ticks.lot_size)))
+
+        chunks.append(_LEVELS_COUNT.pack(len(bids), len(asks)))
+        for price, amount in bids + asks:
+            chunks.append(_pack_string(str(price)) + _pack_string(str(amount)))
+
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as checkpoint_file:
+        checkpoint_file.write(b''.join(chunks))
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+
+    os.replace(temporary_path, path)
+
+
+def write_checkpoint(path: str, orderbooks: OrderBookRegistry) -> None:
+    """
+    Writes all books to a checkpoint file, atomically replacing the previous one.
+
+    :param path:
+    :param orderbooks:
+    :return:
+    """
+    write_snapshot(path, snapshot_books(orderbooks))
+
+
+def read_checkpoint(path: str) -> Tuple[float, List[Tuple[str, str, PriceTicks, List[List[str]]]]]:
+    """
+    Maps a checkpoint file and decodes it.
+
+    :param path:
+    :return: (creation time, [(pair, source, ticks or None, [[price, count, amount], ...]), ...])
+    """
+    books = list()
+    with open(path, 'rb') as checkpoint_file:
+        with mmap.mmap(checkpoint_file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            magic, version, created, books_count = _HEADER.unpack_from(buffer, 0)
+            if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION:
+                raise ValueError('unsupported checkpoint file: {}'.format(path))
+
+            offset = _HEADER.size
+            for _ in range(books_count):
+                pair, offset = _unpack_string(buffer, offset)
+                source, offset = _unpack_string(buffer, offset)
+                tick_size, offset = _unpack_string(buffer, offset)
+                lot_size, offset = _unpack_string(buffer, offset)
+                ticks = PriceTicks(Decimal(tick_size), Decimal(lot_size)) if tick_size else None
+                bids_count, asks_count = _LEVELS_COUNT.unpack_from(buffer, offset)
+                offset += _LEVELS_COUNT.size
+                rows = list()
+                for _ in range(bids_count + asks_count):
+                    price, offset = _unpack_string(buffer, offset)
+                    amount, offset = _unpack_string(buffer, offset)
+                    rows.append([price, 1, amount])
+
+                books.append((pair, source, ticks, rows))
+
+    return created, books
+
+
+class BookJournal(object):
+    """
+    Append-only journal of the book deltas received since the last checkpoint.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._journal_file = open(path, 'a', encoding='utf-8')
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def _write(self, record: List[Any]) -> None:
+        self._journal_file.write(json.dumps(record, cls=QuoteEncoder))
+        self._journal_file.write('\n')
+
+    def snapshot(self, pair: str, book_data: List[List[Any]]) -> None:
+        """
+
+        :param pair:
+        :param book_data: [[price, count, amount], ...]
+        :return:
+        """
+        self._write(['S', pair, [[price, amount] for price, count, amount in book_data]])
+
+    def update(self, pair: str, price: Any, amount: Any) -> None:
+        self._write(['U', pair, price, amount])
+
+    def remove(self, pair: str, price: Any, side: str) -> None:
+        self._write(['R', pair, price, side])
+
+    def flush(self) -> None:
+        self._journal_file.flush()
+
+    def rotate(self) -> None:
+        """
+        Moves the journal aside when the books are snapshotted, until the checkpoint is written.
+
+        :return:
+        """
+        self._journal_file.close()
+        previous_path = self._path + PREVIOUS_JOURNAL_SUFFIX
+        if os.path.exists(previous_path):
+            # previous checkpoint not written: its deltas are kept
+            with open(previous_path, 'a', encoding='utf-8') as previous_file:
+                with open(self._path, 'r', encoding='utf-8') as journal_file:
+                    shutil.copyfileobj(journal_file, previous_file)
+
+            os.remove(self._path)
+
+        else:
+            os.replace(self._path, previous_path)
+
+        self._journal_file = open(self._path, 'w', encoding='utf-8')
+
+    def discard_previous(self) -> None:
+        """
+        Removes the journal moved aside by rotate(), once covered by a checkpoint.
+
+        :return:
+        """
+        previous_path = self._path + PREVIOUS_JOURNAL_SUFFIX
+        if os.path.exists(previous_path):
+            os.remove(previous_path)
+
+    def close(self) -> None:
+        self._journal_file.close()
+
+
+def replay_journal(path: str, orderbooks: OrderBookRegistry, ticks_lookup: Callable[[str], PriceTicks] = None) -> int:
+    """
+    Applies journaled deltas to the books of the registry, snapshots being flagged stale.
+
+    :param path:
+    :param orderbooks:
+    :param ticks_lookup: fixed-point representation of the books created while replaying
+    :return: number of applied records
+    """
+    count = 0
+    with open(path, 'r', encoding='utf-8') as journal_file:
+        for line in journal_file:
+            try:
+                record = json.loads(line, parse_float=Decimal)
+
+            except ValueError:
+                # last line may be truncated by a crash
+                logging.warning('skipping invalid journal line: {}'.format(line))
+                continue
+
+            kind, pair = record[0], record[1]
+            orderbook = orderbooks.get_or_create(pair, ticks=ticks_lookup(pair) if ticks_lookup else None)
+            if kind == 'S':
+                orderbook.load_snapshot([None, [[price, 1, amount] for price, amount in record[2]]], stale=True)
+
+            elif kind == 'U':
+                price, amount = Decimal(record[2]), Decimal(record[3])
+                if amount > 0:
+                    orderbook.update_bid(price, amount)
+
+                else:
+                    orderbook.update_ask(price, amount)
+
+            elif kind == 'R':
+                if record[3] == 'bid':
+                    orderbook.remove_bid(Decimal(record[2]))
+
+                else:
+                    orderbook.remove_ask(Decimal(record[2]))
+
+            count += 1
+
+    return count
+
+
+def warm_start(orderbooks: OrderBookRegistry, checkpoint_path: str, journal_path: str = None,
+               ticks_lookup: Callable[[str], PriceTicks] = None) -> int:
+    """
+    Restores books from the last checkpoint and journal, books are flagged stale until their next snapshot.
+
+    :param orderbooks: registry receiving the restored books
+    :param checkpoint_path:
+    :param journal_path:
+    :param ticks_lookup: fixed-point representation of the books created while replaying the journal
+    :return: number of restored books
+    """
+    if os.path.exists(checkpoint_path):
+        created, books = read_checkpoint(checkpoint_path)
+        logging.info('restoring {} books from checkpoint {} ({})'.format(
+            len(books), checkpoint_path, datetime.fromtimestamp(created, timezone.utc)))
+        for pair, source, ticks, rows in books:
+            orderbooks.get_or_create(pair, ticks=ticks).load_snapshot([None, rows], stale=True)
+
+    if journal_path is not None:
+        for path in (journal_path + PREVIOUS_JOURNAL_SUFFIX, journal_path):
+            if os.path.exists(path):
+                records_count = replay_journal(path, orderbooks, ticks_lookup=ticks_lookup)
+                logging.info('replayed {} journal records from {}'.format(records_count, path))
+
+    return len(orderbooks)
@@ -0,0 +1,223 @@
+"""
+Latency stamps carried by quotes from the exchange frame to the arbitrage decision, and per-stage histograms.
+
+Stamps are time.monotonic_ns() values: the monotonic clock is common to all processes of a host, so that stamps
+taken by pricing-source remain comparable once the quote is parsed by scan-arb.
+
+Stages, in order:
+
+    frame       websocket frame received by pricing-source
+    book        order book updated, top of book change notified
+    level_one   top of book quote built
+    parsed      quote decoded by scan-arb
+    decision    opportunity evaluated
+"""
+import atexit
+import logging
+import signal
+import time
+from typing import Dict, List, Tuple
+
+STAGE_FRAME = 'frame'
+STAGE_BOOK = 'book'
+STAGE_LEVEL_ONE = 'level_one'
+STAGE_PARSED = 'parsed'
+STAGE_DECISION = 'decision'
+
+_SUB_BUCKET_BITS = 3
+_SUB_BUCKET_COUNT = 1 << _SUB_BUCKET_BITS
+
+
+class LatencyStamps(object):
+    """
+    Ordered monotonic nanosecond timestamps, by stage.
+    """
+
+    def __init__(self, stamps: Dict[str, int] = None):
+        """
+
+        :param stamps: stage -> nanoseconds, in stage order
+        """
+        self._stamps = dict()  # type: Dict[str, int]
+        if stamps is not None:
+            self._stamps.update((stage, int(timestamp_ns)) for stage, timestamp_ns in stamps.items())
+
+    def mark(self, stage: str, timestamp_ns: int = None) -> None:
+        """
+
+        :param stage:
+        :param timestamp_ns: defaults to now
+        :return:
+        """
+        self._stamps[stage] = time.monotonic_ns() if timestamp_ns is None else timestamp_ns
+
+    def get(self, stage: str) -> int:
+        return self._stamps.get(stage)
+
+    def stages(self) -> List[str]:
+        return list(self._stamps.keys())
+
+    def intervals(self) -> List[Tuple[str, int]]:
+        """
+
+        :return: ('<stage>-><next stage>', nanoseconds) for consecutive stages
+        """
+        stamps = list(self._stamps.items())
+        return [('{}->{}'.format(stage, next_stage), next_timestamp_ns - timestamp_ns)
+                for (stage, timestamp_ns), (next_stage, next_timestamp_ns) in zip(stamps, stamps[1:])]
+
+    def to_dict(self) -> Dict[str, int]:
+        return dict(self._stamps)
+
+    def __len__(self) -> int:
+        return len(self._stamps)
+
+    def __repr__(self):
+        return 'LatencyStamps({})'.format(self._stamps)
+
+
+def _bucket_index(value: int) -> int:
+    if value < _SUB_BUCKET_COUNT:
+        return value
+
+    shift = value.bit_length() - 1 - _SUB_BUCKET_BITS
+    return ((shift + 1) << _SUB_BUCKET_BITS) + (value >> shift) - _SUB_BUCKET_COUNT
+
+
+def _bucket_upper_bound(index: int) -> int:
+    if index < _SUB_BUCKET_COUNT:
+        return index
+
+    shift = (index >> _SUB_BUCKET_BITS) - 1
+    mantissa = (index & (_SUB_BUCKET_COUNT - 1)) + _SUB_BUCKET_COUNT
+    return ((mantissa + 1) << shift) - 1
+
+
+class LatencyHistogram(object):
+    """
+    Log-linear histogram of nanosecond durations: 8 buckets per power of two, so that percentiles are reported
+    within 12.5%.
+    """
+
+    def __init__(self):
+        self._buckets = dict()  # type: Dict[int, int]
+        self._count = 0
+        self._total = 0
+        self._min = None
+        self._max = None
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def min(self) -> int:
+        return self._min
+
+    @property
+    def max(self) -> int:
+        return self._max
+
+    def mean(self) -> float:
+        return self._total / self._count if self._count else None
+
+    def record(self, duration_ns: int) -> None:
+        """
+
+        :param duration_ns: negative durations (stamps from another host) are recorded as zero
+        :return:
+        """
+        duration_ns = max(duration_ns, 0)
+        index = _bucket_index(duration_ns)
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+        self._count += 1
+        self._total += duration_ns
+        if self._min is None or duration_ns < self._min:
+            self._min = duration_ns
+
+        if self._max is None or duration_ns > self._max:
+            self._max = duration_ns
+
+    def percentile(self, percent: float) -> int:
+        """
+
+        :param percent: between 0 and 100
+        :return: upper bound of the bucket holding the percentile, None when empty
+        """
+        if self._count == 0:
+            return None
+
+        rank = max(1, int(round(self._count * percent / 100.)))
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen >= rank:
+                return min(_bucket_upper_bound(index), self._max)
+
+        return self._max
+
+
+class LatencyRecorder(object):
+    """
+    Histograms of the intervals between consecutive stages, plus the end-to-end interval.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._histograms = dict()  # type: Dict[str, LatencyHistogram]
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def histogram(self, interval: str) -> LatencyHistogram:
+        if interval not in self._histograms:
+            self._histograms[interval] = LatencyHistogram()
+
+        return self._histograms[interval]
+
+    def observe(self, stamps: LatencyStamps) -> None:
+        """
+
+        :param stamps:
+        :return:
+        """
+        intervals = stamps.intervals()
+        for interval, duration_ns in intervals:
+            self.histogram(interval).record(duration_ns)
+
+        if len(intervals) > 1:
+            stages = stamps.stages()
+            self.histogram('{}->{}'.format(stages[0], stages[-1])).record(
+                stamps.get(stages[-1]) - stamps.get(stages[0]))
+
+    def report(self) -> str:
+        """
+
+        :return: one line per interval, durations in microseconds
+        """
+        lines = ['latency {} (us): {:>24} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+            self._name, 'interval', 'count', 'min', 'p50', 'p90', 'p99', 'max')]
+        for interval, histogram in self._histograms.items():
+            lines.append('latency {} (us): {:>24} {:>10} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}'.format(
+                self._name, interval, histogram.count, histogram.min / 1000., histogram.percentile(50) / 1000.,
+                histogram.percentile(90) / 1000., histogram.percentile(99) / 1000., histogram.max / 1000.))
+
+        return '\n'.join(lines)
+
+    def dump(self) -> None:
+        for line in self.report().split('\n'):
+            logging.info(line)
+
+
+def install_dump_handlers(recorder: LatencyRecorder, dump_signal: int = signal.SIGUSR1) -> None:
+    """
+    Dumps the histograms to the log when the process exits or receives the signal.
+
+    :param recorder:
+    :param dump_signal: None to only dump at exit
+    :return:
+    """
+    atexit.register(recorder.dump)
+    if dump_signal is not None:
+        signal.signal(dump_signal, lambda signal_number, frame: recorder.dump())
@@ -0,0 +1,225 @@
+"""
+Vectorized evaluation of a strategy universe: top of book arrays indexed by pair, strategies as rows of leg indices.
+
+Amounts are float64, they follow the steps of ArbitrageStrategy.evaluate(): rows flagged profitable are meant to be
+confirmed with the exact Decimal evaluation (see StrategyMatrix.confirm()).
+"""
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy
+
+from arbitrage.entities import ArbitrageStrategy, CurrencyPair, ForexQuote
+
+
+class StrategyMatrix(object):
+    """
+    Keeps one bid / ask / volume array per pair and recomputes, on each quote, only the strategies trading the pair.
+    """
+
+    def __init__(self, strategies: Iterable[ArbitrageStrategy], illimited_volume: bool = False):
+        """
+
+        :param strategies:
+        :param illimited_volume: emulates infinite liquidity
+        """
+        self._strategies = list()
+        self._columns = dict()  # type: Dict[CurrencyPair, int]
+        legs = list()
+        settlements = list()
+        currencies = list()
+        slots = list()
+        known_strategies = set()
+        for strategy in strategies:
+            if strategy in known_strategies:
+                continue
+
+            known_strategies.add(strategy)
+            self._strategies.append(strategy)
+            legs.append([self._columns.setdefault(pair, len(self._columns)) for pair in strategy.legs])
+            settlements.append((strategy.settle_by_buying, strategy.settle_from_base))
+            strategy_currencies = sorted(set().union(*[pair.assets for pair in strategy.legs]))
+            currencies.append(strategy_currencies)
+            # slot of the base and quote currencies of each leg within the strategy currencies
+            slots.append([strategy_currencies.index(currency) for pair in strategy.legs
+                          for currency in (pair.base, pair.quote)])
+
+        self._illimited_volume = illimited_volume
+        self._currencies = currencies
+        pairs_count = len(self._columns)
+        strategies_count = len(self._strategies)
+        self._pairs = sorted(self._columns, key=self._columns.get)
+        self._quotes = [None] * pairs_count  # type: List[ForexQuote]
+        self._bid_prices = numpy.full(pairs_count, numpy.nan)
+        self._bid_volumes = numpy.full(pairs_count, numpy.nan)
+        self._ask_prices = numpy.full(pairs_count, numpy.nan)
+        self._ask_volumes = numpy.full(pairs_count, numpy.nan)
+        self._legs = numpy.array(legs, dtype=numpy.intp).reshape(strategies_count, 3)
+        settlements = numpy.array(settlements, dtype=bool).reshape(strategies_count, 2)
+        self._settle_by_buying = settlements[:, 0]
+        self._settle_from_base = settlements[:, 1]
+        self._slots = numpy.array(slots, dtype=numpy.intp).reshape(strategies_count, 6)
+        self._net_balances = numpy.full((strategies_count, 3), numpy.nan)
+        self._fill_ratios = numpy.full(strategies_count, numpy.nan)
+        self._thresholds = numpy.zeros((strategies_count, 3))
+        self._rows_by_column = [numpy.flatnonzero((self._legs == column).any(axis=1)) for column in range(pairs_count)]
+
+    @property
+    def strategies(self) -> List[ArbitrageStrategy]:
+        return self._strategies
+
+    @property
+    def pairs(self) -> List[CurrencyPair]:
+        return self._pairs
+
+    @property
+    def net_balances(self) -> numpy.ndarray:
+        """
+
+        :return: net balance of each strategy (rows) by currency (columns, see currencies()), NaN when a quote is missing
+        """
+        return self._net_balances
+
+    @property
+    def fill_ratios(self) -> numpy.ndarray:
+        """
+
+        :return: fraction of the initial leg executed by each strategy
+        """
+        return self._fill_ratios
+
+    def currencies(self, row: int) -> List[str]:
+        return self._currencies[row]
+
+    def rows_for(self, pair: CurrencyPair) -> numpy.ndarray:
+        """
+
+        :param pair:
+        :return: rows of the strategies trading the pair
+        """
+        column = self._columns.get(pair)
+        if column is None:
+            return numpy.empty(0, dtype=numpy.intp)
+
+        return self._rows_by_column[column]
+
+    def set_thresholds(self, thresholds: Dict[str, float]) -> None:
+        """
+
+        :param thresholds: lower profit limit by currency, 0 for missing currencies
+        :return:
+        """
+        for row, currencies in enumerate(self._currencies):
+            self._thresholds[row] = [float(thresholds.get(currency, 0.)) for currency in currencies]
+
+    def update_quote(self, pair: CurrencyPair, quote: ForexQuote) -> numpy.ndarray:
+        """
+        Stores the quote and recomputes the strategies trading the pair.
+
+        :param pair:
+        :param quote:
+        :return: recomputed rows
+        """
+        column = self._columns.get(pair)
+        if column is None:
+            return numpy.empty(0, dtype=numpy.intp)
+
+        self._quotes[column] = quote
+        if quote.is_complete():
+            self._bid_prices[column] = quote.bid.price
+            self._bid_volumes[column] = quote.bid.volume
+            self._ask_prices[column] = quote.ask.price
+            self._ask_volumes[column] = quote.ask.volume
+
+        else:
+            self._bid_prices[column] = self._bid_volumes[column] = numpy.nan
+            self._ask_prices[column] = self._ask_volumes[column] = numpy.nan
+
+        rows = self._rows_by_column[column]
+        self._evaluate(rows)
+        return rows
+
+    def _evaluate(self, rows: numpy.ndarray) -> None:
+        initial, following, final = self._legs[rows, 0], self._legs[rows, 1], self._legs[rows, 2]
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            # step 1: selling the whole bid volume of indirect pair 1
+            allowed_initial = numpy.abs(self._bid_volumes[initial])
+            base_initial = -allowed_initial
+            quote_initial = allowed_initial * self._bid_prices[initial]
+
+            # step 2: selling the proceeds through indirect pair 2
+            volume_next = numpy.abs(quote_initial)
+            allowed_next = volume_next
+            if not self._illimited_volume:
+                allowed_next = numpy.minimum(volume_next, self._bid_volumes[following])
+
+            fill_next = allowed_next / volume_next
+            base_next = -allowed_next
+            quote_next = allowed_next * self._bid_prices[following]
+            base_initial = base_initial * fill_next
+            quote_initial = quote_initial * fill_next
+
+            # step 3: offsetting the remaining balance through the direct pair, buying or selling it
+            settling_amount = numpy.abs(numpy.where(self._settle_from_base[rows], base_initial, quote_initial))
+            by_buying = self._settle_by_buying[rows]
+            volume_final = numpy.where(by_buying, settling_amount, settling_amount / self._bid_prices[final])
+            allowed_final = volume_final
+            if not self._illimited_volume:
+                allowed_final = numpy.minimum(volume_final, numpy.where(by_buying, self._ask_volumes[final],
+                                                                        self._bid_volumes[final]))
+
+            fill_final = allowed_final / volume_final
+            base_final = numpy.where(by_buying, allowed_final, -allowed_final)
+            quote_final = numpy.where(by_buying, -allowed_final * self._ask_prices[final],
+                                      allowed_final * self._bid_prices[final])
+
+            amounts = numpy.stack([base_initial * fill_final, quote_initial * fill_final,
+                                   base_next * fill_final, quote_next * fill_final, base_final, quote_final], axis=1)
+
+        net_balances = numpy.zeros((len(rows), 3))
+        slots = self._slots[rows]
+        for leg_currency in range(6):
+            net_balances[numpy.arange(len(rows)), slots[:, leg_currency]] += amounts[:, leg_currency]
+
+        fill_ratios = fill_next * fill_final
+        # strategies missing a quote
+        incomplete = numpy.isnan(self._bid_prices[initial] + self._bid_prices[following] + self._bid_prices[final])
+        net_balances[incomplete] = numpy.nan
+        fill_ratios[incomplete] = numpy.nan
+        self._net_balances[rows] = net_balances
+        self._fill_ratios[rows] = fill_ratios
+
+    def profitable(self, rows: numpy.ndarray = None) -> numpy.ndarray:
+        """
+
+        :param rows: restricts the search, all strategies by default
+        :return: rows with a net balance above the threshold of its currency
+        """
+        if rows is None:
+            rows = numpy.arange(len(self._strategies))
+
+        with numpy.errstate(invalid='ignore'):
+            above = (self._net_balances[rows] > self._thresholds[rows]).any(axis=1)
+
+        return rows[above]
+
+    def net_balance(self, row: int) -> Dict[str, float]:
+        return dict(zip(self._currencies[row], self._net_balances[row].tolist()))
+
+    def confirm(self, row: int) -> Tuple[Any, Any]:
+        """
+        Evaluates a strategy exactly on the latest quotes of its pairs.
+
+        :param row:
+        :return: (trades, balances) as returned by ArbitrageStrategy.find_opportunity()
+        """
+        strategy = self._strategies[row]
+        for pair, column in zip(strategy.legs, self._legs[row]):
+            if self._quotes[column] is None:
+                return None, None
+
+            strategy.update_quote(pair, self._quotes[column])
+
+        return strategy.find_opportunity(illimited_volume=self._illimited_volume)
+
+    def __len__(self) -> int:
+        return len(self._strategies)
@@ -0,0 +1,55 @@
+"""
+Numeric backends for evaluating strategies: Decimal, exact and used by default, or float64, several times faster and
+precise enough for detecting opportunities, which are then confirmed in Decimal.
+"""
+from decimal import Decimal
+from typing import Any, Callable
+
+
+class NumericBackend(object):
+    """
+    Number type used for prices, volumes and balances.
+    """
+
+    def __init__(self, name: str, number: Callable[[Any], Any], is_exact: bool):
+        """
+
+        :param name:
+        :param number: converts a value to the backend type
+        :param is_exact: True when amounts are computed without binary rounding
+        """
+        self._name = name
+        self._number = number
+        self._is_exact = is_exact
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def number(self) -> Callable[[Any], Any]:
+        return self._number
+
+    @property
+    def is_exact(self) -> bool:
+        return self._is_exact
+
+    def __repr__(self):
+        return 'NumericBackend({})'.format(self._name)
+
+
+DECIMAL = NumericBackend('decimal', Decimal, is_exact=True)
+FLOAT64 = NumericBackend('float64', float, is_exact=False)
+_BACKENDS = {backend.name: backend for backend in (DECIMAL, FLOAT64)}
+
+
+def numeric_backend(name: str) -> NumericBackend:
+    """
+
+    :param name: 'decimal' or 'float64'
+    :return:
+    """
+    if name not in _BACKENDS:
+        raise ValueError('unknown numeric backend: {} (available: {})'.format(name, ', '.join(sorted(_BACKENDS))))
+
+    return _BACKENDS[name]
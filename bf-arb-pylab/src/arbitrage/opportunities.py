@@ -0,0 +1,251 @@
+"""
+Lifecycle of the opportunities found by a scan: a strategy passing its thresholds opens an opportunity, which is
+updated when its trades change and closed when the strategy stops passing. Re-evaluations giving the same trades are
+coalesced, so that a persistent dislocation produces two events instead of one signal per tick.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Tuple
+
+from arbitrage.entities import ArbitrageStrategy, CurrencyPair
+
+OPEN = 'open'
+UPDATE = 'update'
+CLOSE = 'close'
+
+
+def trades_signature(trades: List[Dict[str, Any]]) -> Tuple:
+    """
+
+    :param trades: trades as records, as returned by ArbitrageStrategy.find_opportunity()
+    :return: direction, pair, price and quantity of each leg
+    """
+    return tuple((trade['direction'], trade['pair'], trade['price'], trade['quantity']) for trade in trades)
+
+
+class TrackedOpportunity(object):
+    """
+    Opportunity of a strategy, from the first signal passing its thresholds to the first one not passing them.
+    """
+
+    def __init__(self, strategy: ArbitrageStrategy, timestamp: datetime, trades: List[Dict[str, Any]],
+                 balances: Dict[str, Any]):
+        self._strategy = strategy
+        self._opened = timestamp
+        self._last_seen = timestamp
+        self._closed = None
+        self._trades = trades
+        self._balances = balances
+        self._signature = trades_signature(trades)
+        self._peak_balances = dict(balances)
+        self._signals = 1
+        self._updates = 0
+
+    @property
+    def strategy(self) -> ArbitrageStrategy:
+        return self._strategy
+
+    @property
+    def opened(self) -> datetime:
+        return self._opened
+
+    @property
+    def closed(self) -> datetime:
+        return self._closed
+
+    @property
+    def is_open(self) -> bool:
+        return self._closed is None
+
+    @property
+    def trades(self) -> List[Dict[str, Any]]:
+        return self._trades
+
+    @property
+    def balances(self) -> Dict[str, Any]:
+        return self._balances
+
+    @property
+    def peak_balances(self) -> Dict[str, Any]:
+        """
+
+        :return: highest net balance reached by currency while open
+        """
+        return self._peak_balances
+
+    @property
+    def signals(self) -> int:
+        """
+
+        :return: number of evaluations passing the thresholds
+        """
+        return self._signals
+
+    @property
+    def updates(self) -> int:
+        """
+
+        :return: number of changes of the trades
+        """
+        return self._updates
+
+    @property
+    def duration(self) -> timedelta:
+        """
+
+        :return: time from opening to closing, or to the latest signal while open
+        """
+        return (self._closed or self._last_seen) - self._opened
+
+    def observe(self, timestamp: datetime, trades: List[Dict[str, Any]], balances: Dict[str, Any]) -> bool:
+        """
+
+        :param timestamp:
+        :param trades:
+        :param balances:
+        :return: True when the trades have changed
+        """
+        self._last_seen = max(self._last_seen, timestamp)
+        self._signals += 1
+        signature = trades_signature(trades)
+        if signature == self._signature:
+            return False
+
+        self._signature = signature
+        self._trades = trades
+        self._balances = balances
+        self._updates += 1
+        for currency, amount in balances.items():
+            if currency not in self._peak_balances or amount > self._peak_balances[currency]:
+                self._peak_balances[currency] = amount
+
+        return True
+
+    def close(self, timestamp: datetime) -> None:
+        self._closed = max(self._last_seen, timestamp)
+
+    def __repr__(self):
+        return '[{} {} for {}, peak {}]'.format(self._strategy, self._trades, self.duration, self._peak_balances)
+
+
+class OpportunityEvent(object):
+    """
+    Opening, change or closing of an opportunity.
+    """
+
+    def __init__(self, kind: str, timestamp: datetime, opportunity: TrackedOpportunity):
+        """
+
+        :param kind: OPEN, UPDATE or CLOSE
+        :param timestamp:
+        :param opportunity:
+        """
+        self._kind = kind
+        self._timestamp = timestamp
+        self._opportunity = opportunity
+
+    @property
+    def kind(self) -> str:
+        return self._kind
+
+    @property
+    def timestamp(self) -> datetime:
+        return self._timestamp
+
+    @property
+    def opportunity(self) -> TrackedOpportunity:
+        return self._opportunity
+
+    def __repr__(self):
+        if self._kind == CLOSE:
+            return '{} {} after {} ({} signals, {} updates), peak balances {}'.format(
+                self._kind, self._opportunity.strategy, self._opportunity.duration, self._opportunity.signals,
+                self._opportunity.updates, self._opportunity.peak_balances)
+
+        return '{} {} {}'.format(self._kind, self._opportunity.strategy, self._opportunity.trades)
+
+
+class OpportunityTracker(object):
+    """
+    Turns the opportunities found on each quote into open / update / close events.
+    """
+
+    def __init__(self):
+        self._opportunities = dict()  # type: Dict[ArbitrageStrategy, TrackedOpportunity]
+        self._signals = 0
+        self._events = 0
+
+    @property
+    def signals(self) -> int:
+        """
+
+        :return: number of opportunities received
+        """
+        return self._signals
+
+    @property
+    def events(self) -> int:
+        """
+
+        :return: number of events emitted
+        """
+        return self._events
+
+    def open_opportunities(self) -> List[TrackedOpportunity]:
+        return list(self._opportunities.values())
+
+    def get(self, strategy: ArbitrageStrategy) -> TrackedOpportunity:
+        return self._opportunities.get(strategy)
+
+    def update_pair(self, pair: CurrencyPair, timestamp: datetime,
+                    opportunities: Iterable[Tuple[ArbitrageStrategy, Any, Any]]) -> List[OpportunityEvent]:
+        """
+        Handles the evaluation of the strategies trading a pair after a quote.
+
+        :param pair: updated pair, open opportunities on the pair that are not passed in are closed
+        :param timestamp:
+        :param opportunities: (strategy, trades, balances) passing the thresholds
+        :return: events, closings first
+        """
+        passing = {strategy: (trades, balances) for strategy, trades, balances in opportunities}
+        events = list()
+        for strategy in list(self._opportunities):
+            if pair in strategy.pairs and strategy not in passing:
+                events.append(self.close(strategy, timestamp))
+
+        for strategy, (trades, balances) in passing.items():
+            self._signals += 1
+            opportunity = self._opportunities.get(strategy)
+            if opportunity is None:
+                opportunity = TrackedOpportunity(strategy, timestamp, trades, balances)
+                self._opportunities[strategy] = opportunity
+                events.append(OpportunityEvent(OPEN, timestamp, opportunity))
+                self._events += 1
+
+            elif opportunity.observe(timestamp, trades, balances):
+                events.append(OpportunityEvent(UPDATE, timestamp, opportunity))
+                self._events += 1
+
+        return events
+
+    def close(self, strategy: ArbitrageStrategy, timestamp: datetime) -> OpportunityEvent:
+        """
+
+        :param strategy:
+        :param timestamp:
+        :return: None when the strategy has no open opportunity
+        """
+        opportunity = self._opportunities.pop(strategy, None)
+        if opportunity is None:
+            return None
+
+        opportunity.close(timestamp)
+        self._events += 1
+        return OpportunityEvent(CLOSE, timestamp, opportunity)
+
+    def close_all(self, timestamp: datetime) -> List[OpportunityEvent]:
+        """
+
+        :param timestamp:
+        :return: closing events of all open opportunities
+        """
+        return [self.close(strategy, timestamp) for strategy in list(self._opportunities)]
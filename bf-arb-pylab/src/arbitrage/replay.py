@@ -0,0 +1,280 @@
+"""
+Replay of recorded quote files (json lines, as written by pricing-source) through mmap, with time range seeking.
+
+A sidecar index samples the file every `spacing` bytes: each entry is the timestamp of the first line starting after
+the sampled position and the offset of that line. Seeking to a start time is a binary search in the index followed
+by a scan of at most `spacing` bytes. The index is a binary file next to the recording:
+
+    header:  magic (4 bytes), version (uint16), padding (uint16), recording size (uint64),
+             recording modification time (int64, nanoseconds), spacing (uint32), entries count (uint32)
+    entries: timestamp (int64, nanoseconds since epoch), offset (uint64)
+
+It is rebuilt when the recording has changed. Lines that cannot be parsed, such as the truncated last line of a
+recording still being written, are not sampled. Recordings are expected in capture order: index timestamps are made
+non decreasing, and the replay stops at the first quote at or after the end time.
+"""
+import bisect
+import logging
+import mmap
+import os
+import struct
+from datetime import datetime
+from typing import Generator, Iterable, List, Tuple
+
+from arbitrage import parse_quote_json, parse_quote_lines
+from arbitrage.entities import CurrencyPair, ForexQuote
+from arbitrage.sharedquotes import datetime_to_ns
+
+REPLAY_INDEX_MAGIC = b'RIDX'
+REPLAY_INDEX_VERSION = 1
+_HEADER = struct.Struct('<4sHHQqII')
+_ENTRY = struct.Struct('<qQ')
+
+
+class ReplayIndex(object):
+    """
+    Sampled timestamp to byte offset index of a recording.
+    """
+
+    def __init__(self, timestamps: List[int], offsets: List[int], spacing: int):
+        """
+
+        :param timestamps: non decreasing, nanoseconds since epoch
+        :param offsets: byte offset of the line of each timestamp
+        :param spacing: bytes between two samples
+        """
+        self._timestamps = timestamps
+        self._offsets = offsets
+        self._spacing = spacing
+
+    @property
+    def spacing(self) -> int:
+        return self._spacing
+
+    @classmethod
+    def build(cls, buffer, spacing: int = 1 << 16) -> 'ReplayIndex':
+        """
+
+        :param buffer: content of the recording
+        :param spacing: bytes between two samples
+        :return:
+        """
+        timestamps = list()
+        offsets = list()
+        latest = None
+        position = 0
+        while position < len(buffer):
+            end = buffer.find(b'\n', position)
+            if end < 0:
+                end = len(buffer)
+
+            line = buffer[position:end].strip()
+            timestamp = None
+            if len(line) > 0:
+                try:
+                    timestamp = datetime_to_ns(parse_quote_json(line.decode('utf-8'))[1].timestamp)
+
+                except (ValueError, KeyError, TypeError, ArithmeticError):
+                    # truncated line of a recording being written or interrupted: the next line is sampled
+                    logging.warning('skipping invalid line at offset {} while indexing'.format(position))
+
+            if timestamp is not None:
+                latest = timestamp if latest is None else max(latest, timestamp)
+                timestamps.append(latest)
+                offsets.append(position)
+                # next sample: first line starting after the sampled position
+                sample = buffer.find(b'\n', max(position + spacing - 1, end))
+                position = len(buffer) if sample < 0 else sample + 1
+
+            else:
+                position = end + 1
+
+        return cls(timestamps, offsets, spacing)
+
+    @classmethod
+    def load(cls, path: str, size: int, modified_ns: int) -> 'ReplayIndex':
+        """
+
+        :param path: index file
+        :param size: expected size of the recording
+        :param modified_ns: expected modification time of the recording
+        :return: None when the index is missing or does not match the recording
+        """
+        if not os.path.exists(path):
+            return None
+
+        with open(path, 'rb') as index_file:
+            content = index_file.read()
+
+        if len(content) < _HEADER.size:
+            return None
+
+        magic, version, _, indexed_size, indexed_modified_ns, spacing, count = _HEADER.unpack_from(content, 0)
+        if magic != REPLAY_INDEX_MAGIC or version != REPLAY_INDEX_VERSION or indexed_size != size \
+                or indexed_modified_ns != modified_ns or len(content) != _HEADER.size + count * _ENTRY.size:
+            return None
+
+        entries = list(_ENTRY.iter_unpack(memoryview(content)[_HEADER.size:]))
+        return cls([timestamp for timestamp, offset in entries], [offset for timestamp, offset in entries], spacing)
+
+    def save(self, path: str, size: int, modified_ns: int) -> None:
+        """
+        Writes the index, atomically replacing the previous one.
+
+        :param path:
+        :param size: size of the recording
+        :param modified_ns: modification time of the recording
+        :return:
+        """
+        chunks = [_HEADER.pack(REPLAY_INDEX_MAGIC, REPLAY_INDEX_VERSION, 0, size, modified_ns, self._spacing,
+                               len(self._timestamps))]
+        chunks += [_ENTRY.pack(timestamp, offset) for timestamp, offset in zip(self._timestamps, self._offsets)]
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'wb') as index_file:
+            index_file.write(b''.join(chunks))
+
+        os.replace(temporary_path, path)
+
+    def offset_for(self, start: datetime) -> int:
+        """
+
+        :param start:
+        :return: offset of a line before the first quote at or after start
+        """
+        entry = bisect.bisect_left(self._timestamps, datetime_to_ns(start)) - 1
+        if entry < 0:
+            return 0
+
+        return self._offsets[entry]
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+
+class QuoteReplay(object):
+    """
+    Memory-mapped recording of json quote lines.
+    """
+
+    def __init__(self, path: str, index_path: str = None, spacing: int = 1 << 16):
+        """
+
+        :param path: recording
+        :param index_path: sidecar index, path + '.idx' by default
+        :param spacing: bytes between two index samples, when building the index
+        """
+        self._path = path
+        self._index_path = index_path or path + '.idx'
+        self._spacing = spacing
+        self._file = open(path, 'rb')
+        status = os.fstat(self._file.fileno())
+        self._size = status.st_size
+        self._modified_ns = status.st_mtime_ns
+        self._buffer = b''
+        if self._size > 0:
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._index = None
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def index(self) -> ReplayIndex:
+        """
+
+        :return: index loaded from the sidecar file, built and saved when missing or outdated
+        """
+        if self._index is None:
+            self._index = ReplayIndex.load(self._index_path, self._size, self._modified_ns)
+            if self._index is None:
+                self._index = ReplayIndex.build(self._buffer, spacing=self._spacing)
+                logging.info('indexed {} ({} entries)'.format(self._path, len(self._index)))
+                try:
+                    self._index.save(self._index_path, self._size, self._modified_ns)
+
+                except OSError as error:
+                    logging.warning('unable to save replay index {}: {}'.format(self._index_path, error))
+
+        return self._index
+
+    def lines(self, offset: int = 0) -> Generator[str, None, None]:
+        """
+
+        :param offset: start of a line
+        :return: non empty lines from the offset
+        """
+        buffer = self._buffer
+        position = offset
+        while position < self._size:
+            end = buffer.find(b'\n', position)
+            if end < 0:
+                end = self._size
+
+            line = buffer[position:end]
+            position = end + 1
+            if len(line.strip()) > 0:
+                yield line.decode('utf-8')
+
+    def quotes(self, start: datetime = None, end: datetime = None,
+               batch_size: int = 4096) -> Generator[Tuple[CurrencyPair, ForexQuote], None, None]:
+        """
+
+        :param start: first quote time, seeking through the index
+        :param end: replay stops at the first quote at or after end
+        :param batch_size: lines decoded at once
+        :return:
+        """
+        offset = 0 if start is None else self.index.offset_for(start)
+        lines = self.lines(offset)
+        while True:
+            batch = list()
+            for line in lines:
+                batch.append(line)
+                if len(batch) >= batch_size:
+                    break
+
+            if len(batch) == 0:
+                return
+
+            for pair, quote in parse_quote_lines(batch):
+                if start is not None and quote.timestamp < start:
+                    continue
+
+                if end is not None and quote.timestamp >= end:
+                    return
+
+                yield pair, quote
+
+    def close(self) -> None:
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+
+        self._file.close()
+
+    def __enter__(self) -> 'QuoteReplay':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def between(quotes: Iterable[Tuple[CurrencyPair, ForexQuote]], start: datetime = None,
+            end: datetime = None) -> Generator[Tuple[CurrencyPair, ForexQuote], None, None]:
+    """
+    Time range of a quote stream without index.
+
+    :param quotes:
+    :param start:
+    :param end: stops at the first quote at or after end
+    :return:
+    """
+    for pair, quote in quotes:
+        if start is not None and quote.timestamp < start:
+            continue
+
+        if end is not None and quote.timestamp >= end:
+            return
+
+        yield pair, quote
@@ -0,0 +1,278 @@
+"""
+Scanning a universe of strategies on a single quote stream.
+"""
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Set, Tuple
+
+from arbitrage import parse_strategy, create_strategies, parse_pair_from_direct
+from arbitrage.entities import ArbitrageStrategy, CurrencyPair, ForexQuote
+from arbitrage.numeric import NumericBackend, DECIMAL, FLOAT64
+
+
+def read_strategies(lines: Iterable[str], indirect_mode: bool = False) -> List[ArbitrageStrategy]:
+    """
+    Parses one strategy per line, as accepted by parse_strategy() or printed by list-strategies.py.
+    Empty lines and lines starting with # are ignored.
+
+    :param lines:
+    :param indirect_mode: quote currency comes first
+    :return:
+    """
+    strategies = list()
+    for line in lines:
+        line = line.strip()
+        if len(line) == 0 or line.startswith('#'):
+            continue
+
+        strategies.append(parse_strategy(line.replace('"', '').replace("'", ''), indirect_mode=indirect_mode))
+
+    return strategies
+
+
+def strategies_from_symbols(symbols: Iterable[str], cache: 'StrategyCache' = None) -> List[ArbitrageStrategy]:
+    """
+
+    :param symbols: exchange pair codes, base first (ex: 'btcusd')
+    :param cache: reuses the strategies enumerated for the same pairs
+    :return: all strategies that can be built from the pairs
+    """
+    pairs = [parse_pair_from_direct(symbol) for symbol in symbols]
+    if cache is not None:
+        return cache.strategies(pairs)
+
+    return sorted(create_strategies(pairs))
+
+
+def pairs_digest(pairs: Iterable[CurrencyPair]) -> str:
+    """
+
+    :param pairs:
+    :return: hash of the set of pairs, independent of their order
+    """
+    return hashlib.sha256(','.join(sorted(set(repr(pair) for pair in pairs))).encode('utf-8')).hexdigest()
+
+
+class StrategyCache(object):
+    """
+    JSON file keeping the exchange symbols and the strategies enumerated from them, so that a restart skips both the
+    symbols request and the enumeration.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._content = dict()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as cache_file:
+                    self._content = json.load(cache_file)
+
+            except ValueError:
+                logging.warning('ignoring invalid strategies cache: {}'.format(path))
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def _save(self) -> None:
+        temporary_path = self._path + '.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as cache_file:
+            json.dump(self._content, cache_file)
+
+        os.replace(temporary_path, self._path)
+
+    def symbols(self, fetch_symbols: Callable[[], List[str]], max_age: float = 86400.) -> List[str]:
+        """
+
+        :param fetch_symbols: called when the cached symbols are missing or older than max_age
+        :param max_age: seconds
+        :return:
+        """
+        fetched = self._content.get('symbols_time', 0.)
+        if 'symbols' in self._content and time.time() - fetched <= max_age:
+            return self._content['symbols']
+
+        symbols = list(fetch_symbols())
+        self._content['symbols'] = symbols
+        self._content['symbols_time'] = time.time()
+        self._save()
+        return symbols
+
+    def strategies(self, pairs: Iterable[CurrencyPair]) -> List[ArbitrageStrategy]:
+        """
+
+        :param pairs:
+        :return: strategies enumerated from the pairs, read from the cache when the pairs are unchanged
+        """
+        pairs = set(pairs)
+        digest = pairs_digest(pairs)
+        if self._content.get('pairs_digest') == digest:
+            logging.info('using cached strategies from {}'.format(self._path))
+            return read_strategies(self._content['strategies'])
+
+        strategies = sorted(create_strategies(pairs))
+        self._content['pairs_digest'] = digest
+        self._content['strategies'] = [','.join(repr(pair) for pair in strategy.pairs) for strategy in strategies]
+        self._save()
+        return strategies
+
+
+class StrategyScanner(object):
+    """
+    Evaluates many strategies on a quote stream: each quote updates and re-evaluates only the strategies
+    trading its pair.
+    """
+
+    def __init__(self, strategies: Iterable[ArbitrageStrategy], backend: NumericBackend = DECIMAL):
+        """
+
+        :param strategies:
+        :param backend: number type used for detection, opportunities can be confirmed in Decimal with confirm()
+        """
+        self._backend = backend
+        self._strategies = list()
+        # membership of the added strategies, the list keeping their order
+        self._strategies_set = set()  # type: Set[ArbitrageStrategy]
+        self._strategies_by_pair = defaultdict(list)  # type: Dict[CurrencyPair, List[ArbitrageStrategy]]
+        self._quotes = dict()  # type: Dict[CurrencyPair, ForexQuote]
+        for strategy in strategies:
+            self.add(strategy)
+
+    @property
+    def backend(self) -> NumericBackend:
+        return self._backend
+
+    def add(self, strategy: ArbitrageStrategy) -> None:
+        if strategy in self._strategies_set:
+            return
+
+        if strategy.backend is not self._backend:
+            strategy = strategy.with_backend(self._backend)
+
+        self._strategies.append(strategy)
+        self._strategies_set.add(strategy)
+        for pair in strategy.pairs:
+            self._strategies_by_pair[pair].append(strategy)
+
+    @property
+    def strategies(self) -> List[ArbitrageStrategy]:
+        return self._strategies
+
+    def pairs(self) -> List[CurrencyPair]:
+        return sorted(self._strategies_by_pair.keys())
+
+    def strategies_for(self, pair: CurrencyPair) -> List[ArbitrageStrategy]:
+        """
+
+        :param pair:
+        :return: strategies trading the pair
+        """
+        return self._strategies_by_pair.get(pair, [])
+
+    def update_quote(self, pair: CurrencyPair, quote: ForexQuote,
+                     illimited_volume: bool = False) -> List[Tuple[ArbitrageStrategy, Any, Any]]:
+        """
+        Updates the strategies trading the pair and evaluates them.
+
+        :param pair:
+        :param quote:
+        :param illimited_volume: emulates infinite liquidity
+        :return: (strategy, trades, balances) for each strategy with complete quotes
+        """
+        self._quotes[pair] = quote
+        opportunities = list()
+        for strategy in self._strategies_by_pair.get(pair, []):
+            strategy.update_quote(pair, quote)
+            target_trades, target_balances = strategy.find_opportunity(illimited_volume=illimited_volume)
+            if target_balances is not None:
+                opportunities.append((strategy, target_trades, target_balances))
+
+        return opportunities
+
+    def confirm(self, strategy: ArbitrageStrategy, illimited_volume: bool = False) -> Tuple[Any, Any]:
+        """
+        Evaluates the strategy in Decimal on the latest quotes received.
+
+        :param strategy:
+        :param illimited_volume: emulates infinite liquidity
+        :return: (trades, balances) as returned by ArbitrageStrategy.find_opportunity()
+        """
+        exact_strategy = strategy.with_backend(DECIMAL)
+        for pair in strategy.pairs:
+            if pair not in self._quotes:
+                return None, None
+
+            exact_strategy.update_quote(pair, self._quotes[pair])
+
+        return exact_strategy.find_opportunity(illimited_volume=illimited_volume)
+
+    def __len__(self) -> int:
+        return len(self._strategies)
+
+
+def compare_backends(quotes: Iterable[Tuple[CurrencyPair, ForexQuote]], strategies: Iterable[ArbitrageStrategy],
+                     backend: NumericBackend = FLOAT64, illimited_volume: bool = False) -> Dict[str, Any]:
+    """
+    Replays quotes through the strategies evaluated both in Decimal and with the given backend.
+
+    :param quotes: (pair, quote) in arrival order
+    :param strategies:
+    :param backend: backend compared to Decimal
+    :param illimited_volume: emulates infinite liquidity
+    :return: report with the maximum absolute and relative divergences of net balances and trade quantities, and the
+    number of evaluations where the two backends disagree on the currencies making a profit
+    """
+    strategies = list(strategies)
+    exact_scanner = StrategyScanner(strategies)
+    approximate_scanner = StrategyScanner(strategies, backend=backend)
+    report = {
+        'backend': backend.name,
+        'quotes': 0,
+        'evaluations': 0,
+        'max_absolute_balance': 0.,
+        'max_relative_balance': 0.,
+        'max_absolute_quantity': 0.,
+        'max_relative_quantity': 0.,
+        'worst': None,
+        'profit_mismatches': 0,
+    }
+
+    def track(kind: str, exact_amount: Any, amount: Any, details: Tuple) -> None:
+        absolute = abs(float(exact_amount) - float(amount))
+        relative = absolute / abs(float(exact_amount)) if exact_amount != 0 else absolute
+        if absolute > report['max_absolute_' + kind]:
+            report['max_absolute_' + kind] = absolute
+            if kind == 'balance':
+                report['worst'] = details
+
+        report['max_relative_' + kind] = max(report['max_relative_' + kind], relative)
+
+    for pair, quote in quotes:
+        report['quotes'] += 1
+        exact_scanner.update_quote(pair, quote)
+        approximate_scanner.update_quote(pair, quote)
+        for exact_strategy, strategy in zip(exact_scanner.strategies_for(pair),
+                                            approximate_scanner.strategies_for(pair)):
+            if not exact_strategy.quotes_valid:
+                continue
+
+            exact = exact_strategy.evaluate(illimited_volume=illimited_volume)
+            approximate = strategy.evaluate(illimited_volume=illimited_volume)
+            report['evaluations'] += 1
+            exact_balances = exact.net_balances()
+            balances = approximate.net_balances()
+            for currency, exact_amount in exact_balances.items():
+                track('balance', exact_amount, balances[currency], (repr(exact_strategy), currency, quote.timestamp))
+
+            for exact_trade, trade in zip(exact.trades, approximate.trades):
+                track('quantity', exact_trade[2], trade[2], None)
+
+            if {currency for currency, amount in exact_balances.items() if amount > 0} != \
+                    {currency for currency, amount in balances.items() if amount > 0}:
+                report['profit_mismatches'] += 1
+
+    return report
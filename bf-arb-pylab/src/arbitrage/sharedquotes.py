@@ -0,0 +1,284 @@
+"""
+Top of book table in shared memory, one publisher process and any number of polling readers.
+
+Layout:
+
+    header:    magic (4 bytes), version (uint16), padding (uint16), capacity (uint32), pairs count (uint32)
+    directory: capacity pair names, 24 bytes each, zero padded utf-8
+    slots:     capacity records of 48 bytes: sequence (uint64), bid price, bid volume, ask price, ask volume,
+               timestamp in nanoseconds since epoch (int64), prices and volumes being scaled by 10^8
+
+Each slot is guarded by a seqlock: the publisher makes the sequence odd while writing and even once done,
+readers retry when the sequence is odd or has changed while they were copying the record.
+"""
+import struct
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from multiprocessing import shared_memory, resource_tracker
+from typing import Dict, Iterable, List, Tuple
+
+from arbitrage import parse_currency_pair
+from arbitrage.entities import CurrencyPair, ForexQuote, PriceVolume
+
+SHARED_QUOTES_MAGIC = b'TOBQ'
+SHARED_QUOTES_VERSION = 1
+SCALE_EXPONENT = 8
+_HEADER = struct.Struct('<4sHHII')
+_PAIR_NAME_SIZE = 24
+_SEQUENCE = struct.Struct('<Q')
+_SLOT = struct.Struct('<Qqqqqq')
+_SLOT_DATA = struct.Struct('<qqqqq')
+_EPOCH = datetime(1970, 1, 1)
+
+# blocks created by the current process, already tracked for unlinking
+_published_names = set()
+
+
+def naive_utc(timestamp: datetime) -> datetime:
+    """
+
+    :param timestamp: naive UTC or aware datetime
+    :return: naive UTC datetime
+    """
+    if timestamp.tzinfo is None:
+        return timestamp
+
+    return timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def datetime_to_ns(timestamp: datetime) -> int:
+    """
+
+    :param timestamp: naive UTC datetime, aware datetimes being converted to UTC
+    :return: nanoseconds since epoch
+    """
+    delta = naive_utc(timestamp) - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 10 ** 9 + delta.microseconds * 1000
+
+
+def ns_to_datetime(timestamp_ns: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=timestamp_ns // 1000)
+
+
+def to_scaled(value: Decimal) -> int:
+    return int(Decimal(value).scaleb(SCALE_EXPONENT).to_integral_value())
+
+
+def from_scaled(value: int) -> Decimal:
+    return Decimal(value).scaleb(-SCALE_EXPONENT)
+
+
+class ScaledDecimals(object):
+    """
+    Converts scaled values back to decimals, building each decimal once: prices and volumes repeat a lot on the top
+    of book.
+    """
+
+    def __init__(self, capacity: int = 65536):
+        """
+
+        :param capacity: number of cached decimals, the cache being emptied when exceeded
+        """
+        self._capacity = capacity
+        self._decimals = dict()  # type: Dict[int, Decimal]
+
+    def decimals(self, values: Iterable[int]) -> List[Decimal]:
+        """
+
+        :param values: scaled by 10^SCALE_EXPONENT
+        :return:
+        """
+        decimals = self._decimals
+        if len(decimals) > self._capacity:
+            decimals.clear()
+
+        numbers = list()
+        for value in values:
+            number = decimals.get(value)
+            if number is None:
+                number = from_scaled(value)
+                decimals[value] = number
+
+            numbers.append(number)
+
+        return numbers
+
+
+def _table_size(capacity: int) -> int:
+    return _HEADER.size + capacity * (_PAIR_NAME_SIZE + _SLOT.size)
+
+
+class SharedQuoteTable(object):
+    """
+    Publishing side of the shared top of book table.
+    """
+
+    def __init__(self, name: str, capacity: int = 256):
+        """
+
+        :param name: shared memory block name
+        :param capacity: maximum number of pairs
+        """
+        self._memory = shared_memory.SharedMemory(name=name, create=True, size=_table_size(capacity))
+        self._buffer = self._memory.buf
+        self._capacity = capacity
+        self._slots_offset = _HEADER.size + capacity * _PAIR_NAME_SIZE
+        self._slot_by_pair = dict()
+        _published_names.add(self._memory._name)
+        _HEADER.pack_into(self._buffer, 0, SHARED_QUOTES_MAGIC, SHARED_QUOTES_VERSION, 0, capacity, 0)
+
+    @property
+    def name(self) -> str:
+        return self._memory.name
+
+    def _register(self, pair: str) -> int:
+        slot = len(self._slot_by_pair)
+        if slot >= self._capacity:
+            raise OverflowError('shared quote table full ({} pairs)'.format(self._capacity))
+
+        encoded = pair.encode('utf-8')
+        if len(encoded) > _PAIR_NAME_SIZE:
+            raise ValueError('pair name too long: {}'.format(pair))
+
+        self._buffer[_HEADER.size + slot * _PAIR_NAME_SIZE:_HEADER.size + slot * _PAIR_NAME_SIZE + len(encoded)] = encoded
+        self._slot_by_pair[pair] = slot
+        # pairs count is updated last so that readers never see an unnamed slot
+        struct.pack_into('<I', self._buffer, _HEADER.size - 4, slot + 1)
+        return slot
+
+    def publish(self, pair: str, quote: ForexQuote) -> None:
+        """
+
+        :param pair: pair name, as used by readers (ex: 'BTC/USD')
+        :param quote: complete quote
+        :return:
+        """
+        slot = self._slot_by_pair.get(pair)
+        if slot is None:
+            slot = self._register(pair)
+
+        offset = self._slots_offset + slot * _SLOT.size
+        sequence, = _SEQUENCE.unpack_from(self._buffer, offset)
+        _SEQUENCE.pack_into(self._buffer, offset, sequence + 1)
+        _SLOT_DATA.pack_into(self._buffer, offset + _SEQUENCE.size,
+                             to_scaled(quote.bid.price), to_scaled(quote.bid.volume),
+                             to_scaled(quote.ask.price), to_scaled(quote.ask.volume),
+                             datetime_to_ns(quote.timestamp))
+        _SEQUENCE.pack_into(self._buffer, offset, sequence + 2)
+
+    def close(self) -> None:
+        self._buffer = None
+        self._memory.close()
+        self._memory.unlink()
+        _published_names.discard(self._memory._name)
+
+
+class SharedQuoteReader(object):
+    """
+    Polling side of the shared top of book table.
+    """
+
+    def __init__(self, name: str, source: str = 'shared'):
+        """
+
+        :param name: shared memory block name
+        :param source: source assigned to the quotes read
+        """
+        self._memory = shared_memory.SharedMemory(name=name, create=False)
+        if self._memory._name not in _published_names:
+            # the publisher owns the block: prevents the resource tracker from unlinking it when this process exits
+            resource_tracker.unregister(self._memory._name, 'shared_memory')
+
+        self._buffer = self._memory.buf
+        magic, version, _, capacity, _ = _HEADER.unpack_from(self._buffer, 0)
+        if magic != SHARED_QUOTES_MAGIC or version != SHARED_QUOTES_VERSION:
+            raise ValueError('unsupported shared quote table: {}'.format(name))
+
+        self._source = source
+        self._capacity = capacity
+        self._slots_offset = _HEADER.size + capacity * _PAIR_NAME_SIZE
+        self._pairs = list()  # type: List[Tuple[str, CurrencyPair]]
+        self._last_sequences = list()  # type: List[int]
+
+    def _refresh_pairs(self) -> None:
+        pairs_count, = struct.unpack_from('<I', self._buffer, _HEADER.size - 4)
+        for slot in range(len(self._pairs), pairs_count):
+            offset = _HEADER.size + slot * _PAIR_NAME_SIZE
+            pair = bytes(self._buffer[offset:offset + _PAIR_NAME_SIZE]).rstrip(b'\0').decode('utf-8')
+            self._pairs.append((pair, parse_currency_pair(pair)))
+            self._last_sequences.append(0)
+
+    def pairs(self) -> List[str]:
+        self._refresh_pairs()
+        return [pair for pair, currency_pair in self._pairs]
+
+    def _read_slot(self, slot: int) -> Tuple[int, ForexQuote]:
+        offset = self._slots_offset + slot * _SLOT.size
+        while True:
+            sequence, bid_price, bid_volume, ask_price, ask_volume, timestamp_ns = _SLOT.unpack_from(self._buffer,
+                                                                                                     offset)
+            if sequence % 2 == 0 and _SEQUENCE.unpack_from(self._buffer, offset)[0] == sequence:
+                break
+
+            # writer in progress
+            time.sleep(0)
+
+        if sequence == 0:
+            return sequence, None
+
+        quote = ForexQuote(ns_to_datetime(timestamp_ns),
+                           PriceVolume(from_scaled(bid_price), from_scaled(bid_volume)),
+                           PriceVolume(from_scaled(ask_price), from_scaled(ask_volume)), source=self._source)
+        return sequence, quote
+
+    def read(self, pair: str) -> ForexQuote:
+        """
+
+        :param pair:
+        :return: latest quote for the pair, None if never published
+        """
+        self._refresh_pairs()
+        for slot, (slot_pair, currency_pair) in enumerate(self._pairs):
+            if slot_pair == pair:
+                return self._read_slot(slot)[1]
+
+        return None
+
+    def poll(self) -> List[Tuple[CurrencyPair, ForexQuote]]:
+        """
+        Quotes published since the previous call.
+
+        :return: (pair, quote) tuples
+        """
+        self._refresh_pairs()
+        updates = list()
+        for slot, (pair, currency_pair) in enumerate(self._pairs):
+            offset = self._slots_offset + slot * _SLOT.size
+            if _SEQUENCE.unpack_from(self._buffer, offset)[0] == self._last_sequences[slot]:
+                continue
+
+            sequence, quote = self._read_slot(slot)
+            self._last_sequences[slot] = sequence
+            if quote is not None:
+                updates.append((currency_pair, quote))
+
+        return updates
+
+    def snapshot(self) -> Dict[CurrencyPair, ForexQuote]:
+        """
+
+        :return: latest quote of every published pair
+        """
+        self._refresh_pairs()
+        quotes = dict()
+        for slot, (pair, currency_pair) in enumerate(self._pairs):
+            quote = self._read_slot(slot)[1]
+            if quote is not None:
+                quotes[currency_pair] = quote
+
+        return quotes
+
+    def close(self) -> None:
+        self._buffer = None
+        self._memory.close()
@@ -0,0 +1,221 @@
+"""
+Depth-aware sizing of a three legs strategy.
+
+The strategy is seen as the cycle A -> B -> C -> A: A is sold through indirect pair 1, the proceeds B through indirect
+pair 2, and the sold amount of A is bought back with C through the direct pair, the profit remaining in C. Each leg
+walks its book level by level, so that the received amount of C is concave and the cost of buying A back is convex in
+the initial amount: profit is maximal where the marginal rate of the three current levels drops to one, found in a
+single merged walk of the three books.
+"""
+from typing import Dict, List
+
+from arbitrage.entities import ArbitrageStrategy, CurrencyPair, OrderBook
+
+
+class LegSizing(object):
+    """
+    Execution of one leg across several levels.
+    """
+
+    def __init__(self, pair: CurrencyPair, direction: str, amount_in: float, amount_out: float, worst_price: float):
+        self._pair = pair
+        self._direction = direction
+        self._amount_in = amount_in
+        self._amount_out = amount_out
+        self._worst_price = worst_price
+
+    @property
+    def pair(self) -> CurrencyPair:
+        return self._pair
+
+    @property
+    def direction(self) -> str:
+        return self._direction
+
+    @property
+    def quantity(self) -> float:
+        """
+
+        :return: traded amount of the base currency, negative when selling
+        """
+        return -self._amount_in if self._direction == 'sell' else self._amount_out
+
+    @property
+    def average_price(self) -> float:
+        """
+
+        :return: price obtained over all the levels, net of fees
+        """
+        if self._direction == 'sell':
+            return self._amount_out / self._amount_in
+
+        return self._amount_in / self._amount_out
+
+    @property
+    def worst_price(self) -> float:
+        """
+
+        :return: price of the deepest level reached, to be used as limit price
+        """
+        return self._worst_price
+
+    def as_dict(self):
+        return {
+            'direction': self.direction,
+            'pair': repr(self.pair),
+            'quantity': self.quantity,
+            'price': self.average_price,
+            'limit_price': self.worst_price,
+        }
+
+    def __repr__(self):
+        return '[{}, {}, {}, {}, {}]'.format(self.direction, self.pair, self.quantity, self.average_price,
+                                             self.worst_price)
+
+
+class StrategySizing(object):
+    """
+    Most profitable amounts for a strategy, given the depth of its books.
+    """
+
+    def __init__(self, amount: float, profit: float, profit_currency: str, legs: List[LegSizing]):
+        self._amount = amount
+        self._profit = profit
+        self._profit_currency = profit_currency
+        self._legs = legs
+
+    @property
+    def amount(self) -> float:
+        """
+
+        :return: amount of the initial currency sold, then bought back
+        """
+        return self._amount
+
+    @property
+    def profit(self) -> float:
+        return self._profit
+
+    @property
+    def profit_currency(self) -> str:
+        return self._profit_currency
+
+    @property
+    def legs(self) -> List[LegSizing]:
+        return self._legs
+
+    def __repr__(self):
+        return '[{} {}: {}]'.format(self.profit, self.profit_currency, self.legs)
+
+
+class _LegWalk(object):
+    """
+    Levels of one leg as (rate, capacity) in units of the currency given.
+    """
+
+    def __init__(self, pair: CurrencyPair, source_currency: str, book: OrderBook, depth: int, fee: float):
+        self.pair = pair
+        if pair.base == source_currency:
+            self.direction = 'sell'
+            levels = [(float(level.price), float(level.volume)) for level in book.bid_levels(depth)]
+            self.levels = [(price * (1. - fee), volume, price) for price, volume in levels]
+
+        else:
+            self.direction = 'buy'
+            levels = [(float(level.price), float(level.volume)) for level in book.ask_levels(depth)]
+            self.levels = [((1. - fee) / price, volume * price, price) for price, volume in levels]
+
+        self.index = 0
+        self.remaining = self.levels[0][1] if self.levels else 0.
+        self.amount_in = 0.
+        self.amount_out = 0.
+        self.worst_price = None
+
+    @property
+    def exhausted(self) -> bool:
+        return self.index >= len(self.levels)
+
+    @property
+    def rate(self) -> float:
+        return self.levels[self.index][0]
+
+    def consume(self, amount_in: float) -> None:
+        rate, capacity, price = self.levels[self.index]
+        self.amount_in += amount_in
+        self.amount_out += amount_in * rate
+        self.remaining -= amount_in
+        self.worst_price = price
+        if self.remaining <= capacity * 1e-12:
+            self.index += 1
+            self.remaining = self.levels[self.index][1] if self.index < len(self.levels) else 0.
+
+    def sizing(self) -> LegSizing:
+        return LegSizing(self.pair, self.direction, self.amount_in, self.amount_out, self.worst_price)
+
+
+class DepthSizer(object):
+    """
+    Sizes a strategy over the depth of its three books.
+    """
+
+    def __init__(self, strategy: ArbitrageStrategy, depth: int = 25, fee: float = 0.):
+        """
+
+        :param strategy:
+        :param depth: maximum number of levels walked per book
+        :param fee: proportional fee charged on each trade
+        """
+        initial_pair, next_pair, final_pair = strategy.legs
+        self._initial_currency = initial_pair.base
+        self._intermediate_currency = initial_pair.quote
+        if self._intermediate_currency not in next_pair.assets:
+            raise ValueError('legs do not chain: {}'.format(strategy))
+
+        self._profit_currency = next(iter(next_pair.assets.difference({self._intermediate_currency})))
+        if final_pair.assets != {self._profit_currency, self._initial_currency}:
+            raise ValueError('legs do not form a cycle: {}'.format(strategy))
+
+        self._strategy = strategy
+        self._depth = depth
+        self._fee = fee
+
+    @property
+    def strategy(self) -> ArbitrageStrategy:
+        return self._strategy
+
+    def solve(self, books: Dict[CurrencyPair, OrderBook], max_amount: float = None) -> StrategySizing:
+        """
+
+        :param books: order books by pair, at least those of the strategy
+        :param max_amount: upper limit on the amount of the initial currency
+        :return: None when no amount is profitable
+        """
+        initial_pair, next_pair, final_pair = self._strategy.legs
+        initial = _LegWalk(initial_pair, self._initial_currency, books[initial_pair], self._depth, self._fee)
+        following = _LegWalk(next_pair, self._intermediate_currency, books[next_pair], self._depth, self._fee)
+        final = _LegWalk(final_pair, self._profit_currency, books[final_pair], self._depth, self._fee)
+        amount = 0.
+        while not (initial.exhausted or following.exhausted or final.exhausted):
+            initial_rate, next_rate, final_rate = initial.rate, following.rate, final.rate
+            if initial_rate * next_rate * final_rate <= 1.:
+                break
+
+            # largest step, in units of the initial currency, keeping the three legs on their current level
+            step = min(initial.remaining, following.remaining / initial_rate, final.remaining * final_rate)
+            if max_amount is not None:
+                step = min(step, max_amount - amount)
+
+            if step <= 0.:
+                break
+
+            initial.consume(step)
+            following.consume(step * initial_rate)
+            final.consume(step / final_rate)
+            amount += step
+
+        if amount == 0.:
+            return None
+
+        profit = following.amount_out - final.amount_in
+        return StrategySizing(amount, profit, self._profit_currency,
+                              [initial.sizing(), following.sizing(), final.sizing()])
@@ -4,15 +4,16 @@ import logging
 
 import bitfinex
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import itertools
 
 import requests_cache
 
 from arbitrage import parse_pair_from_indirect, create_strategies, parse_currency_pair, parse_strategy, \
-    parse_quote_json, parse_quote
-from arbitrage.entities import ForexQuote, ArbitrageStrategy, CurrencyPair, CurrencyConverter, PriceVolume, OrderBook
+    parse_quote_json, parse_quote, parse_quote_json_generic, parse_quote_lines
+from arbitrage.entities import ForexQuote, ArbitrageStrategy, CurrencyPair, CurrencyConverter, PriceVolume, OrderBook, \
+    PriceTicks, OrderBookRegistry, js_number_repr
 
 
 class FindArbitrageOpportunitiesTestCase(unittest.TestCase):
@@ -52,6 +53,29 @@ class FindArbitrageOpportunitiesTestCase(unittest.TestCase):
         self.assertEqual(strategy, ArbitrageStrategy(CurrencyPair('btc', 'eth'), CurrencyPair('usd', 'btc'),
                                                      CurrencyPair('usd', 'eth')))
 
+    def test_parse_quote_json(self):
+        lines = ['{"timestamp": "2017-08-31T19:32:40.768384", "bid": {"price": "1.3392", "amount": "17.30488026"}, '
+                 '"ask": {"price": "1.3442", "amount": "8.37"}, "source": "bitfinex", "pair": "EOS/USD"}',
+                 '{"timestamp": "2017-08-31T19:32:41", "bid": {"price": "4712.9", "amount": "4.75014876"}, '
+                 '"ask": {"price": 4713, "amount": "3.83742889"}, "source": "bitfinex", "pair": "BTC/USD"}',
+                 '{"timestamp": "2017-08-31 19:32:42.5+00:00", "bid": {"price": "0.00028465", "amount": "0.339"}, '
+                 '"ask": {"price": "0.00028544", "amount": "0.339"}, "source": "bitfinex", "pair": "<EOS/BTC>"}']
+        for line in lines:
+            pair, quote = parse_quote_json(line)
+            expected_pair, expected_quote = parse_quote_json_generic(line)
+            self.assertEqual(pair, expected_pair)
+            self.assertEqual(quote.to_dict(), expected_quote.to_dict())
+
+        self.assertEqual(parse_quote_json(lines[1])[1].timestamp, datetime(2017, 8, 31, 19, 32, 41))
+        self.assertEqual(parse_quote_json(lines[2])[0], CurrencyPair('eos', 'btc'))
+        quotes = parse_quote_lines(lines + ['', lines[0]])
+        self.assertEqual([pair for pair, quote in quotes], [CurrencyPair('eos', 'usd'), CurrencyPair('btc', 'usd'),
+                                                            CurrencyPair('eos', 'btc'), CurrencyPair('eos', 'usd')])
+        self.assertEqual(quotes[0][1].bid.price, Decimal('1.3392'))
+        self.assertEqual(quotes[2][1].timestamp.microsecond, 500000)
+        self.assertRaises(ValueError, parse_quote_lines, ['1, 2'])
+        self.assertRaises(ValueError, parse_quote_lines, [lines[0], '{"timestamp": '])
+
     def test_converter(self):
         def quote_loader(pair):
             bid = PriceVolume(Decimal('0.66'), Decimal(100))
@@ -204,6 +228,69 @@ class FindArbitrageOpportunitiesTestCase(unittest.TestCase):
         self.assertAlmostEqual(balances.sum(axis=1).loc['EOS'], 0, places=6)
         self.assertAlmostEqual(balances.sum(axis=1).loc['USD'], 0, places=6)
 
+    def test_arbitrage_evaluate(self):
+        quote_eos_usd = parse_quote('[2017-09-02 08:58:34.070218:973.63984846@1.3545/0.00000507@1.3299]')
+        quote_eos_btc = parse_quote('[2017-09-02 08:58:34.058197:200@0.00030111/175.83079355@0.0002858]')
+        quote_btc_usd = parse_quote('[2017-09-02 08:58:37.335723:4.46422@4704.1/0.0355573@4689.7]')
+        strategy = parse_strategy('<eos/usd>,<eos/btc>,<btc/usd>')
+        self.assertEqual(strategy.find_opportunity(illimited_volume=False), (None, None))
+        strategy.update_quote(strategy.direct_pair, quote_eos_usd)
+        strategy.update_quote(strategy.indirect_pairs[0], quote_eos_btc)
+        strategy.update_quote(strategy.indirect_pairs[1], quote_btc_usd)
+        opportunity = strategy.evaluate(illimited_volume=False)
+        self.assertEqual([trade[0] for trade in opportunity.trades], ['sell', 'sell', 'buy'])
+        self.assertEqual(opportunity.trades[2][1], '<EOS/USD>')
+        trades, balances = strategy.find_opportunity(illimited_volume=False)
+        balances_df, trades_df = strategy.apply_arbitrage(illimited_volume=False)
+        self.assertEqual(trades, trades_df.to_dict(orient='records'))
+        self.assertEqual(balances, balances_df.sum(axis=1).to_dict())
+
+    def test_arbitrage_stale_quotes(self):
+        quote_eos_usd = parse_quote('[2017-09-02 08:58:34.070218:973.63984846@1.3545/0.00000507@1.3299]')
+        quote_eos_btc = parse_quote('[2017-09-02 08:58:34.058197:200@0.00030111/175.83079355@0.0002858]')
+        quote_btc_usd = parse_quote('[2017-09-02 08:58:37.335723:4.46422@4704.1/0.0355573@4689.7]')
+        strategy = parse_strategy('<eos/usd>,<eos/btc>,<btc/usd>')
+        strategy.max_age = timedelta(seconds=2)
+        strategy.update_quote(strategy.direct_pair, quote_eos_usd)
+        strategy.update_quote(strategy.indirect_pairs[0], quote_eos_btc)
+        self.assertFalse(strategy.quotes_valid)
+        strategy.update_quote(strategy.indirect_pairs[1], quote_btc_usd)
+        self.assertTrue(strategy.quotes_valid)
+        self.assertTrue(strategy.is_stale())
+        self.assertEqual(strategy.find_opportunity(illimited_volume=False), (None, None))
+        strategy.max_age = timedelta(seconds=5)
+        self.assertFalse(strategy.is_stale())
+        self.assertIsNotNone(strategy.find_opportunity(illimited_volume=False)[1])
+        self.assertEqual(strategy.find_opportunity(illimited_volume=False, now=datetime(2017, 9, 2, 9)), (None, None))
+        strategy.update_quote(strategy.indirect_pairs[0], ForexQuote(datetime(2017, 9, 2, 8, 58, 38)))
+        self.assertFalse(strategy.quotes_valid)
+        self.assertFalse(strategy.is_stale())
+        self.assertEqual(strategy.find_opportunity(illimited_volume=False), (None, None))
+
+    def test_arbitrage_break_even(self):
+        strategy = parse_strategy('<eos/usd>,<eos/btc>,<btc/usd>')
+        strategy.min_profit_rate = 0.
+        strategy.update_quote(strategy.direct_pair, parse_quote(
+            '[2017-09-02 08:58:34.070218:973.63984846@1.3545/0.00000507@1.3299]'))
+        strategy.update_quote(strategy.indirect_pairs[0], parse_quote(
+            '[2017-09-02 08:58:34.058197:200@0.00030111/175.83079355@0.0002858]'))
+        pair_btc_usd = strategy.indirect_pairs[1]
+        self.assertIsNone(strategy.break_even_price(strategy.direct_pair))
+        self.assertAlmostEqual(strategy.break_even_price(pair_btc_usd), 1.3299 / 0.00030111, places=4)
+        strategy.update_quote(pair_btc_usd, parse_quote('[2017-09-02 08:58:37.335723:4.46422@4416.6/0.0355573@4417]'))
+        self.assertFalse(strategy.may_profit)
+        self.assertEqual(strategy.find_opportunity(illimited_volume=False), (None, None))
+        strategy.update_quote(pair_btc_usd, parse_quote('[2017-09-02 08:58:38.335723:4.46422@4416.7/0.0355573@4417]'))
+        self.assertTrue(strategy.may_profit)
+        trades, balances = strategy.find_opportunity(illimited_volume=False)
+        self.assertGreater(balances['USD'], 0)
+        self.assertAlmostEqual(strategy.break_even_price(strategy.direct_pair), 0.00030111 * 4416.7, places=6)
+        strategy.update_quote(strategy.direct_pair, parse_quote(
+            '[2017-09-02 08:58:39.070218:973.63984846@1.3545/0.00000507@1.33]'))
+        self.assertEqual(strategy.find_opportunity(illimited_volume=False), (None, None))
+        strategy.min_profit_rate = None
+        self.assertIsNotNone(strategy.find_opportunity(illimited_volume=False)[1])
+
     def test_orderbook(self):
         snapshot = ['75', [['0.0003346', '4', '37.62485165'], ['0.00033459', '1', '8730.72318672'], ['0.000333', '1', '350'],
                          ['0.00033198', '2', '0.2'], ['0.00033197', '1', '0.1'], ['0.00033196', '1', '0.1'], ['0.00033176', '1', '0.1'],
@@ -228,6 +315,122 @@ class FindArbitrageOpportunitiesTestCase(unittest.TestCase):
         self.assertEqual(orderbook.quotes_ask[0]['price'], Decimal('-0.00033529'))
         self.assertEqual(orderbook.quotes_ask[-1]['price'], Decimal('-0.00034149'))
 
+    def test_orderbook_updates(self):
+        snapshot = ['75', [['1.02', '1', '5'], ['1.01', '2', '10'], ['1.03', '1', '-4'], ['1.05', '1', '-8']]]
+        orderbook = OrderBook(CurrencyPair('eur', 'usd'), 'test')
+        orderbook.load_snapshot(snapshot)
+        self.assertEqual(orderbook.level_one().bid, PriceVolume(Decimal('1.02'), Decimal('5')))
+        self.assertEqual(orderbook.level_one().ask, PriceVolume(Decimal('1.03'), Decimal('4')))
+        orderbook.update_bid(Decimal('1.025'), Decimal('2'))
+        orderbook.update_ask(Decimal('1.04'), Decimal('-1'))
+        self.assertEqual(orderbook.level_one().bid, PriceVolume(Decimal('1.025'), Decimal('2')))
+        self.assertEqual(orderbook.level_one().ask, PriceVolume(Decimal('1.03'), Decimal('4')))
+        self.assertEqual(len(orderbook.quotes_bid), 3)
+        self.assertTrue(orderbook.remove_bid(Decimal('1.025')))
+        self.assertTrue(orderbook.remove_ask(Decimal('1.03')))
+        self.assertFalse(orderbook.remove_ask(Decimal('1.03')))
+        self.assertEqual(orderbook.level_one().bid, PriceVolume(Decimal('1.02'), Decimal('5')))
+        self.assertEqual(orderbook.level_one().ask, PriceVolume(Decimal('1.04'), Decimal('1')))
+        self.assertEqual([quote['price'] for quote in orderbook.quotes_ask], [Decimal('-1.04'), Decimal('-1.05')])
+        orderbook.load_snapshot(['75', []])
+        self.assertEqual(orderbook.quotes_bid, [])
+        self.assertEqual(orderbook.quotes_ask, [])
+
+    def test_orderbook_ticks(self):
+        snapshot = ['75', [['1.02', '1', '5'], ['1.01', '2', '10.5'], ['1.03', '1', '-4'], ['1.05', '1', '-8']]]
+        ticks = PriceTicks(Decimal('0.01'), Decimal('0.0001'))
+        self.assertEqual(ticks.price_to_ticks('1.02'), 102)
+        self.assertEqual(ticks.price_to_ticks(1.02), 102)
+        self.assertEqual(ticks.amount_to_lots(Decimal('-4')), -40000)
+        orderbook = OrderBook(CurrencyPair('eur', 'usd'), 'test', ticks=ticks)
+        orderbook.load_snapshot(snapshot)
+        orderbook.update_bid(1.0, 2.)
+        orderbook.update_ask(Decimal('1.04'), Decimal('-1'))
+        orderbook.remove_ask(Decimal('1.03'))
+        self.assertEqual(orderbook.level_one().bid, PriceVolume(Decimal('1.02'), Decimal('5')))
+        self.assertEqual(orderbook.level_one().ask, PriceVolume(Decimal('1.04'), Decimal('1')))
+        self.assertEqual(orderbook.quotes_bid[1]['amount'], Decimal('10.5'))
+        self.assertEqual(orderbook.quotes_bid[-1]['price'], Decimal('1'))
+        self.assertEqual(orderbook.quotes_ask[-1]['price'], Decimal('-1.05'))
+
+    def test_orderbook_depth(self):
+        snapshot = ['75', [['1.02', '1', '5'], ['1.01', '2', '10'], ['1.00', '1', '2'], ['1.03', '1', '-4'],
+                           ['1.05', '1', '-8']]]
+        for ticks in (None, PriceTicks(Decimal('0.005'), Decimal('0.01'))):
+            orderbook = OrderBook(CurrencyPair('eur', 'usd'), 'test', ticks=ticks)
+            orderbook.load_snapshot(snapshot)
+            self.assertEqual(orderbook.sweep_bid(Decimal(8)), PriceVolume(Decimal('1.01625'), Decimal(8)))
+            self.assertEqual(orderbook.depth_bid(Decimal('1.01')), Decimal(15))
+            self.assertEqual(orderbook.depth_bid(Decimal('1.03')), Decimal(0))
+            orderbook.update_bid(Decimal('1.015'), Decimal(1))
+            self.assertEqual(orderbook.sweep_bid(Decimal(8)), PriceVolume(Decimal('1.016875'), Decimal(8)))
+            self.assertEqual(orderbook.depth_bid(Decimal('1.01')), Decimal(16))
+            orderbook.remove_bid(Decimal('1.02'))
+            self.assertEqual(orderbook.depth_bid(Decimal('1.01')), Decimal(11))
+            self.assertEqual(orderbook.sweep_ask(Decimal(100)), PriceVolume(Decimal('12.52') / 12, Decimal(12)))
+            self.assertEqual(orderbook.depth_ask(Decimal('1.04')), Decimal(4))
+            self.assertEqual(orderbook.sweep_ask(Decimal(2)), PriceVolume(Decimal('1.03'), Decimal(2)))
+
+    def test_orderbook_top_of_book_callback(self):
+        changes = list()
+        orderbook = OrderBook(CurrencyPair('eur', 'usd'), 'test',
+                              top_of_book_callback=lambda book, side: changes.append(side))
+        orderbook.load_snapshot(['75', [['1.02', '1', '5'], ['1.01', '2', '10'], ['1.03', '1', '-4']]])
+        self.assertEqual(changes, ['both'])
+        orderbook.update_bid(Decimal('1.01'), Decimal('3'))
+        orderbook.update_bid(Decimal('1.02'), Decimal('5'))
+        orderbook.remove_bid(Decimal('1.01'))
+        orderbook.update_ask(Decimal('1.04'), Decimal('-1'))
+        self.assertEqual(changes, ['both'])
+        orderbook.update_bid(Decimal('1.02'), Decimal('6'))
+        orderbook.update_ask(Decimal('1.025'), Decimal('-1'))
+        orderbook.remove_ask(Decimal('1.025'))
+        orderbook.remove_bid(Decimal('1.02'))
+        self.assertEqual(changes, ['both', 'bid', 'ask', 'ask', 'bid'])
+
+    def test_orderbook_checksum(self):
+        snapshot = ['75', [['1.02', '1', '5'], ['1.01', '2', '10'], ['1.03', '1', '-4']]]
+        for ticks in (None, PriceTicks(Decimal('0.01'), Decimal('0.0001'))):
+            orderbook = OrderBook(CurrencyPair('eur', 'usd'), 'test', ticks=ticks)
+            orderbook.load_snapshot(snapshot)
+            # CRC32 of '1.02:5:1.03:-4:1.01:10'
+            self.assertTrue(orderbook.verify_checksum(-619270917))
+            self.assertEqual(orderbook.checksum(depth=1), -1648333771)
+            orderbook.update_bid(Decimal('1.01'), Decimal('9'))
+            self.assertFalse(orderbook.verify_checksum(-619270917))
+
+        self.assertEqual([js_number_repr(value) for value in (Decimal('0.00000001'), Decimal('-0.0000005'),
+                                                              Decimal('0.00000027'), 0.000001, Decimal('7000.10'),
+                                                              Decimal('-4'), Decimal('1E+21'), Decimal('0'))],
+                         ['1e-8', '-5e-7', '2.7e-7', '0.000001', '7000.1', '-4', '1e+21', '0'])
+        dust_snapshot = ['76', [['0.00000027', '1', '0.00000001'], ['0.00000028', '1', '-12.5']]]
+        for ticks in (None, PriceTicks(Decimal('0.00000001'), Decimal('0.00000001'))):
+            orderbook = OrderBook(CurrencyPair('xrp', 'btc'), 'test', ticks=ticks)
+            orderbook.load_snapshot(dust_snapshot)
+            # CRC32 of '2.7e-7:1e-8:2.8e-7:-12.5', formatted as JavaScript numbers
+            self.assertTrue(orderbook.verify_checksum(-1064114937))
+
+    def test_orderbook_registry(self):
+        changes = list()
+        registry = OrderBookRegistry('test', max_depth=2,
+                                     top_of_book_callback=lambda pair, book, side: changes.append((pair, side)))
+        registry.add(10, 'EURUSD')
+        registry.add(11, 'EURCHF', ticks=PriceTicks(Decimal('0.01'), Decimal('0.0001')))
+        registry.by_channel(10).load_snapshot(['10', [['1.02', '1', '5'], ['1.01', '2', '10'], ['1.00', '1', '2'],
+                                                      ['1.03', '1', '-4']]])
+        orderbook = registry.by_pair('EURUSD')
+        self.assertEqual([quote['price'] for quote in orderbook.quotes_bid], [Decimal('1.02'), Decimal('1.01')])
+        orderbook.update_bid(Decimal('1.015'), Decimal(1))
+        self.assertEqual([quote['price'] for quote in orderbook.quotes_bid], [Decimal('1.02'), Decimal('1.015')])
+        orderbook.update_bid(Decimal('1.025'), Decimal(1))
+        self.assertEqual(orderbook.depth_bid(Decimal('1')), Decimal(6))
+        self.assertEqual(changes, [('EURUSD', 'both'), ('EURUSD', 'bid')])
+        self.assertEqual(registry.remove_channel(10), 'EURUSD')
+        self.assertIs(registry.add(12, 'EURUSD'), orderbook)
+        self.assertEqual(len(registry), 2)
+        memory_usage = registry.memory_usage()
+        self.assertGreater(memory_usage['EURUSD'], memory_usage['EURCHF'])
+
 if __name__ == '__main__':
     logging.basicConfig(level=logging.DEBUG, format='%(asctime)s:%(name)s:%(levelname)s:%(message)s')
     unittest.main()
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from arbitrage import parse_quote_lines
+from arbitrage.archive import QuoteArchive, convert_quote_lines
+from arbitrage.entities import CurrencyPair
+
+EXAMPLE_PRICES = os.path.join(os.path.dirname(__file__), '..', 'scripts', 'example_pricing_source.txt')
+
+
+class QuoteArchiveTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'archive')
+        with open(EXAMPLE_PRICES, 'r') as prices_input:
+            self.lines = prices_input.readlines()
+
+        self.expected = parse_quote_lines(self.lines)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_convert(self):
+        self.assertEqual(convert_quote_lines(iter(self.lines), self.path, chunk_size=4, batch_size=5),
+                         len(self.expected))
+        archive = QuoteArchive(self.path)
+        self.assertEqual(len(archive), len(self.expected))
+        self.assertEqual(set(archive.pairs()), {pair for pair, quote in self.expected})
+        quotes = list(archive.quotes())
+        self.assertEqual([pair for pair, quote in quotes], [pair for pair, quote in self.expected])
+        for (pair, quote), (expected_pair, expected_quote) in zip(quotes, self.expected):
+            self.assertEqual(quote.timestamp, expected_quote.timestamp)
+            self.assertEqual(quote.bid.price, expected_quote.bid.price)
+            self.assertEqual(quote.bid.volume, expected_quote.bid.volume)
+            self.assertEqual(quote.ask.price, expected_quote.ask.price)
+            self.assertEqual(quote.ask.volume, expected_quote.ask.volume)
+            self.assertEqual(quote.source, 'bitfinex')
+
+        pair_btc_usd = CurrencyPair('btc', 'usd')
+        expected_btc_usd = [quote for pair, quote in self.expected if pair == pair_btc_usd]
+        arrays = archive.arrays(pair_btc_usd)
+        self.assertEqual(len(arrays['timestamp']), len(expected_btc_usd))
+        self.assertEqual(arrays['bid_price'].tolist(), [float(quote.bid.price) for quote in expected_btc_usd])
+        self.assertEqual(archive.arrays(pair_btc_usd, scaled=True)['ask_volume'][0], 383742889)
+        self.assertEqual(len(archive.arrays(CurrencyPair('xrp', 'usd'))['timestamp']), 0)
+
+        start, end = expected_btc_usd[1].timestamp, expected_btc_usd[-1].timestamp
+        self.assertEqual(len(archive.arrays(pair_btc_usd, start=start, end=end)['timestamp']),
+                         len([quote for quote in expected_btc_usd if start <= quote.timestamp < end]))
+        selected = [(pair, quote) for pair, quote in self.expected if start <= quote.timestamp < end]
+        self.assertEqual([(pair, quote.timestamp) for pair, quote in archive.quotes(start=start, end=end)],
+                         [(pair, quote.timestamp) for pair, quote in selected])
+        self.assertEqual(list(archive.quotes(start=datetime(2030, 1, 1))), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import io
+import unittest
+from datetime import datetime
+from decimal import Decimal
+
+from arbitrage.binaryquotes import BinaryQuoteReader, BinaryQuoteWriter, RECORD_SIZE
+from arbitrage.entities import CurrencyPair, ForexQuote, PriceVolume
+
+
+class SlowStream(io.RawIOBase):
+    """
+    Returns a few bytes per read, as a pipe would.
+    """
+
+    def __init__(self, content: bytes, chunk_size: int):
+        self._content = content
+        self._position = 0
+        self._chunk_size = chunk_size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        chunk = self._content[self._position:self._position + min(self._chunk_size, len(buffer))]
+        buffer[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+
+class BinaryQuotesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.quotes = [
+            ('EOS/USD', ForexQuote(datetime(2017, 8, 31, 19, 32, 40, 768384),
+                                   PriceVolume(Decimal('1.3392'), Decimal('17.30488026')),
+                                   PriceVolume(Decimal('1.3442'), Decimal('8.37')), source='bitfinex')),
+            ('BTC/USD', ForexQuote(datetime(2017, 8, 31, 19, 32, 40, 771274),
+                                   PriceVolume(Decimal('4712.9'), Decimal('4.75014876')),
+                                   PriceVolume(Decimal('4713'), Decimal('3.83742889')), source='bitfinex')),
+            ('EOS/USD', ForexQuote(datetime(2017, 8, 31, 19, 32, 41),
+                                   PriceVolume(Decimal('1.3393'), Decimal('0.00000001')),
+                                   PriceVolume(Decimal('1.3442'), Decimal('8.37')), source='bitfinex')),
+        ]
+        stream = io.BytesIO()
+        writer = BinaryQuoteWriter(stream)
+        for pair, quote in self.quotes:
+            writer.write(pair, quote)
+
+        self.content = stream.getvalue()
+
+    def assert_quotes(self, decoded):
+        self.assertEqual([pair for pair, quote in decoded],
+                         [CurrencyPair('eos', 'usd'), CurrencyPair('btc', 'usd'), CurrencyPair('eos', 'usd')])
+        for (pair, quote), (expected_pair, expected_quote) in zip(decoded, self.quotes):
+            self.assertEqual(quote.timestamp, expected_quote.timestamp)
+            self.assertEqual(quote.bid.price, expected_quote.bid.price)
+            self.assertEqual(quote.bid.volume, expected_quote.bid.volume)
+            self.assertEqual(quote.ask.price, expected_quote.ask.price)
+            self.assertEqual(quote.ask.volume, expected_quote.ask.volume)
+            self.assertEqual(quote.source, 'bitfinex')
+
+    def test_round_trip(self):
+        # 2 pair records and 3 quote records after the header
+        self.assertEqual(len(self.content), 8 + 5 * RECORD_SIZE)
+        self.assert_quotes(list(BinaryQuoteReader(io.BytesIO(self.content))))
+        self.assert_quotes(list(BinaryQuoteReader(io.BufferedReader(SlowStream(self.content, 7)), buffer_records=1)))
+
+    def test_invalid_stream(self):
+        self.assertRaises(ValueError, list, BinaryQuoteReader(io.BytesIO(b'QJSN' + self.content[4:])))
+        self.assertRaises(ValueError, list, BinaryQuoteReader(io.BytesIO(self.content[:-5])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import itertools
+import math
+import random
+import unittest
+from datetime import datetime
+from decimal import Decimal
+
+from arbitrage.cycles import CurrencyGraph
+from arbitrage.entities import CurrencyPair, ForexQuote, PriceVolume
+
+
+def make_quote(bid: str, ask: str) -> ForexQuote:
+    return ForexQuote(datetime(2017, 1, 1), PriceVolume(Decimal(bid), Decimal(10)), PriceVolume(Decimal(ask), Decimal(5)))
+
+
+class CurrencyGraphTestCase(unittest.TestCase):
+    def setUp(self):
+        self.graph = CurrencyGraph(max_length=4)
+        self.assertEqual(self.graph.update_quote(CurrencyPair('EUR', 'USD'), make_quote('1.1999', '1.2001')), [])
+        self.assertEqual(self.graph.update_quote(CurrencyPair('USD', 'JPY'), make_quote('109.99', '110.01')), [])
+        self.assertEqual(self.graph.update_quote(CurrencyPair('GBP', 'JPY'), make_quote('150.99', '151.01')), [])
+
+    def test_four_legs_cycle(self):
+        # EUR -> USD -> JPY -> GBP -> EUR: 1.1999 * 109.99 / 151.01 * 1.149 = 1.00418
+        cycles = self.graph.update_quote(CurrencyPair('GBP', 'EUR'), make_quote('1.149', '1.1492'))
+        self.assertEqual(len(cycles), 1)
+        cycle = cycles[0]
+        self.assertEqual(len(cycle), 4)
+        self.assertEqual(cycle.currencies, ['GBP', 'EUR', 'USD', 'JPY', 'GBP'])
+        self.assertEqual(cycle.key(), ('EUR', 'USD', 'JPY', 'GBP'))
+        self.assertAlmostEqual(cycle.rate, 1.1999 * 109.99 / 151.01 * 1.149, places=12)
+        self.assertEqual([(direction, price) for pair, direction, price, volume in cycle.legs],
+                         [('sell', 1.149), ('sell', 1.1999), ('sell', 109.99), ('buy', 151.01)])
+        self.assertEqual([cycle.key() for cycle in self.graph.find_cycles()], [('EUR', 'USD', 'JPY', 'GBP')])
+
+        self.assertEqual(self.graph.update_quote(CurrencyPair('GBP', 'EUR'), make_quote('1.1439', '1.1441')), [])
+        self.assertEqual(self.graph.find_cycles(), [])
+        self.assertEqual(self.graph.update_quote(CurrencyPair('GBP', 'EUR'), ForexQuote(datetime(2017, 1, 1))), [])
+        self.assertIsNone(self.graph.edge('GBP', 'EUR'))
+
+    def test_length_and_fees(self):
+        short_graph = CurrencyGraph(max_length=3)
+        with_fees = CurrencyGraph(max_length=4, fee=0.002)
+        for graph in (short_graph, with_fees):
+            graph.update_quote(CurrencyPair('EUR', 'USD'), make_quote('1.1999', '1.2001'))
+            graph.update_quote(CurrencyPair('USD', 'JPY'), make_quote('109.99', '110.01'))
+            graph.update_quote(CurrencyPair('GBP', 'JPY'), make_quote('150.99', '151.01'))
+            self.assertEqual(graph.update_quote(CurrencyPair('GBP', 'EUR'), make_quote('1.149', '1.1492')), [])
+
+        with self.assertRaises(ValueError):
+            CurrencyGraph(max_length=2)
+
+    def test_exhaustive_search(self):
+        random_generator = random.Random(17)
+        currencies = ['A', 'B', 'C', 'D', 'E', 'F']
+        profitable = 0
+        for _ in range(40):
+            graph = CurrencyGraph(max_length=6)
+            for base, quote in itertools.combinations(currencies, 2):
+                if random_generator.random() < 0.7:
+                    mid = math.exp(random_generator.gauss(0., 0.05))
+                    spread = random_generator.uniform(0., 0.01)
+                    graph.update_quote(CurrencyPair(base, quote), make_quote('{:.8f}'.format(mid * (1. - spread)),
+                                                                             '{:.8f}'.format(mid * (1. + spread))))
+
+            for source in graph.currencies():
+                for target in graph.currencies():
+                    edge = graph.edge(source, target)
+                    if edge is None:
+                        continue
+
+                    # lightest simple path from target back to source, by enumeration
+                    best_weight = math.inf
+                    paths = [(target, (target,), edge[0])]
+                    while paths:
+                        node, path, weight = paths.pop()
+                        for next_node in graph.currencies():
+                            next_edge = graph.edge(node, next_node)
+                            if next_edge is None:
+                                continue
+
+                            if next_node == source:
+                                best_weight = min(best_weight, weight + next_edge[0])
+
+                            elif next_node not in path and len(path) < graph.max_length - 1:
+                                paths.append((next_node, path + (next_node,), weight + next_edge[0]))
+
+                    cycle = graph.best_cycle_through(source, target)
+                    if best_weight < -1e-12:
+                        profitable += 1
+                        self.assertIsNotNone(cycle)
+                        self.assertAlmostEqual(math.log(cycle.rate), -best_weight, places=9)
+
+                    else:
+                        self.assertIsNone(cycle)
+
+        self.assertGreater(profitable, 100)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import asyncio
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from arbitrage.frames import FrameRecorder, RecordedConnection, frame_segments, read_frames
+
+
+class FrameRecorderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.prefix = os.path.join(self.directory, 'bitfinex')
+        self.frames = [(1000 + index, '[{}, 7000.{}, 1, 0.5]'.format(index % 3, index)) for index in range(200)]
+        self.frames.insert(0, (999, '{"event": "info",\n "version": 2}'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record(self, compression: str):
+        recorder = FrameRecorder(self.prefix, compression=compression, segment_bytes=1024)
+        for received_ns, frame in self.frames:
+            recorder.record(frame, received_ns)
+
+        recorder.close()
+        self.assertEqual(recorder.count, len(self.frames))
+
+    def test_rotation(self):
+        self.record('gzip')
+        segments = frame_segments(self.prefix)
+        self.assertGreater(len(segments), 1)
+        self.assertTrue(all(segment.endswith('.frames.gz') for segment in segments))
+        frames = list(read_frames(segments))
+        self.assertEqual(frames[0], (999, '{"event": "info",  "version": 2}'))
+        self.assertEqual(frames[1:], self.frames[1:])
+
+        # a new recording continues the numbering
+        self.record('lzma')
+        lzma_segments = frame_segments(self.prefix)[len(segments):]
+        self.assertTrue(all(segment.endswith('.frames.xz') for segment in lzma_segments))
+        self.assertEqual(list(read_frames(lzma_segments))[1:], self.frames[1:])
+
+    def test_truncated_segment(self):
+        self.record('gzip')
+        segment = frame_segments(self.prefix)[0]
+        with open(segment, 'rb') as segment_file:
+            content = segment_file.read()
+
+        with open(segment, 'wb') as segment_file:
+            segment_file.write(content[:len(content) // 2])
+
+        frames = list(read_frames([segment]))
+        self.assertGreater(len(frames), 0)
+        self.assertEqual(frames[1:], self.frames[1:len(frames)])
+        with gzip.open(frame_segments(self.prefix)[1], 'rb') as segment_file:
+            self.assertTrue(segment_file.readline().startswith(b'# {"version": 1'))
+
+    def test_recorded_connection(self):
+        async def receive(connection):
+            frames = list()
+            async with connection as websocket:
+                await websocket.send('{"event": "subscribe"}')
+                while True:
+                    frame = await websocket.recv()
+                    if frame is None:
+                        return frames
+
+                    frames.append((websocket.received_ns, frame))
+
+        connection = RecordedConnection(self.frames)
+        self.assertEqual(asyncio.new_event_loop().run_until_complete(receive(connection)), self.frames)
+        self.assertEqual(connection.count, len(self.frames))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from decimal import Decimal
+
+from arbitrage.entities import OrderBookRegistry, PriceTicks
+from arbitrage.journal import BookJournal, read_checkpoint, snapshot_books, warm_start, write_checkpoint, write_snapshot
+
+
+class BookJournalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.checkpoint_path = os.path.join(self.directory, 'books.checkpoint')
+        self.journal_path = os.path.join(self.directory, 'books.journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_warm_start(self):
+        orderbooks = OrderBookRegistry('test')
+        orderbooks.add(1, 'EURUSD').load_snapshot([1, [['1.02', 1, '5'], ['1.01', 2, '10'], ['1.03', 1, '-4']]])
+        orderbooks.add(2, 'EURCHF', ticks=PriceTicks(Decimal('0.01'), Decimal('0.0001'))).load_snapshot(
+            [2, [['1.14', 1, '3'], ['1.15', 1, '-2.5']]])
+        write_checkpoint(self.checkpoint_path, orderbooks)
+        created, books = read_checkpoint(self.checkpoint_path)
+        self.assertAlmostEqual(created, time.time(), delta=60.)
+        journal = BookJournal(self.journal_path)
+        orderbooks.by_pair('EURUSD').update_bid(Decimal('1.025'), Decimal('1'))
+        journal.update('EURUSD', Decimal('1.025'), Decimal('1'))
+        orderbooks.by_pair('EURCHF').remove_ask(Decimal('1.15'))
+        journal.remove('EURCHF', Decimal('1.15'), 'ask')
+        orderbooks.add(3, 'GBPUSD').load_snapshot([3, [['1.3', 1, '1'], ['1.31', 1, '-1']]])
+        journal.snapshot('GBPUSD', [['1.3', 1, '1'], ['1.31', 1, '-1']])
+        journal.close()
+
+        restored = OrderBookRegistry('test')
+        self.assertEqual(warm_start(restored, self.checkpoint_path, self.journal_path), 3)
+        for orderbook in orderbooks:
+            restored_book = restored.by_pair(orderbook.pair)
+            self.assertTrue(restored_book.is_stale)
+            self.assertEqual([(quote['price'], quote['amount']) for quote in restored_book.quotes_bid],
+                             [(quote['price'], quote['amount']) for quote in orderbook.quotes_bid])
+            self.assertEqual([(quote['price'], quote['amount']) for quote in restored_book.quotes_ask],
+                             [(quote['price'], quote['amount']) for quote in orderbook.quotes_ask])
+
+        self.assertEqual(restored.by_pair('EURCHF').ticks.tick_size, Decimal('0.01'))
+        restored.by_pair('EURUSD').load_snapshot([4, [['1.02', 1, '5'], ['1.03', 1, '-4']]])
+        self.assertFalse(restored.by_pair('EURUSD').is_stale)
+
+
+    def test_rotation(self):
+        orderbooks = OrderBookRegistry('test')
+        orderbooks.add(1, 'EURUSD').load_snapshot([1, [['1.02', 1, '5'], ['1.03', 1, '-4']]])
+        write_checkpoint(self.checkpoint_path, orderbooks)
+        journal = BookJournal(self.journal_path)
+        orderbooks.by_pair('EURUSD').update_bid(Decimal('1.021'), Decimal('2'))
+        journal.update('EURUSD', Decimal('1.021'), Decimal('2'))
+        books = snapshot_books(orderbooks)
+        journal.rotate()
+        orderbooks.by_pair('EURUSD').remove_bid(Decimal('1.02'))
+        journal.remove('EURUSD', Decimal('1.02'), 'bid')
+        journal.flush()
+
+        def restored_bids():
+            restored = OrderBookRegistry('test')
+            warm_start(restored, self.checkpoint_path, self.journal_path)
+            return [(quote['price'], quote['amount']) for quote in restored.by_pair('EURUSD').quotes_bid]
+
+        expected = [(quote['price'], quote['amount']) for quote in orderbooks.by_pair('EURUSD').quotes_bid]
+        # crash before the checkpoint is written: previous journal replayed first
+        self.assertEqual(restored_bids(), expected)
+
+        # checkpoint not written, the next snapshot rotating again keeps the previous deltas
+        books = snapshot_books(orderbooks)
+        journal.rotate()
+        self.assertEqual(restored_bids(), expected)
+
+        write_snapshot(self.checkpoint_path, books)
+        self.assertEqual(restored_bids(), expected)
+        journal.discard_previous()
+        self.assertFalse(os.path.exists(self.journal_path + '.previous'))
+        journal.close()
+        self.assertEqual(restored_bids(), [(Decimal('1.021'), Decimal('2'))])
+
+
+if __name__ == '__main__':
+    unittest.main()
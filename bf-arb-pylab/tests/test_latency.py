@@ -0,0 +1,50 @@
+import time
+import unittest
+from decimal import Decimal
+
+from arbitrage import parse_quote_json
+from arbitrage.entities import OrderBook, CurrencyPair
+from arbitrage.latency import LatencyHistogram, LatencyRecorder, LatencyStamps
+
+
+class LatencyTestCase(unittest.TestCase):
+    def test_histogram(self):
+        histogram = LatencyHistogram()
+        self.assertIsNone(histogram.percentile(50))
+        for duration_ns in range(1, 1001):
+            histogram.record(duration_ns * 1000)
+
+        self.assertEqual(histogram.count, 1000)
+        self.assertEqual(histogram.min, 1000)
+        self.assertEqual(histogram.max, 1000000)
+        self.assertAlmostEqual(histogram.percentile(50), 500000, delta=500000 * 0.125)
+        self.assertAlmostEqual(histogram.percentile(99), 990000, delta=990000 * 0.125)
+        self.assertEqual(histogram.percentile(100), 1000000)
+
+    def test_stamps_through_quote(self):
+        notified = list()
+        orderbook = OrderBook(CurrencyPair('EUR', 'USD'), 'test',
+                              top_of_book_callback=lambda book, side: notified.append(book.level_one()))
+        orderbook.load_snapshot([1, [['1.02', 1, '5'], ['1.03', 1, '-4']]])
+        self.assertIsNone(notified[-1].latency)
+        frame_ns = time.monotonic_ns()
+        orderbook.stamp_frame(frame_ns)
+        orderbook.update_bid(Decimal('1.025'), Decimal('1'))
+        latency = notified[-1].latency
+        self.assertEqual(latency.stages(), ['frame', 'book', 'level_one'])
+        self.assertEqual(latency.get('frame'), frame_ns)
+        self.assertLessEqual(latency.get('book'), latency.get('level_one'))
+
+        pair, quote = parse_quote_json(notified[-1].to_json()[:-1] + ', "pair": "EUR/USD"}')
+        self.assertEqual(quote.latency.stages(), ['frame', 'book', 'level_one', 'parsed'])
+        quote.latency.mark('decision')
+        recorder = LatencyRecorder('test')
+        recorder.observe(quote.latency)
+        recorder.observe(LatencyStamps({'frame': 0, 'book': 10}))
+        self.assertEqual(recorder.histogram('frame->book').count, 2)
+        self.assertEqual(recorder.histogram('frame->decision').count, 1)
+        self.assertEqual(len(recorder.report().split('\n')), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import random
+import unittest
+from datetime import datetime
+from decimal import Decimal
+
+from arbitrage.entities import CurrencyPair, ForexQuote, PriceVolume
+from arbitrage.matrix import StrategyMatrix
+from arbitrage.scanner import read_strategies, strategies_from_symbols
+
+
+class StrategyMatrixTestCase(unittest.TestCase):
+    def test_matches_exact_evaluation(self):
+        random.seed(3)
+        for illimited_volume in (False, True):
+            strategies = strategies_from_symbols(['btcusd', 'eosbtc', 'eosusd', 'ethbtc', 'ethusd', 'etheos', 'usdeur',
+                                                  'btceur']) + read_strategies(['<chf/usd>,<eur/chf>,<usd/eur>'])
+            matrix = StrategyMatrix(strategies, illimited_volume=illimited_volume)
+            self.assertEqual(len(matrix.rows_for(CurrencyPair('BTC', 'USD'))), 3)
+            self.assertEqual(len(matrix.rows_for(CurrencyPair('XRP', 'USD'))), 0)
+            for _ in range(20):
+                pair = random.choice(matrix.pairs)
+                price = Decimal(random.uniform(0.001, 5000.)).quantize(Decimal('0.00001'))
+                quote = ForexQuote(datetime(2017, 1, 1),
+                                   PriceVolume(price, Decimal(random.uniform(0.1, 100.)).quantize(Decimal('0.0001'))),
+                                   PriceVolume(price * Decimal('1.001'),
+                                               Decimal(random.uniform(0.1, 100.)).quantize(Decimal('0.0001'))))
+                rows = matrix.update_quote(pair, quote)
+                self.assertTrue(all(pair in matrix.strategies[row].legs for row in rows))
+                for row in rows:
+                    trades, balances = matrix.confirm(row)
+                    if balances is None:
+                        self.assertTrue(all(amount != amount for amount in matrix.net_balance(row).values()))
+                        continue
+
+                    for currency, amount in matrix.net_balance(row).items():
+                        self.assertAlmostEqual(amount, float(balances[currency]),
+                                               delta=1e-9 * max(1., abs(float(balances[currency]))))
+
+    def test_profitable(self):
+        matrix = StrategyMatrix(read_strategies(['eos/usd,eos/btc,btc/usd']))
+        matrix.update_quote(CurrencyPair('EOS', 'USD'), ForexQuote(datetime(2017, 1, 1), PriceVolume(Decimal('1.3'), Decimal(10)),
+                                                                   PriceVolume(Decimal('1.31'), Decimal(10))))
+        matrix.update_quote(CurrencyPair('EOS', 'BTC'), ForexQuote(datetime(2017, 1, 1), PriceVolume(Decimal('0.0003'), Decimal(10)),
+                                                                   PriceVolume(Decimal('0.00031'), Decimal(10))))
+        self.assertEqual(len(matrix.profitable()), 0)
+        rows = matrix.update_quote(CurrencyPair('BTC', 'USD'), ForexQuote(datetime(2017, 1, 1), PriceVolume(Decimal('5000'), Decimal(10)),
+                                                                          PriceVolume(Decimal('5001'), Decimal(10))))
+        self.assertEqual(list(matrix.profitable(rows)), [0])
+        self.assertAlmostEqual(matrix.net_balance(0)['USD'], 10 * 0.0003 * 5000 - 10 * 1.31)
+        matrix.set_thresholds({'USD': 10.})
+        self.assertEqual(len(matrix.profitable(rows)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
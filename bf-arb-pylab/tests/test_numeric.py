@@ -0,0 +1,56 @@
+import unittest
+from decimal import Decimal
+
+from arbitrage import parse_quote, parse_strategy
+from arbitrage.entities import CurrencyPair
+from arbitrage.numeric import DECIMAL, FLOAT64, numeric_backend
+from arbitrage.scanner import StrategyScanner, compare_backends
+
+QUOTES = [
+    (CurrencyPair('eos', 'usd'), parse_quote('[2017-09-02 08:58:34.070218:973.63984846@1.3545/0.00000507@1.3299]')),
+    (CurrencyPair('eos', 'btc'), parse_quote('[2017-09-02 08:58:34.058197:200@0.00030111/175.83079355@0.0002858]')),
+    (CurrencyPair('btc', 'usd'), parse_quote('[2017-09-02 08:58:37.335723:4.46422@4704.1/0.0355573@4689.7]')),
+    (CurrencyPair('btc', 'usd'), parse_quote('[2017-09-02 08:58:38.335723:0.5@4690.3/0.2@4689.9]')),
+]
+
+
+class NumericBackendTestCase(unittest.TestCase):
+    def test_numeric_backend(self):
+        self.assertIs(numeric_backend('decimal'), DECIMAL)
+        self.assertIs(numeric_backend('float64'), FLOAT64)
+        self.assertRaises(ValueError, numeric_backend, 'float32')
+        pair = CurrencyPair('btc', 'usd')
+        quote = QUOTES[2][1]
+        balances, trade = pair.sell(quote, Decimal('0.5'))
+        self.assertEqual(balances.amount('USD'), Decimal('2352.05'))
+        balances, trade = pair.sell(quote.converted(float), 0.5, backend=FLOAT64)
+        self.assertIsInstance(balances.amount('USD'), float)
+        self.assertAlmostEqual(balances.amount('USD'), 2352.05)
+
+    def test_float_scanner(self):
+        strategy = parse_strategy('eos/usd,eos/btc,btc/usd')
+        scanner = StrategyScanner([strategy], backend=FLOAT64)
+        self.assertIs(scanner.strategies[0].backend, FLOAT64)
+        self.assertEqual(scanner.strategies[0], strategy)
+        for pair, quote in QUOTES[:3]:
+            opportunities = scanner.update_quote(pair, quote)
+
+        found_strategy, trades, balances = opportunities[0]
+        self.assertIsInstance(balances['USD'], float)
+        exact_trades, exact_balances = scanner.confirm(found_strategy)
+        self.assertIsInstance(exact_balances['USD'], Decimal)
+        for currency, amount in exact_balances.items():
+            self.assertAlmostEqual(balances[currency], float(amount), places=9)
+
+    def test_compare_backends(self):
+        report = compare_backends(QUOTES, [parse_strategy('eos/usd,eos/btc,btc/usd')])
+        self.assertEqual(report['backend'], 'float64')
+        self.assertEqual(report['quotes'], 4)
+        self.assertEqual(report['evaluations'], 2)
+        self.assertLess(report['max_relative_balance'], 1e-9)
+        self.assertLess(report['max_absolute_quantity'], 1e-9)
+        self.assertEqual(report['profit_mismatches'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
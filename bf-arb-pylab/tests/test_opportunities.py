@@ -0,0 +1,55 @@
+import unittest
+from datetime import timedelta
+
+from arbitrage import parse_quote, parse_strategy
+from arbitrage.entities import CurrencyPair
+from arbitrage.opportunities import OpportunityTracker, OPEN, UPDATE, CLOSE
+from arbitrage.scanner import StrategyScanner
+
+
+class OpportunityTrackerTestCase(unittest.TestCase):
+    def test_lifecycle(self):
+        strategy = parse_strategy('eos/usd,eos/btc,btc/usd')
+        scanner = StrategyScanner([strategy])
+        tracker = OpportunityTracker()
+        pair_btc_usd = CurrencyPair('btc', 'usd')
+        scanner.update_quote(CurrencyPair('eos', 'usd'), parse_quote(
+            '[2017-09-02 08:58:34.070218:973.63984846@1.3545/0.00000507@1.3299]'))
+        scanner.update_quote(CurrencyPair('eos', 'btc'), parse_quote(
+            '[2017-09-02 08:58:34.058197:200@0.00030111/175.83079355@0.0002858]'))
+
+        def passing(quote):
+            return [(strategy, trades, balances) for strategy, trades, balances
+                    in scanner.update_quote(pair_btc_usd, quote) if balances['USD'] > 0]
+
+        quote = parse_quote('[2017-09-02 08:58:37.335723:4.46422@4704.1/0.0355573@4689.7]')
+        events = tracker.update_pair(pair_btc_usd, quote.timestamp, passing(quote))
+        self.assertEqual([event.kind for event in events], [OPEN])
+        opportunity = events[0].opportunity
+        for seconds in range(1, 31):
+            # persistent dislocation
+            quote = parse_quote('[2017-09-02 08:58:37.335723:4.46422@4704.1/0.0355573@4689.7]')
+            timestamp = quote.timestamp + timedelta(seconds=seconds)
+            self.assertEqual(tracker.update_pair(pair_btc_usd, timestamp, passing(quote)), [])
+
+        quote = parse_quote('[2017-09-02 08:59:17.335723:4.46422@4710.1/0.0355573@4689.7]')
+        events = tracker.update_pair(pair_btc_usd, quote.timestamp, passing(quote))
+        self.assertEqual([event.kind for event in events], [UPDATE])
+        self.assertGreater(opportunity.peak_balances['USD'], 0)
+        self.assertEqual(opportunity.peak_balances['USD'], opportunity.balances['USD'])
+        self.assertEqual(tracker.update_pair(CurrencyPair('eth', 'usd'), quote.timestamp, []), [])
+
+        quote = parse_quote('[2017-09-02 08:59:47.335723:4.46422@4000.1/0.0355573@4689.7]')
+        events = tracker.update_pair(pair_btc_usd, quote.timestamp, passing(quote))
+        self.assertEqual([event.kind for event in events], [CLOSE])
+        self.assertFalse(opportunity.is_open)
+        self.assertEqual(opportunity.duration, timedelta(seconds=70))
+        self.assertEqual(opportunity.signals, 32)
+        self.assertEqual(opportunity.updates, 1)
+        self.assertEqual((tracker.signals, tracker.events), (32, 3))
+        self.assertEqual(tracker.open_opportunities(), [])
+        self.assertEqual(tracker.close_all(quote.timestamp), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from arbitrage import parse_quote_lines
+from arbitrage.replay import QuoteReplay, ReplayIndex, between
+
+
+class QuoteReplayTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'quotes.jsonl')
+        self.first = datetime(2017, 9, 2, 8, 0, 0, 250000)
+        with open(self.path, 'w') as recording:
+            for count in range(2000):
+                timestamp = self.first + timedelta(seconds=count)
+                recording.write('{{"timestamp": "{}", "bid": {{"price": "{}", "amount": "1.5"}}, '
+                                '"ask": {{"price": "4713", "amount": "2"}}, "source": "bitfinex", '
+                                '"pair": "BTC/USD"}}\n'.format(timestamp.isoformat(), 4000 + count))
+                if count % 100 == 0:
+                    recording.write('\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_seek(self):
+        start = self.first + timedelta(seconds=1200.5)
+        end = self.first + timedelta(seconds=1300)
+        with open(self.path, 'r') as recording:
+            expected = list(between(parse_quote_lines(recording), start, end))
+
+        self.assertEqual(len(expected), 99)
+        with QuoteReplay(self.path, spacing=1024) as replay:
+            quotes = list(replay.quotes(start, end, batch_size=7))
+            offset = replay.index.offset_for(start)
+
+        self.assertEqual([quote.bid.price for pair, quote in quotes], [quote.bid.price for pair, quote in expected])
+        self.assertEqual(quotes[0][1].timestamp, self.first + timedelta(seconds=1201))
+        # at most one index spacing and one line before the first quote
+        self.assertLess(os.path.getsize(self.path) * 1201 / 2000 - offset, 1024 + 200)
+        self.assertTrue(os.path.exists(self.path + '.idx'))
+        with QuoteReplay(self.path) as replay:
+            status = os.stat(self.path)
+            index = ReplayIndex.load(self.path + '.idx', status.st_size, status.st_mtime_ns)
+            self.assertIsNotNone(index)
+            self.assertEqual(index.spacing, 1024)
+            self.assertEqual(replay.index.offset_for(start), offset)
+            self.assertEqual(len(list(replay.quotes())), 2000)
+            self.assertEqual(len(list(replay.quotes(end=self.first))), 0)
+            self.assertEqual(len(list(replay.quotes(start=self.first + timedelta(days=1)))), 0)
+
+        with open(self.path, 'a') as recording:
+            recording.write('\n')
+
+        status = os.stat(self.path)
+        self.assertIsNone(ReplayIndex.load(self.path + '.idx', status.st_size, status.st_mtime_ns))
+
+    def test_truncated_recording(self):
+        with open(self.path, 'rb') as recording:
+            content = recording.read()
+
+        lines = content.splitlines(keepends=True)[:3]
+        buffer = b''.join(lines) + lines[0][:40]
+        index = ReplayIndex.build(buffer, spacing=1)
+        # first quote, empty line, second quote and the truncated line
+        self.assertEqual(len(index), 2)
+        second = len(lines[0]) + len(lines[1])
+        self.assertEqual(index.offset_for(self.first + timedelta(seconds=2)), second)
+        self.assertEqual(index.offset_for(self.first.replace(tzinfo=timezone.utc) + timedelta(seconds=2)),
+                         second)
+        self.assertEqual(index.offset_for(datetime(2017, 9, 2, 10, 0, 2, 250000,
+                                                   tzinfo=timezone(timedelta(hours=2)))), second)
+
+
+if __name__ == '__main__':
+    unittest.main()
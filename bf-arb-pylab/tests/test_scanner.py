@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from arbitrage import parse_quote, parse_strategy
+from arbitrage.entities import CurrencyPair
+from arbitrage.scanner import StrategyCache, StrategyScanner, read_strategies, strategies_from_symbols
+
+
+class StrategyScannerTestCase(unittest.TestCase):
+    def test_read_strategies(self):
+        strategies = read_strategies(['# bitfinex', 'eos/usd,eos/btc,btc/usd', '', '["ETH/BTC","BTC/USD","ETH/USD"]'])
+        self.assertEqual(strategies, [parse_strategy('eos/usd,eos/btc,btc/usd'), parse_strategy('eth/btc,btc/usd,eth/usd')])
+        self.assertEqual(len(strategies_from_symbols(['btcusd', 'eosbtc', 'eosusd', 'ethbtc', 'ethusd', 'etheos'])), 4)
+
+    def test_strategy_cache(self):
+        directory = tempfile.mkdtemp()
+        try:
+            cache_path = os.path.join(directory, 'strategies.json')
+            fetched = list()
+
+            def fetch_symbols():
+                fetched.append(True)
+                return ['btcusd', 'eosbtc', 'eosusd', 'ethbtc', 'ethusd', 'etheos']
+
+            cache = StrategyCache(cache_path)
+            strategies = strategies_from_symbols(cache.symbols(fetch_symbols), cache=cache)
+            self.assertEqual(len(strategies), 4)
+            restarted_cache = StrategyCache(cache_path)
+            self.assertEqual(strategies_from_symbols(restarted_cache.symbols(fetch_symbols), cache=restarted_cache),
+                             strategies)
+            self.assertEqual(len(fetched), 1)
+            self.assertEqual(len(strategies_from_symbols(restarted_cache.symbols(fetch_symbols, max_age=-1.)[:3],
+                                                         cache=restarted_cache)), 1)
+            self.assertEqual(len(fetched), 2)
+
+        finally:
+            shutil.rmtree(directory)
+
+    def test_update_quote(self):
+        scanner = StrategyScanner(read_strategies(['eos/usd,eos/btc,btc/usd', 'eth/usd,eth/btc,btc/usd',
+                                                   'eos/usd,eos/btc,btc/usd']))
+        self.assertEqual(len(scanner), 2)
+        self.assertEqual(len(scanner.strategies_for(CurrencyPair('btc', 'usd'))), 2)
+        self.assertEqual(len(scanner.strategies_for(CurrencyPair('eth', 'usd'))), 1)
+        self.assertEqual(scanner.strategies_for(CurrencyPair('xrp', 'usd')), [])
+        self.assertEqual(len(scanner.pairs()), 5)
+
+        self.assertEqual(scanner.update_quote(CurrencyPair('eos', 'usd'), parse_quote(
+            '[2017-09-02 08:58:34.070218:973.63984846@1.3545/0.00000507@1.3299]')), [])
+        self.assertEqual(scanner.update_quote(CurrencyPair('eos', 'btc'), parse_quote(
+            '[2017-09-02 08:58:34.058197:200@0.00030111/175.83079355@0.0002858]')), [])
+        opportunities = scanner.update_quote(CurrencyPair('btc', 'usd'), parse_quote(
+            '[2017-09-02 08:58:37.335723:4.46422@4704.1/0.0355573@4689.7]'))
+        self.assertEqual(len(opportunities), 1)
+        strategy, trades, balances = opportunities[0]
+        self.assertEqual(strategy, parse_strategy('eos/usd,eos/btc,btc/usd'))
+        self.assertEqual(len(trades), 3)
+        self.assertEqual(set(balances.keys()), {'EOS', 'BTC', 'USD'})
+        self.assertEqual(scanner.update_quote(CurrencyPair('xrp', 'usd'), parse_quote(
+            '[2017-09-02 08:58:37.335723:4.46422@0.2/0.0355573@0.21]')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import unittest
+from datetime import datetime
+from decimal import Decimal
+
+from arbitrage.entities import CurrencyPair, ForexQuote, PriceVolume
+from arbitrage.sharedquotes import SharedQuoteReader, SharedQuoteTable
+
+
+class SharedQuotesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.table = SharedQuoteTable('test-quotes-{}'.format(os.getpid()), capacity=4)
+        self.reader = SharedQuoteReader(self.table.name)
+
+    def tearDown(self):
+        self.reader.close()
+        self.table.close()
+
+    def test_publish_poll(self):
+        timestamp = datetime(2017, 12, 8, 10, 30, 15, 123456)
+        self.assertEqual(self.reader.poll(), [])
+        self.table.publish('BTC/USD', ForexQuote(timestamp, PriceVolume(Decimal('16250.5'), Decimal('1.25')),
+                                                 PriceVolume(Decimal('16251'), Decimal('0.00000001'))))
+        self.table.publish('ETH/BTC', ForexQuote(timestamp, PriceVolume(Decimal('0.02791'), Decimal('3')),
+                                                 PriceVolume(Decimal('0.02793'), Decimal('7.5'))))
+        self.assertEqual(self.reader.pairs(), ['BTC/USD', 'ETH/BTC'])
+        updates = self.reader.poll()
+        self.assertEqual([pair for pair, quote in updates], [CurrencyPair('BTC', 'USD'), CurrencyPair('ETH', 'BTC')])
+        quote = updates[0][1]
+        self.assertEqual(quote.timestamp, timestamp)
+        self.assertEqual(quote.bid.price, Decimal('16250.5'))
+        self.assertEqual(quote.ask.volume, Decimal('0.00000001'))
+        self.assertEqual(self.reader.poll(), [])
+
+        self.table.publish('ETH/BTC', ForexQuote(timestamp, PriceVolume(Decimal('0.02792'), Decimal('3')),
+                                                 PriceVolume(Decimal('0.02793'), Decimal('7.5'))))
+        updates = self.reader.poll()
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(updates[0][1].bid.price, Decimal('0.02792'))
+        self.assertEqual(self.reader.read('ETH/BTC').bid.price, Decimal('0.02792'))
+        self.assertIsNone(self.reader.read('EUR/USD'))
+        self.assertEqual(len(self.reader.snapshot()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
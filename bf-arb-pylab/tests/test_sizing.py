@@ -0,0 +1,72 @@
+import unittest
+from decimal import Decimal
+
+from arbitrage import parse_strategy
+from arbitrage.entities import CurrencyPair, OrderBook, PriceTicks
+from arbitrage.sizing import DepthSizer
+
+
+def walk(levels, amount_in):
+    """
+    Output amount and consumed input when converting amount_in through (rate, capacity in input units) levels.
+    """
+    amount_out = 0.
+    for rate, capacity in levels:
+        consumed = min(capacity, amount_in)
+        amount_out += consumed * rate
+        amount_in -= consumed
+        if amount_in <= 0:
+            break
+
+    return amount_out, amount_in <= 1e-12
+
+
+class DepthSizerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.books = {
+            CurrencyPair('EOS', 'BTC'): OrderBook(CurrencyPair('EOS', 'BTC'), 'test'),
+            CurrencyPair('BTC', 'USD'): OrderBook(CurrencyPair('BTC', 'USD'), 'test',
+                                                  ticks=PriceTicks(Decimal('0.1'), Decimal('0.00000001'))),
+            CurrencyPair('EOS', 'USD'): OrderBook(CurrencyPair('EOS', 'USD'), 'test'),
+        }
+        self.books[CurrencyPair('EOS', 'BTC')].load_snapshot([1, [
+            ['0.000300', 1, '100'], ['0.000298', 1, '200'], ['0.000290', 1, '500'], ['0.000310', 1, '-100']]])
+        self.books[CurrencyPair('BTC', 'USD')].load_snapshot([2, [
+            ['4700', 1, '0.05'], ['4690', 1, '0.1'], ['4600', 1, '1'], ['4710', 1, '-1']]])
+        self.books[CurrencyPair('EOS', 'USD')].load_snapshot([3, [
+            ['1.30', 1, '100'], ['1.31', 1, '-80'], ['1.35', 1, '-150'], ['1.40', 1, '-1000']]])
+        self.strategy = parse_strategy('eos/usd,eos/btc,btc/usd')
+
+    def profit(self, amount):
+        bids_eos_btc = [(0.0003, 100.), (0.000298, 200.), (0.00029, 500.)]
+        bids_btc_usd = [(4700., 0.05), (4690., 0.1), (4600., 1.)]
+        asks_eos_usd = [(1.31, 80.), (1.35, 150.), (1.40, 1000.)]
+        btc, complete_initial = walk(bids_eos_btc, amount)
+        usd, complete_next = walk(bids_btc_usd, btc)
+        cost, complete_final = walk([(price, volume) for price, volume in asks_eos_usd], amount)
+        if not (complete_initial and complete_next and complete_final):
+            return None
+
+        return usd - cost
+
+    def test_solve(self):
+        sizing = DepthSizer(self.strategy, depth=10).solve(self.books)
+        self.assertEqual(sizing.profit_currency, 'USD')
+        self.assertEqual([leg.direction for leg in sizing.legs], ['sell', 'sell', 'buy'])
+        best_profit = max(profit for profit in (self.profit(amount / 10.) for amount in range(1, 8000))
+                          if profit is not None)
+        self.assertGreaterEqual(sizing.profit, best_profit - 1e-9)
+        self.assertAlmostEqual(sizing.profit, self.profit(sizing.amount), places=9)
+        # top of book alone would stop at 80 EOS, the second EOS/USD ask level is still profitable
+        self.assertGreater(sizing.amount, 80.)
+        self.assertAlmostEqual(sizing.legs[0].quantity, -sizing.amount)
+        self.assertAlmostEqual(sizing.legs[2].quantity, sizing.amount)
+        self.assertEqual(sizing.legs[2].worst_price, 1.35)
+
+        capped = DepthSizer(self.strategy, depth=10).solve(self.books, max_amount=50.)
+        self.assertAlmostEqual(capped.amount, 50.)
+        self.assertIsNone(DepthSizer(self.strategy, depth=10, fee=0.03).solve(self.books))
+
+
+if __name__ == '__main__':
+    unittest.main()